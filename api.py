@@ -18,33 +18,96 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from urllib import error, parse, request
+from urllib import parse
 from sys import exit
 from bexceptions import NoCaseInList, PageNotFound, MultipleCases
-import json, re, os
+from httpclient import HTTPClient
+from collections import OrderedDict
+import json, re, os, sqlite3, sys, time, zlib
+
+# The errors looking a case up can end in, which are kept with the other outcomes
+LOOKUP_ERRORS = dict((error.__name__, error) for error in [NoCaseInList, PageNotFound, MultipleCases])
+# "[volume] U.S. [page]" in a line of a volume's list of cases, including ones that overlap
+CITATION = re.compile(r'(?<=\D)(?=(\d+)\sU\.S\.\s(\d+)\D)')
+# Citations that the search in get_case_line() could match across a line break
+IRREGULAR = re.compile(r'\n\d+\sU\.S\.|\d\nU\.S\.|U\.S\.\n\d|U\.S\.\s\d+$', re.MULTILINE)
 
 class API(object):
     '''Makes any calls to the Wikisource API to retrieve necessary information.'''    
     
-    def __init__(self):
-        self.base_URL = 'http://en.wikisource.org/w/api.php?format=json&action='
+    def __init__(self, server='https://en.wikisource.org', client=None, cache=None):
+        '''Server is where the API is, which can be a local stand-in for testing. Requests go
+        through the client, which keeps connections to the server open between requests; each
+        API has its own unless one is given. The same goes for the volume cache.'''
+        self.base_URL = server + '/w/api.php?format=json&action='
+        self.client = client if client else HTTPClient()
         self.base_volume = 'United States Reports/Volume ' 
-        self.cache = Cache()
+        self.batch_size = 50 # Most titles allowed in one query
+        self.missing_volumes = set()
+        self.outdated_volumes = set() # Cached volumes that have changed on Wikisource
+        self.cache = cache if cache else Cache()
+        self.calls = 0 # Requests made, with the bytes received and the seconds they took
+        self.bytes_received = 0
+        self.request_seconds = 0
+        self.retries = 3 # Times to retry a request that failed with a server error
+        self.retry_wait = 1 # Seconds to wait before the first retry, doubled for each one after it
         
     def case_exists(self, line):
-        '''Use the Wikisource API to parse the case line and determine if the case already exists
-        on Wikisource.'''
-        
+        '''Use the Wikisource API to determine if the case a line from the case list links to
+        already exists on Wikisource.'''
+        return self.cases_exist([line])[line]
+    
+    def cases_exist(self, lines):
+        '''Determine which of the cases linked to from a list of case lines already exist on
+        Wikisource. Returns a dictionary from each line to True or False, or None if the line
+        doesn't link to a case.'''
+        titles = dict((line, self.case_title(line)) for line in lines)
+        exists = self.titles_exist([title for title in titles.values() if title])
+        return self.lines_exist(titles, exists)
+    
+    def lines_exist(self, titles, exists):
+        '''Match up each line with whether its title exists.'''
+        return dict((line, exists[title] if title else None) for line, title in titles.items())
+    
+    def case_title(self, line):
+        '''Returns the title of the page a case line links to, or None if there is no link.'''
         # Avoid determining if category exists; this will return a false positive.
         title_match = re.search(r'\[{2}(?!:?Category)(?P<link>.*?)\]{2}', line)
         if title_match:
-            title = title_match.group("link")
-            
-        URL = self.base_URL + 'parse&text={0}&prop=links'.format(parse.quote(line))
-        response = self.request(URL)
-        for link in response["parse"]["links"]:
-            if link['*'] == title:
-                return "exists" in link
+            return title_match.group("link").split('|')[0]
+        return None
+    
+    def titles_exist(self, titles):
+        '''Check which of a list of pages exist on Wikisource. The titles are sent in batches of
+        up to 50, the most the API accepts in one query. Returns a dictionary from each title to True
+        or False. Pages that were checked for recently aren't asked about again.'''
+        exists = self.cache.known_titles(titles)
+        for batch, URL in self.title_batches([title for title in titles if title not in exists]):
+            self.read_titles(batch, self.request(URL), exists)
+        return exists
+    
+    def title_batches(self, titles):
+        '''Split a list of titles into batches to check. Returns a list of each batch and the URL
+        of its query.'''
+        titles = list(dict.fromkeys(titles)) # Remove duplicates, keep the order
+        batches = []
+        for i in range(0, len(titles), self.batch_size):
+            batch = titles[i:i+self.batch_size]
+            batches.append((batch, self.base_URL + 'query&titles={0}'.format(
+                parse.quote('|'.join(batch)))))
+        return batches
+    
+    def read_titles(self, batch, response, exists):
+        '''Add whether each title in a batch exists to the exists dictionary.'''
+        query = response.get("query", {})
+        # The API reports pages under their normalized titles (first letter capitalized,
+        # underscores replaced by spaces).
+        normalized = dict((title["from"], title["to"]) for title in query.get("normalized", []))
+        pages = dict((page["title"], "missing" not in page and "invalid" not in page)
+                     for page in query.get("pages", {}).values())
+        for title in batch:
+            exists[title] = pages.get(normalized.get(title, title), False)
+        self.cache.add_titles(dict((title, exists[title]) for title in batch))
         
     def get_case_line(self, title, vol, page):
         '''Find the case in the appropriate U.S. Reports list. Follows the following logic:
@@ -55,24 +118,79 @@ class API(object):
                 - Return line if only one is found
                 - Raise MultipleCases if multiple matches are found
            If neither of these returns a result, raise NoCaseInList
+           The outcome, whether it is the line or the error, is kept in the cache (see Cache).
         '''
         
         # Get the appropriate United States Reports/Volume page
         volume = parse.quote(self.base_volume + vol);
-        URL = self.base_URL + 'query&titles={0}&prop=revisions&rvprop=content'.format(volume)
-        content = self.cache.get_cached_volume(vol)
-        if not content:
+        URL = self.base_URL + 'query&titles={0}&prop=revisions&rvprop=content|ids'.format(volume)
+        # A case that was looked up in the cached revision of the list (or whose volume had no
+        # page) has the same outcome again
+        found = self.cache.get_lookup(vol, page, title)
+        if found and (found[1] == 'PageNotFound' or self.cache.is_cached(vol)):
+            line, error, message = found
+            if error:
+                raise LOOKUP_ERRORS[error](message)
+            return line
+        try:
+            line = self.search_volume(title, vol, page, volume, URL)
+        except tuple(LOOKUP_ERRORS.values()) as e:
+            self.cache.add_lookup(vol, page, title, error=type(e).__name__, message=e.value)
+            raise
+        self.cache.add_lookup(vol, page, title, line)
+        return line
+    
+    def search_volume(self, title, vol, page, volume, URL):
+        '''Get the volume's list of cases, from the cache or Wikisource, and find the case in it.'''
+        content = None
+        index = self.cache.get_volume_index(vol)
+        if not index:
+            if vol in self.missing_volumes:
+                raise PageNotFound("There is no Wikisource page at {}.".format(volume))
             response = self.request(URL)
             rev_id = list(response["query"]["pages"].keys())[0]
             if rev_id == "-1":
                 raise PageNotFound("There is no Wikisource page at {}.".format(volume))
-            content = response["query"]["pages"][rev_id]["revisions"][0]["*"]
-            self.cache.add_to_volume_cache(vol, content)
+            revision = response["query"]["pages"][rev_id]["revisions"][0]
+            content = revision["*"]
+            self.cache.add_to_volume_cache(vol, content, revision.get("revid"))
+            index = VolumeIndex.build(content)
         
+        if index.irregular or not (vol.isdigit() and page.isdigit()):
+            if content is None:
+                content = self.cache.get_cached_volume(vol)
+            line = self.find_line(content, title, vol, page, URL)
+        else:
+            line = self.find_indexed_line(index, content, title, vol, page, URL)
+        return line
+    
+    def find_indexed_line(self, index, content, title, vol, page, URL):
+        '''Find the case the same way as find_line(), looking its citation up in the volume's index.
+        The volume's content is only needed if the citation isn't in the index.'''
+        match = index.lines(vol, page)
+        if len(match) == 1:
+            return match[0]
+        elif match:
+            result = self.filter_multiple(title, match)
+            if result:
+                return result
+            raise MultipleCases("Unable to resolve multiple matches for {0} ({1} U.S."
+                                " {2}) in API query: {3}".format(title, vol, page, URL))
+        if content is None:
+            content = self.cache.get_cached_volume(vol)
+        return self.find_line(content, title, vol, page, URL, by_citation=False)
+    
+    def find_line(self, content, title, vol, page, URL, by_citation=True):
+        '''Search a volume's list of cases for the case, as described in get_case_line(). If
+        by_citation is False, the citation is known not to be in the list, so only search for the
+        title.'''
         # Search this page for "[volume] U.S. [page]"
-        rstring = "^.*?\D{0}\sU\.S\.\s{1}\D.*?$".format(vol, page)
-        regex = re.compile(rstring, re.MULTILINE)
-        match = regex.findall(content)
+        if by_citation:
+            rstring = "^.*?\D{0}\sU\.S\.\s{1}\D.*?$".format(vol, page)
+            regex = re.compile(rstring, re.MULTILINE)
+            match = regex.findall(content)
+        else:
+            match = []
         if match:
             if len(match) == 1:
                 return match[0]
@@ -99,6 +217,92 @@ class API(object):
                 raise NoCaseInList("Unable to find case {0} ({1} U.S. {2}) in the list of cases"
                                    " retrieved from API query: {3}.".format(title, vol, page, URL))
                 
+    def prefetch_volumes(self, volumes):
+        '''Fetch the United States Reports/Volume pages for every volume in the list that isn't
+        cached yet, with up to 50 pages in each query, and add them to the cache. Cached volumes
+        that haven't been checked within the cache's TTL are checked first, and the ones that have
+        changed on Wikisource since they were cached are fetched again. Volumes that have no page
+        are remembered, so get_case_line() doesn't ask for them again.'''
+        self.check_revisions([vol for vol in volumes if self.cache.needs_check(vol)])
+        for batch, URL in self.volume_batches(volumes):
+            continue_params = ''
+            while continue_params is not None:
+                continue_params = self.read_volumes(batch, self.request(URL + continue_params))
+                
+    def refresh_volumes(self, volumes):
+        '''Check every cached volume in the list against Wikisource, whatever its age, and fetch
+        the ones that have changed again.'''
+        self.check_revisions([vol for vol in volumes if self.cache.is_cached(vol)])
+        self.prefetch_volumes(volumes)
+    
+    def check_revisions(self, volumes):
+        '''Compare the revision IDs of cached volumes with the current revisions on Wikisource.
+        Only the page information is asked for, not the content, so this is a light query.'''
+        for batch, URL in self.revision_batches(volumes):
+            self.read_revisions(batch, self.request(URL))
+            
+    def revision_batches(self, volumes):
+        '''Split a list of volumes into batches whose revisions to check. Returns a list of each
+        batch, as a dictionary from page title to volume, and the URL of its query.'''
+        volumes = list(dict.fromkeys(volumes))
+        batches = []
+        for i in range(0, len(volumes), self.batch_size):
+            batch = dict((self.base_volume + vol, vol) for vol in volumes[i:i+self.batch_size])
+            batches.append((batch, self.base_URL + 'query&titles={0}&prop=info'.format(
+                parse.quote('|'.join(batch)))))
+        return batches
+    
+    def read_revisions(self, batch, response):
+        '''Mark the cached volumes in a response as checked if they are still current, or as
+        outdated if they have changed (or been deleted) since they were cached.'''
+        query = response.get("query", {})
+        normalized = dict((title["to"], title["from"]) for title in query.get("normalized", []))
+        for page in query.get("pages", {}).values():
+            vol = batch.get(normalized.get(page["title"], page["title"]))
+            if vol is None:
+                continue
+            revision = self.cache.get_revision(vol)
+            if revision is not None and page.get("lastrevid") == revision:
+                self.cache.mark_checked(vol)
+            else:
+                self.outdated_volumes.add(vol)
+    
+    def volume_batches(self, volumes):
+        '''Split the volumes that aren't cached yet, or are outdated, into batches to fetch.
+        Returns a list of each batch, as a dictionary from page title to volume, and the URL of its
+        query.'''
+        volumes = [vol for vol in dict.fromkeys(volumes)
+                   if vol in self.outdated_volumes or not self.cache.is_cached(vol)]
+        batches = []
+        for i in range(0, len(volumes), self.batch_size):
+            batch = dict((self.base_volume + vol, vol) for vol in volumes[i:i+self.batch_size])
+            batches.append((batch, self.base_URL + 'query&titles={0}&prop=revisions&rvprop=content|ids'
+                            .format(parse.quote('|'.join(batch)))))
+        return batches
+    
+    def read_volumes(self, batch, response):
+        '''Cache the volume pages in a response, and note the ones that don't exist. Content that
+        doesn't fit in one response comes in the next one, so this returns the parameters to add to
+        the query to get the rest, or None if there isn't any more.'''
+        query = response.get("query", {})
+        normalized = dict((title["to"], title["from"]) for title in query.get("normalized", []))
+        for page in query.get("pages", {}).values():
+            vol = batch.get(normalized.get(page["title"], page["title"]))
+            if vol is None:
+                continue
+            if "missing" in page or "invalid" in page:
+                self.missing_volumes.add(vol)
+                self.outdated_volumes.discard(vol)
+                self.cache.remove(vol)
+            elif "revisions" in page:
+                revision = page["revisions"][0]
+                self.cache.add_to_volume_cache(vol, revision["*"], revision.get("revid"))
+                self.outdated_volumes.discard(vol)
+        if "continue" not in response:
+            return None
+        return ''.join('&{0}={1}'.format(key, parse.quote(str(value)))
+                       for key, value in response["continue"].items())
+                
     def filter_multiple(self, title, match_list):
         '''Fuzzy-matches the case name in a list of possible matches. Occasionally the volume page
         will have multiple cases with the same volume and page numbers; this will try to match by
@@ -131,33 +335,426 @@ class API(object):
                 return None
     
     def request(self, url):
-        '''Generic API request function. Requires that the response format be JSON.'''
-        try:
-            response = json.loads(request.urlopen(url).read().decode('utf-8'))
-        except error.HTTPError:
+        '''Generic API request function. Requires that the response format be JSON. How long each
+        request took is kept in self.client.timings. A request that fails with a server error is
+        retried, waiting longer before each retry.'''
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            status, body = self.client.get(url)
+            self.count(body, time.perf_counter() - start)
+            if status < 500 or attempt == self.retries:
+                break
+            time.sleep(self.retry_wait * 2 ** attempt)
+        if status >= 400:
             exit("Exited: HTTPError when making API requests.")
-        else:
-            return response
+        return json.loads(body.decode('utf-8'))
+    
+    def count(self, body, seconds):
+        '''Count a request, with the size of its response and the seconds it took.'''
+        self.calls += 1
+        self.bytes_received += len(body)
+        self.request_seconds += seconds
+    
+    def close(self):
+        '''Close the pooled connections. A recording transport saves its responses.'''
+        self.client.close()
         
+class VolumeIndex(object):
+    '''Where each case is in a volume's list of cases, worked out once when the volume is cached so
+    that finding a case by its citation is a dictionary lookup instead of a search of the list.
+    Each line is indexed under every "[volume] U.S. [page]" in it, which are the lines the search
+    in get_case_line() finds. That search can also run across a line break, so a list with any
+    citation that a line break runs through, or that starts or ends a line, is marked irregular, and
+    is searched the old way instead.'''
+    
+    def __init__(self, pages, irregular):
+        self.pages = pages # "[volume] [page]" to the lines citing it, in order
+        self.irregular = irregular
+        self.size = sys.getsizeof(pages) + sum(sys.getsizeof(line) for lines in pages.values()
+                                               for line in lines)
+        
+    @classmethod
+    def build(cls, content):
+        pages = dict()
+        for line in content.split('\n'):
+            if 'U.S.' not in line:
+                continue
+            for key in dict.fromkeys(' '.join(cite) for cite in CITATION.findall(line)):
+                pages.setdefault(key, []).append(line)
+        return cls(pages, bool(IRREGULAR.search(content)))
+    
+    @classmethod
+    def load(cls, data):
+        index = json.loads(zlib.decompress(data).decode('utf-8'))
+        return cls(index["pages"], index["irregular"])
+    
+    def dump(self):
+        return zlib.compress(json.dumps({"pages": self.pages, "irregular": self.irregular})
+                             .encode('utf-8'))
+    
+    def lines(self, vol, page):
+        '''The lines that cite the volume and page.'''
+        return self.pages.get(vol + ' ' + page, [])
+
+class MemoryCache(object):
+    '''A least-recently-used cache held in memory. It holds at most max_entries values and at most
+    max_bytes bytes of them, as given when they are put in or measured by sys.getsizeof(); either
+    can be None for no limit. The least recently used values are evicted to make room for new
+    ones.'''
+    
+    def __init__(self, max_entries=64, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def get(self, key):
+        '''Returns the value for a key and marks it as used, or None if it isn't held.'''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def peek(self, key):
+        '''Returns the value for a key without marking it as used or counting it, or None.'''
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+    
+    def put(self, key, value, size=None):
+        '''Hold a value, evicting others if there isn't room. A value too big to ever fit isn't
+        held.'''
+        self.discard(key)
+        if size is None:
+            size = sys.getsizeof(value)
+        if self.max_entries == 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        self.entries[key] = (value, size)
+        self.size += size
+        while ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+               (self.max_bytes is not None and self.size > self.max_bytes)):
+            key, (value, size) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            
+    def discard(self, key):
+        '''Stop holding a key, if it is held.'''
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.size -= entry[1]
+            
+    def report(self):
+        return '{0} hits, {1} misses, {2} evictions'.format(self.hits, self.misses, self.evictions)
+
 class Cache(object):
+    '''The United States Reports/Volume pages that have been downloaded, which pages are known to
+    exist on Wikisource, and where cases were found in their volume's list, kept in one SQLite
+    database. The database is in write-ahead logging mode, so any number of processes can read it
+    while another writes, and every write is a transaction, so nothing ever reads half a volume.
+    Volume pages are compressed with zlib.
+    
+    Each volume is kept with the revision ID it was downloaded at, when it was downloaded, and when
+    that revision was last found to be current. Once ttl seconds have passed since then, the volume
+    should be checked against Wikisource again. A volume that hasn't been checked for max_staleness
+    seconds isn't used at all until it has been downloaded again. Either can be None for no limit.
+    Pages that were found to exist are trusted to still exist for ttl seconds. Pages that didn't
+    exist are only trusted not to for missing_ttl seconds, since they may have been uploaded since.
     
-    def __init__(self):
+    The outcome of looking each case up in its volume's list is kept for lookup_ttl seconds, or
+    until that volume is downloaded again: the line the case was found at, or the error if it
+    wasn't found, along with whether the user chose to continue with the case anyway.
+    
+    Volumes cached as files in the cache directory by earlier versions are moved into the database
+    the first time it is opened.
+    
+    Each volume is stored with its VolumeIndex. The volumes that were used most recently are also
+    held in memory (see MemoryCache), along with when they were last checked and their indexes, so
+    the cases of one volume only cost one read from the database between them.'''
+    
+    def __init__(self, path='cache/api.db', ttl=7*24*60*60, max_staleness=None, memory=None,
+                 lookup_ttl=30*24*60*60, missing_ttl=24*60*60):
+        self.path = path
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self.lookup_ttl = lookup_ttl
+        self.missing_ttl = missing_ttl
+        self.memory = memory if memory else MemoryCache()
+        self.hits = {'volumes': 0, 'titles': 0, 'lookups': 0}
+        self.misses = {'volumes': 0, 'titles': 0, 'lookups': 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS volumes (volume TEXT PRIMARY KEY, '
+                            'content BLOB, revision INTEGER, fetched REAL, checked REAL)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS titles (title TEXT PRIMARY KEY, '
+                            'checked REAL, present INTEGER DEFAULT 1)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS indexes (volume TEXT PRIMARY KEY, '
+                            'data BLOB)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS lookups (volume TEXT, page TEXT, '
+                            'title TEXT, line TEXT, error TEXT, message TEXT, choice TEXT, '
+                            'checked REAL DEFAULT 0, PRIMARY KEY (volume, page, title))')
+            # Databases made before every outcome was kept
+            self.add_columns('titles', [('present', 'INTEGER DEFAULT 1')])
+            self.add_columns('lookups', [('error', 'TEXT'), ('message', 'TEXT'), ('choice', 'TEXT'),
+                                         ('checked', 'REAL DEFAULT 0')])
+        self.migrate(directory)
+        
+    def add_columns(self, table, columns):
+        '''Add any of the (name, type) columns that the table doesn't have yet.'''
+        have = [row[1] for row in self.db.execute('PRAGMA table_info({0})'.format(table))]
+        for name, kind in columns:
+            if name not in have:
+                self.db.execute('ALTER TABLE {0} ADD COLUMN {1} {2}'.format(table, name, kind))
+        
+    def migrate(self, directory):
+        '''Move any volumes cached as files in the directory (along with the .json file recording
+        their revision, if they have one) into the database, then remove the files.'''
+        if not directory:
+            return
         try:
-            os.mkdir('cache')
-        except (OSError, IOError):
-            pass
+            names = [name for name in os.listdir(directory) if name.isdigit()]
+        except OSError:
+            return
+        for volume in names:
+            path = os.path.join(directory, volume)
+            try:
+                with open(path, 'r', encoding='utf-8') as cache_file:
+                    content = cache_file.read()
+                modified = os.path.getmtime(path)
+            except (OSError, IOError, UnicodeError):
+                continue
+            info = {"revision": None, "fetched": modified, "checked": modified}
+            try:
+                with open(path + '.json', 'r', encoding='utf-8') as info_file:
+                    info.update(json.load(info_file))
+            except (OSError, IOError, ValueError):
+                pass
+            with self.db:
+                # A volume that was downloaded into the database already is newer than the file
+                self.db.execute('INSERT OR IGNORE INTO volumes VALUES (?, ?, ?, ?, ?)',
+                                (volume, zlib.compress(content.encode('utf-8')), info["revision"],
+                                 info["fetched"], info["checked"]))
+            for old in [path, path + '.json']:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+                
+    def close(self):
+        self.db.close()
+
+    def is_cached(self, volume):
+        '''Whether a volume is in the cache, and not too stale to use.'''
+        held = self.memory.peek(volume)
+        age = time.time() - held[1] if held else self.age(volume)
+        return age != float('inf') and (self.max_staleness is None or age <= self.max_staleness)
 
     def get_cached_volume(self, volume):
-        '''Retrieve an already-cached volume, or None if it does not exist.'''
-        try:
-            with open('cache/' + volume, 'r', encoding='utf-8') as cache_file:
-                content = cache_file.read()
-                return content
-        except (OSError, IOError):
-            return None            
-    
-    def add_to_volume_cache(self, volume, content):
-        '''Add a volume to the cache.'''
-        with open('cache/' + volume, 'w', encoding='utf-8') as cache_file:
-            cache_file.write(content)
+        '''Retrieve an already-cached volume, or None if it does not exist or is too stale.'''
+        if not self.is_cached(volume):
+            self.misses['volumes'] += 1
+            return None
+        held = self.memory.get(volume)
+        if held and held[0] is not None:
+            self.hits['volumes'] += 1
+            return held[0]
+        row = self.db.execute('SELECT content, checked FROM volumes WHERE volume = ?',
+                              (volume,)).fetchone()
+        if row is None:
+            self.misses['volumes'] += 1
+            return None
+        self.hits['volumes'] += 1
+        content = zlib.decompress(row[0]).decode('utf-8')
+        self.hold(volume, content, row[1], held[2] if held else None)
+        return content
+    
+    def get_volume_index(self, volume):
+        '''Retrieve the index of an already-cached volume, or None if it does not exist or is too
+        stale. Volumes cached without an index are indexed now.'''
+        if not self.is_cached(volume):
+            self.misses['volumes'] += 1
+            return None
+        held = self.memory.get(volume)
+        if held and held[2] is not None:
+            self.hits['volumes'] += 1
+            return held[2]
+        row = self.db.execute('SELECT data, checked FROM indexes JOIN volumes USING (volume) '
+                              'WHERE volume = ?', (volume,)).fetchone()
+        if row is not None:
+            self.hits['volumes'] += 1
+            index = VolumeIndex.load(row[0])
+            self.hold(volume, held[0] if held else None, row[1], index)
+            return index
+        content = self.get_cached_volume(volume)
+        if content is None:
+            return None
+        index = VolumeIndex.build(content)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO indexes VALUES (?, ?)', (volume, index.dump()))
+        self.hold(volume, content, self.get_info(volume)["checked"], index)
+        return index
+    
+    def hold(self, volume, content, checked, index):
+        '''Hold a volume in memory, with when it was last checked and its index. Either the content
+        or the index can be None if it hasn't been read yet.'''
+        size = (sys.getsizeof(content) if content is not None else 0) + (index.size if index else 0)
+        self.memory.put(volume, (content, checked, index), size)
+    
+    def add_to_volume_cache(self, volume, content, revision=None):
+        '''Add a volume to the cache, along with the revision ID of the content and its index.
+        Where cases were found in the old content doesn't hold any more, so that is forgotten.'''
+        now = time.time()
+        index = VolumeIndex.build(content)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO volumes VALUES (?, ?, ?, ?, ?)',
+                            (volume, zlib.compress(content.encode('utf-8')), revision, now, now))
+            self.db.execute('INSERT OR REPLACE INTO indexes VALUES (?, ?)', (volume, index.dump()))
+            self.db.execute('DELETE FROM lookups WHERE volume = ?', (volume,))
+        self.hold(volume, content, now, index)
         return True
+    
+    def remove(self, volume):
+        '''Remove a volume from the cache, if it is there.'''
+        with self.db:
+            self.db.execute('DELETE FROM volumes WHERE volume = ?', (volume,))
+            self.db.execute('DELETE FROM indexes WHERE volume = ?', (volume,))
+            self.db.execute('DELETE FROM lookups WHERE volume = ?', (volume,))
+        self.memory.discard(volume)
+    
+    def get_info(self, volume):
+        '''The revision ID, fetch time and check time of a cached volume, as a dictionary, or None
+        if it isn't cached.'''
+        row = self.db.execute('SELECT revision, fetched, checked FROM volumes WHERE volume = ?',
+                              (volume,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["revision", "fetched", "checked"], row))
+        
+    def write_info(self, volume, info):
+        '''Write out the revision ID, fetch time and check time of a cached volume.'''
+        with self.db:
+            self.db.execute('UPDATE volumes SET revision = ?, fetched = ?, checked = ? '
+                            'WHERE volume = ?',
+                            (info["revision"], info["fetched"], info["checked"], volume))
+        self.hold_checked(volume, info["checked"])
+    
+    def get_revision(self, volume):
+        '''The revision ID a cached volume was downloaded at, or None if it isn't known.'''
+        info = self.get_info(volume)
+        return info["revision"] if info else None
+    
+    def age(self, volume):
+        '''Seconds since a cached volume was last found to be current.'''
+        info = self.get_info(volume)
+        return time.time() - info["checked"] if info else float('inf')
+    
+    def needs_check(self, volume):
+        '''Whether a volume is cached and due to be checked against Wikisource.'''
+        return self.ttl is not None and self.is_cached(volume) and self.age(volume) > self.ttl
+    
+    def mark_checked(self, volume):
+        '''Note that the cached revision of a volume was found to be current.'''
+        with self.db:
+            now = time.time()
+            self.db.execute('UPDATE volumes SET checked = ? WHERE volume = ?', (now, volume))
+        self.hold_checked(volume, now)
+        
+    def hold_checked(self, volume, checked):
+        '''Update when a volume held in memory was last checked.'''
+        held = self.memory.peek(volume)
+        if held:
+            self.hold(volume, held[0], checked, held[2])
+            
+    def known_titles(self, titles):
+        '''Returns a dictionary from each of the titles whose existence is still trusted (see
+        above) to True or False.'''
+        known = dict()
+        now = time.time()
+        for title in dict.fromkeys(titles):
+            row = self.db.execute('SELECT checked, present FROM titles WHERE title = ?',
+                                  (title,)).fetchone()
+            if row is not None and self.fresh(row[0], self.ttl if row[1] else self.missing_ttl, now):
+                known[title] = bool(row[1])
+                self.hits['titles'] += 1
+            else:
+                self.misses['titles'] += 1
+        return known
+    
+    def add_titles(self, exists):
+        '''Remember which of the titles in a dictionary from title to True or False exist.'''
+        now = time.time()
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO titles VALUES (?, ?, ?)',
+                                [(title, now, int(bool(exists[title]))) for title in exists])
+            
+    def fresh(self, checked, ttl, now=None):
+        '''Whether something last checked at the given time is still within the TTL.'''
+        return ttl is None or (now or time.time()) - checked <= ttl
+            
+    def get_lookup(self, volume, page, title):
+        '''The outcome of looking a case up in its volume's list, as a tuple of the line it was found
+        at and the name and message of the error if it wasn't found, or None if it hasn't been looked
+        up within the lookup TTL.'''
+        row = self.db.execute('SELECT line, error, message, checked FROM lookups WHERE volume = ? '
+                              'AND page = ? AND title = ?', (volume, page, title)).fetchone()
+        if row is None or not self.fresh(row[3], self.lookup_ttl):
+            self.misses['lookups'] += 1
+            return None
+        self.hits['lookups'] += 1
+        return row[:3]
+    
+    def add_lookup(self, volume, page, title, line=None, error=None, message=None):
+        '''Remember the line a case was found at in its volume's list, or the name and message of the
+        error if it wasn't found.'''
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?, ?, NULL, ?)',
+                            (volume, page, title, line, error, message, time.time()))
+            
+    def get_choice(self, volume, page, title):
+        '''Whether the user chose to continue ('y') or not ('n') with a case that wasn't found
+        cleanly in its volume's list, or None if they haven't been asked.'''
+        row = self.db.execute('SELECT choice FROM lookups WHERE volume = ? AND page = ? AND '
+                              'title = ?', (volume, page, title)).fetchone()
+        return row[0] if row else None
+    
+    def set_choice(self, volume, page, title, choice):
+        '''Remember whether the user chose to continue with a case.'''
+        with self.db:
+            self.db.execute('UPDATE lookups SET choice = ? WHERE volume = ? AND page = ? AND '
+                            'title = ?', (choice, volume, page, title))
+            
+    def invalidate(self, volumes):
+        '''Forget the volumes and every lookup in them, so they are downloaded and searched again.'''
+        for volume in volumes:
+            self.remove(volume)
+            
+    def report(self):
+        '''A line on how big the cache is and how often it was used.'''
+        size = 0
+        for path in [self.path, self.path + '-wal']:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        volumes, compressed = self.db.execute('SELECT COUNT(*), TOTAL(LENGTH(content)) '
+                                              'FROM volumes').fetchone()
+        titles = self.db.execute('SELECT COUNT(*) FROM titles').fetchone()[0]
+        lookups = self.db.execute('SELECT COUNT(*) FROM lookups').fetchone()[0]
+        rates = []
+        for kind in ['volumes', 'titles', 'lookups']:
+            total = self.hits[kind] + self.misses[kind]
+            if total:
+                rates.append('{0} {1:.0%} ({2} of {3})'.format(kind, self.hits[kind] / total,
+                                                               self.hits[kind], total))
+        return ('Cache: {0} volumes ({1:.1f} kB compressed), {2} pages checked for and {3} case '
+                'lookups in {4:.1f} kB. Hit rate: {5}. Volumes in memory: {6}.'.format(volumes,
+                compressed / 1024, titles, lookups, size / 1024,
+                ', '.join(rates) if rates else 'no lookups', self.memory.report()))
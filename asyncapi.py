@@ -0,0 +1,144 @@
+# -*- coding: utf-8  -*-
+#! python3
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from api import API
+from concurrent.futures import ThreadPoolExecutor
+from sys import exit
+import asyncio, json, time
+
+class AsyncAPI(API):
+    '''A version of API whose volume prefetches and existence checks are coroutines, so that many
+    queries can be waiting on Wikisource at once. Concurrency is the most requests in flight at a
+    time, and rate is the most requests started per second (no limit if it is None). Each request
+    asks the API to refuse it if the database replicas are lagged by more than maxlag seconds;
+    refused requests are retried after a pause, as are requests that fail with a server error, the
+    same way API.request() retries them. Requests are made through the same pooled client as
+    API, on a thread for each request in flight, and the responses are read the same way, so the
+    results are the same.'''
+    
+    def __init__(self, server='https://en.wikisource.org', client=None, cache=None, concurrency=4,
+                 rate=10, maxlag=5, maxlag_retries=5):
+        API.__init__(self, server, client, cache)
+        self.client.pool_size = max(self.client.pool_size, concurrency)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.maxlag = maxlag
+        self.maxlag_retries = maxlag_retries
+        self.maxlag_wait = 5 # Seconds to wait before retrying a request that was refused for lag
+        self.executor = ThreadPoolExecutor(concurrency)
+        self.loop = None
+        self.slots = None
+        self.rate_lock = None
+        self.next_request = 0
+        
+    async def query(self, url):
+        '''Make a request once a slot is free and the rate allows it. Requires that the response
+        format be JSON. Lookups that aren't coroutines, like get_case_line() for a volume that
+        wasn't prefetched, still go through API.request().'''
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # These belong to the event loop, so they are made again for each one
+            self.loop = loop
+            self.slots = asyncio.Semaphore(self.concurrency)
+            self.rate_lock = asyncio.Lock()
+        url += '&maxlag={0}'.format(self.maxlag)
+        async with self.slots:
+            for attempt in range(self.maxlag_retries + 1):
+                for retry in range(self.retries + 1):
+                    await self.throttle()
+                    start = time.perf_counter()
+                    status, body = await loop.run_in_executor(self.executor, self.client.get, url)
+                    self.count(body, time.perf_counter() - start)
+                    if status < 500 or retry == self.retries:
+                        break
+                    await asyncio.sleep(self.retry_wait * 2 ** retry)
+                if status >= 400:
+                    exit("Exited: HTTPError when making API requests.")
+                response = json.loads(body.decode('utf-8'))
+                if response.get("error", {}).get("code") != "maxlag":
+                    return response
+                await asyncio.sleep(self.maxlag_wait)
+        exit("Exited: Wikisource was too lagged to answer API requests.")
+        
+    async def throttle(self):
+        '''Wait until starting another request would stay within the rate.'''
+        if not self.rate:
+            return
+        async with self.rate_lock:
+            now = time.monotonic()
+            wait = self.next_request - now
+            self.next_request = max(now, self.next_request) + 1 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+            
+    async def cases_exist(self, lines):
+        '''Determine which of the cases linked to from a list of case lines already exist on
+        Wikisource. Returns a dictionary from each line to True or False, or None if the line
+        doesn't link to a case.'''
+        titles = dict((line, self.case_title(line)) for line in lines)
+        exists = await self.titles_exist([title for title in titles.values() if title])
+        return self.lines_exist(titles, exists)
+    
+    async def case_exists(self, line):
+        '''Determine whether the case a line from the case list links to exists on Wikisource.'''
+        return (await self.cases_exist([line]))[line]
+    
+    async def titles_exist(self, titles):
+        '''Check which of a list of pages exist on Wikisource, with every batch of titles checked
+        at once. Returns a dictionary from each title to True or False. Pages that were checked
+        for recently aren't asked about again.'''
+        exists = self.cache.known_titles(titles)
+        batches = self.title_batches([title for title in titles if title not in exists])
+        responses = await asyncio.gather(*[self.query(URL) for batch, URL in batches])
+        for (batch, URL), response in zip(batches, responses):
+            self.read_titles(batch, response, exists)
+        return exists
+    
+    async def prefetch_volumes(self, volumes):
+        '''Fetch the United States Reports/Volume pages for every volume in the list that isn't
+        cached yet, or has changed since it was cached, with every batch of pages fetched at once.'''
+        await self.check_revisions([vol for vol in volumes if self.cache.needs_check(vol)])
+        await asyncio.gather(*[self.prefetch_batch(batch, URL)
+                               for batch, URL in self.volume_batches(volumes)])
+        
+    async def refresh_volumes(self, volumes):
+        '''Check every cached volume in the list against Wikisource, whatever its age, and fetch
+        the ones that have changed again.'''
+        await self.check_revisions([vol for vol in volumes if self.cache.is_cached(vol)])
+        await self.prefetch_volumes(volumes)
+        
+    async def check_revisions(self, volumes):
+        '''Compare the revision IDs of cached volumes with the current revisions on Wikisource,
+        with every batch checked at once.'''
+        batches = self.revision_batches(volumes)
+        responses = await asyncio.gather(*[self.query(URL) for batch, URL in batches])
+        for (batch, URL), response in zip(batches, responses):
+            self.read_revisions(batch, response)
+        
+    async def prefetch_batch(self, batch, URL):
+        '''Fetch one batch of volume pages, following the continuation until all of them are in.'''
+        continue_params = ''
+        while continue_params is not None:
+            continue_params = self.read_volumes(batch, await self.query(URL + continue_params))
+            
+    def close(self):
+        '''Stop the request threads and close the pooled connections.'''
+        self.executor.shutdown()
+        API.close(self)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Measures cases per second through brandeis.py against the stand-in Wikisource API in
+benchmarks/wikiserver.py, as the latency of the API rises. Each run starts with an empty cache, in
+a directory of its own, on a fresh copy of the files. The share of the time spent waiting is how much
+longer the run took than the run with no latency. Requests that fail with --error-rate are retried
+by brandeis.py, waiting longer before each retry, so they add to the waiting; a run only stops early
+if one request fails every time. Without a directory of files, cases are made up by
+benchmarks/corpus.py.
+
+Run from the brandeis directory: python3 -m benchmarks.benchlatency [-d DIR | -n NUMBER]
+[-l LATENCY ...] [-c CONCURRENCY] [--jitter SECONDS] [--error-rate RATE] [--lag-rate RATE]'''
+
+from benchmarks.corpus import write_corpus
+from benchmarks.wikiserver import Wiki, WikiServer, volume_pages
+import argparse, os, shutil, subprocess, sys, tempfile, time
+
+BRANDEIS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'brandeis.py')
+
+def run(directory, url, concurrency):
+    '''Run brandeis.py on a copy of the files in directory, against the server at url. Returns the
+    seconds it took, whether it finished, and the number of bot files it wrote.'''
+    work = tempfile.mkdtemp()
+    try:
+        shutil.copytree(directory, os.path.join(work, 'in'))
+        start = time.perf_counter()
+        finished = subprocess.call([sys.executable, BRANDEIS, '-d', 'in', '--server', url,
+                                    '-c', str(concurrency)], cwd=work, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0
+        seconds = time.perf_counter() - start
+        botfiles = os.path.join(work, 'botfiles')
+        written = len([name for name in os.listdir(botfiles) if name != 'pdfs']
+                      if os.path.isdir(botfiles) else [])
+        return seconds, finished, written
+    finally:
+        shutil.rmtree(work)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time brandeis.py against a stand-in Wikisource '
+                                     'API with rising latency.')
+    files = parser.add_mutually_exclusive_group()
+    files.add_argument('-d', '--dir', help='Directory of lochner files to convert.')
+    files.add_argument('-n', '--number', type=int, default=20,
+                       help='Number of cases to make up, if there is no directory.')
+    parser.add_argument('-l', '--latency', type=float, nargs='+', default=[0, 0.05, 0.1, 0.2, 0.4],
+                        help='Seconds of latency to run with, one run each.')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='Number of Wikisource queries brandeis.py has in flight at once.')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Most seconds of random latency on top of the latency.')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Share of requests to fail with a 503, which are retried.')
+    parser.add_argument('--lag-rate', type=float, default=0,
+                        help='Share of requests with a maxlag parameter to refuse as lagged.')
+    args = parser.parse_args()
+
+    made_up = None
+    if not args.dir:
+        args.dir = made_up = tempfile.mkdtemp()
+        write_corpus(made_up, args.number)
+    files = [os.path.join(args.dir, file) for file in os.listdir(args.dir)]
+    pages = volume_pages(files)
+    latencies = sorted(set([0] + args.latency))
+    print('{0} cases in {1} volumes, concurrency {2}'.format(len(files), len(pages),
+                                                              args.concurrency))
+    print('{0:>9} {1:>9} {2:>9} {3:>9} {4:>9}'.format('latency', 'seconds', 'cases/s', 'requests',
+                                                      'waiting'))
+    base = None
+    for latency in latencies:
+        wiki = Wiki(pages, latency, args.jitter, args.error_rate, args.lag_rate)
+        server = WikiServer(wiki).start()
+        try:
+            seconds, finished, written = run(args.dir, server.url, args.concurrency)
+        finally:
+            server.stop()
+        if base is None:
+            base = seconds
+        line = '{0:>9.3f} {1:>9.2f} {2:>9.1f} {3:>9} {4:>8.0%}'.format(
+            latency, seconds, len(files) / seconds, wiki.requests, max(seconds - base, 0) / seconds)
+        if not finished:
+            line += '  (stopped early: {0} failed, {1} lagged)'.format(wiki.errors, wiki.lagged)
+        elif written < len(files):
+            line += '  ({0} bot files written)'.format(written)
+        print(line)
+    if made_up:
+        shutil.rmtree(made_up)
+
+if __name__ == '__main__':
+    main()
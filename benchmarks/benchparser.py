@@ -0,0 +1,66 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Measures tokens per second through Parser.parse(), using the handler table and using the old
+dispatch, which built and exec'd a 'self.<type>()' string for every token.
+
+Run from the brandeis directory: python3 -m benchmarks.benchparser [-n NUMBER]'''
+
+import argparse, io, timeit
+from caseparser import Parser
+from tokenizer import Tokenizer
+from benchmarks.benchtokenizer import PER_CURIAM
+
+class ExecParser(Parser):
+    '''Parser with the dispatch it had before the handler table.'''
+    def dispatch(self):
+        for token in self.tokens:
+            self.value = token[1]
+            if self.value:
+                command = 'self.{0}()'.format(token[0].lower())
+                try:
+                    exec(command)
+                except AttributeError as e:
+                    self.logger.error("No command for " + command + ". " + repr(e));
+                    break;
+                except Exception as e:
+                    self.logger.error("Exception while parsing: " + repr(e));
+                    break;
+                else:
+                    self.write(self.value)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time Parser.parse() with both dispatch methods.')
+    parser.add_argument('-n', '--number', type=int, default=200,
+                        help='Number of times to parse the document.')
+    number = parser.parse_args().number
+    
+    tokens = Tokenizer(dict()).analyze(PER_CURIAM)
+    outputs = dict()
+    for name, cls in [('exec', ExecParser), ('table', Parser)]:
+        output = io.StringIO()
+        cls(dict()).parse(tokens, output)
+        outputs[name] = output.getvalue()
+        seconds = timeit.timeit(lambda: cls(dict()).parse(tokens, io.StringIO()), number=number)
+        print('{0:>6}: {1:10.0f} tokens/s'.format(name, len(tokens) * number / seconds))
+    if outputs['exec'] != outputs['table']:
+        print('Warning: the two dispatch methods produced different output.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Times each stage of converting a case (strip_extraneous, Validator.validate, Tokenizer.analyze,
+Parser.parse, Postprocessor.process and BotParser.prepare) over a fixed corpus, and checks that the
+bot files are the same as the golden ones in benchmarks/golden. The corpus is made up by
+benchmarks/corpus.py with a fixed seed, so it is the same on every machine.
+
+Each stage's throughput, in cases per second, is the best of several runs over the corpus. It is
+compared with the baseline saved by an earlier run on the same machine (benchmarks/baseline.json,
+which isn't committed, since timings from one machine mean nothing on another). The benchmark fails,
+exiting with status 1, if any bot file differs from its golden one, or if any stage is slower than
+the baseline by more than the threshold. Save a baseline before making a change, then run this
+again after it.
+
+Run from the brandeis directory: python3 -m benchmarks.benchstages [-r REPEAT] [--threshold SHARE]
+[--save-baseline] [--update-golden] [--corpus DIR --golden DIR]'''
+
+from benchmarks.corpus import write_corpus
+from bot.botparser import BotParser
+from caseparser import Parser, get_metadata, strip_extraneous
+from postprocessor import Postprocessor
+from tokenizer import Tokenizer
+from validator import Validator
+import argparse, io, json, logging, os, re, shutil, sys, tempfile, time
+
+STAGES = ['strip_extraneous', 'validate', 'analyze', 'parse', 'process', 'prepare']
+CORPUS = dict(number=16, pages=(1, 8), footnotes=1.5, separate=2, per_curiam=0.2, seed=0)
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN = os.path.join(HERE, 'golden')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+def read_corpus(directory):
+    '''Returns a list of the name and text of each file in a directory.'''
+    cases = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'r', encoding='utf-8') as html:
+            cases.append((name, html.read()))
+    return cases
+
+def convert(raw, work, output):
+    '''Convert one case, the way brandeis.py does, into a bot file in the output directory. The
+    stripped text is written to work for the validator. Returns the seconds each stage took, or
+    None if the case doesn't pass validation.'''
+    times = dict()
+    start = time.perf_counter()
+    content = strip_extraneous(raw)
+    times['strip_extraneous'] = time.perf_counter() - start
+    with open(work, 'w', encoding='utf-8') as html:
+        html.write(content)
+
+    start = time.perf_counter()
+    try:
+        Validator(work).validate()
+    except Exception:
+        return None
+    times['validate'] = time.perf_counter() - start
+    metadict = dict()
+    get_metadata(metadict, work)
+
+    start = time.perf_counter()
+    tokens = Tokenizer(metadict).analyze(content)
+    times['analyze'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = io.StringIO()
+    Parser(metadict).parse(tokens, parsed)
+    times['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wikitext = Postprocessor(parsed.getvalue()).process()
+    times['process'] = time.perf_counter() - start
+
+    name = re.sub(r'[^a-zA-Z0-9_]', '', metadict['title'])
+    start = time.perf_counter()
+    BotParser(wikitext, os.path.join(output, name), metadict).prepare()
+    times['prepare'] = time.perf_counter() - start
+    return times
+
+def run(cases, output):
+    '''Convert every case into the output directory. Returns the total seconds for each stage.'''
+    totals = dict((stage, 0) for stage in STAGES)
+    work = os.path.join(output, '.case.html')
+    for name, raw in cases:
+        times = convert(raw, work, output)
+        for stage in times or ():
+            totals[stage] += times[stage]
+    os.remove(work)
+    return totals
+
+def compare(output, golden):
+    '''Returns the names of the bot files that differ between the output and golden directories,
+    or that are only in one of them.'''
+    names = set(os.listdir(output)) | set(os.listdir(golden))
+    differ = []
+    for name in sorted(names):
+        paths = [os.path.join(output, name), os.path.join(golden, name)]
+        if not all(os.path.isfile(path) for path in paths):
+            differ.append(name)
+            continue
+        texts = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as botfile:
+                texts.append(botfile.read())
+        if texts[0] != texts[1]:
+            differ.append(name)
+    return differ
+
+def measure(cases, repeat):
+    '''Convert the cases repeat times, after one run to warm up. Returns the cases per second of
+    each stage (from the fastest run of that stage), and the directory of bot files from the last
+    run, which the caller should remove.'''
+    best = dict((stage, None) for stage in STAGES)
+    output = None
+    for i in range(repeat + 1):
+        if output:
+            shutil.rmtree(output)
+        output = tempfile.mkdtemp()
+        totals = run(cases, output)
+        if i == 0:
+            continue # The first Tokenizer builds or loads the lexer table
+        for stage in STAGES:
+            if best[stage] is None or totals[stage] < best[stage]:
+                best[stage] = totals[stage]
+    return dict((stage, len(cases) / max(best[stage], 1e-9)) for stage in STAGES), output
+
+def regressions(throughput, baseline, threshold):
+    '''Returns the stages whose throughput is lower than the baseline's by more than the threshold
+    (a share of the baseline).'''
+    return [stage for stage in STAGES if stage in baseline and
+            throughput[stage] < baseline[stage] * (1 - threshold)]
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each stage of the conversion and check the '
+                                     'bot files against the golden ones.')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Number of timed runs over the corpus.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Share of the baseline throughput a stage can lose before this fails.')
+    parser.add_argument('--baseline', default=BASELINE, help='File the baseline is kept in.')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Save the throughput of this run as the baseline.')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Replace the golden bot files with the ones from this run.')
+    parser.add_argument('--corpus', help='Directory of lochner files to use instead of the '
+                        'made-up corpus.')
+    parser.add_argument('--golden', help='Directory of golden bot files for --corpus.')
+    args = parser.parse_args()
+    logging.getLogger('brandeis').addHandler(logging.NullHandler()) # Warnings are expected
+
+    if args.corpus:
+        cases = read_corpus(args.corpus)
+        golden = args.golden
+    else:
+        directory = tempfile.mkdtemp()
+        write_corpus(directory, **CORPUS)
+        cases = read_corpus(directory)
+        shutil.rmtree(directory)
+        golden = GOLDEN
+    throughput, output = measure(cases, args.repeat)
+
+    failed = False
+    if args.update_golden and golden:
+        shutil.rmtree(golden, ignore_errors=True)
+        shutil.copytree(output, golden)
+        print('Updated the golden bot files in {0}.'.format(golden))
+    elif golden:
+        differ = compare(output, golden)
+        if differ:
+            failed = True
+            print('Bot files that differ from the golden ones: ' + ', '.join(differ))
+    shutil.rmtree(output)
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    except (OSError, IOError, ValueError):
+        baseline = dict()
+    print('{0} cases, best of {1} runs'.format(len(cases), args.repeat))
+    print('{0:>16} {1:>10} {2:>10} {3:>8}'.format('stage', 'cases/s', 'baseline', 'change'))
+    for stage in STAGES:
+        if stage in baseline:
+            print('{0:>16} {1:>10.1f} {2:>10.1f} {3:>+8.1%}'.format(
+                stage, throughput[stage], baseline[stage], throughput[stage] / baseline[stage] - 1))
+        else:
+            print('{0:>16} {1:>10.1f}'.format(stage, throughput[stage]))
+    slower = regressions(throughput, baseline, args.threshold)
+    if slower:
+        failed = True
+        print('Slower than the baseline by more than {0:.0%}: {1}'.format(args.threshold,
+                                                                         ', '.join(slower)))
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(throughput, baseline_file, indent=1)
+        print('Saved the baseline to {0}.'.format(args.baseline))
+    elif not baseline:
+        print('There is no baseline yet; save one with --save-baseline.')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Times how long it takes to set up a Tokenizer for each case. Building a lexer from scratch
+validates every rule and compiles the master regex; cloning the master lexer does neither.
+
+Run from the brandeis directory: python3 -m benchmarks.benchtokenizer [-n NUMBER]'''
+
+import argparse, timeit
+import ply.lex as lex
+from tokenizer import Tokenizer
+
+# A short per curiam opinion, as it looks after strip_extraneous()
+PER_CURIAM = ('<h1>Foo v. Bar - 100 U.S. 200 (1900)</h1><p>U.S. Supreme Court</p><p>Foo v. Bar, 100 '
+              'U.S. 200 (1900)</p><p>No. 12-345</p><p>Decided February 6, 1900</p><p>PER CURIAM.</p>'
+              '<p>The judgment is <i>affirmed</i> by an equally divided Court. See <a href="/cases/'
+              'federal/us/99/1/">99 U.S. 1</a>; &sect; 5.</p><blockquote><p>Quoted text.</p>'
+              '</blockquote><p><em>It is so ordered.</em></p>'
+              'Source: http://supreme.justia.com/us/100/200/case.html')
+
+def build(metadict):
+    '''Set up a Tokenizer the way it was done before the master lexer existed.'''
+    tokenizer = Tokenizer(metadict)
+    tokenizer.lexer = lex.lex(module=tokenizer)
+    return tokenizer
+
+def clone(metadict):
+    return Tokenizer(metadict)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time Tokenizer setup for each case.')
+    parser.add_argument('-n', '--number', type=int, default=200, help='Number of cases to time.')
+    number = parser.parse_args().number
+    
+    for name, setup in [('build', build), ('clone', clone)]:
+        total = timeit.timeit(lambda: setup(dict()).analyze(PER_CURIAM), number=number)
+        setup_only = timeit.timeit(lambda: setup(dict()), number=number)
+        print('{0:>6}: {1:8.1f} us setup, {2:8.1f} us per case'
+              .format(name, setup_only / number * 1e6, total / number * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''Writes made-up cases in the form lochner saves them from Justia, for benchmarking without real
+pages. Each case has the <h1> title, the <article id="maincontent"> around the case, the syllabus,
+an opinion of the Court or a per curiam opinion, and any number of concurrences and dissents. The
+text has page-number links between and inside paragraphs, footnote links (#F and #T, with #F2/1 and
+so on in the separate opinions), blockquotes, links to other cases, italics, HTML entities, and
+names and abbreviations in capitals that become small caps.
+
+Cases are sized in printed pages, from a one-page per curiam up to opinions hundreds of pages long,
+with a given number of footnotes per page. The same seed always makes the same cases.
+
+Run from the brandeis directory: python3 -m benchmarks.corpus DIR [-n NUMBER] [--pages MIN MAX]
+[--footnotes PER_PAGE] [--separate MOST] [--per-curiam SHARE] [--seed SEED]'''
+
+import argparse, os, random
+
+WORDS = ('the court held that state law may not impose such burden upon commerce among several '
+         'states which congress alone can regulate under constitution act statute question '
+         'whether judgment below is reversed affirmed petitioner respondent contract property '
+         'right due process of equal protection clause power to tax railroad company charter '
+         'legislature authority jurisdiction federal was there no evidence record trial jury '
+         'verdict error instruction argument decision rule this case we think it must be').split()
+PARTIES = ['Smith', 'Jones', 'Brown', 'Miller', 'Davis', 'Wilson', 'Taylor', 'Clark', 'Lewis',
+           'Walker', 'Hall', 'Allen', 'Young', 'King', 'Wright', 'Hill', 'Green', 'Adams', 'Baker',
+           'Nelson', 'Carter', 'Mitchell', 'Roberts', 'Turner', 'Phillips', 'Campbell', 'Parker',
+           'Evans', 'Edwards', 'Collins', 'Stewart', 'Morris', 'Murphy', 'Cook', 'Rogers',
+           'Morgan', 'Cooper', 'Peterson', 'Bailey', 'Reed']
+OPPONENTS = ['United States', 'New York', 'Pennsylvania', 'Ohio', 'Virginia', 'Illinois',
+             'Massachusetts', 'Kentucky', 'Missouri', 'Texas', 'California', 'Louisiana',
+             'Northern Pacific Railway Co.', 'Union Pacific Railroad Co.', 'Western Union '
+             'Telegraph Co.', 'Bank of Commerce', 'City of Chicago', 'Board of Education',
+             'Commissioner of Internal Revenue', 'Standard Oil Co.', 'Insurance Co. of North '
+             'America', 'Mutual Life Insurance Co.', 'Southern Railway Co.', 'Pullman Co.',
+             'American Sugar Refining Co.', 'Mayor of Baltimore', 'Collector of Customs',
+             'Interstate Commerce Commission', 'Federal Trade Commission', 'Steamship Co.']
+JUSTICES = ['HOLMES', 'BRANDEIS', 'HARLAN', 'FIELD', 'MILLER', 'BRADLEY', 'McKENNA', 'DAY',
+            'HUGHES', 'STONE', 'SUTHERLAND', 'BUTLER', 'McREYNOLDS', 'BLACK', 'DOUGLAS',
+            'FRANKFURTER', 'JACKSON', 'REED']
+ABBREVIATIONS = ['ICC', 'FTC', 'NLRB', 'SEC', 'U.S.C.', 'Stat.', 'Rev. Stat.']
+WORDS_PER_PAGE = 400
+
+class CaseWriter(object):
+    '''Writes one case. Pages are counted by words, and a page-number link goes in wherever the
+    count passes the end of a page. Footnotes are numbered separately in each opinion: the
+    opinion of the Court (or per curiam opinion) has footnotes 1, 2, ..., and the nth separate
+    opinion has n+1/1, n+1/2, ....'''
+
+    def __init__(self, rand, volume, page, year):
+        self.random = rand
+        self.volume = volume
+        self.page = page            # The page the text is on now
+        self.year = year
+        self.words = 0              # Words on the current page so far
+        self.body = []
+
+    def sentence(self, length):
+        words = [self.random.choice(WORDS) for i in range(length)]
+        words[0] = words[0].capitalize()
+        extra = self.random.random()
+        if extra < 0.08:
+            volume = self.random.randint(1, max(self.volume - 1, 1))
+            words.append('See <a href="/cases/federal/us/{0}/{1}/case.html">{0} U.S. {1}</a>'
+                         .format(volume, self.random.randint(1, 999)))
+        elif extra < 0.14:
+            words.append('<i>{0} v. {1}</i>'.format(self.random.choice(PARTIES),
+                                                    self.random.choice(OPPONENTS)))
+        elif extra < 0.18:
+            words.append('&sect; {0} of the Act'.format(self.random.randint(1, 40)))
+        elif extra < 0.22:
+            words.append('the {0}'.format(self.random.choice(ABBREVIATIONS)))
+        elif extra < 0.24:
+            words.append('as MR. JUSTICE {0} said'.format(self.random.choice(JUSTICES)))
+        elif extra < 0.26:
+            words.append('"the {0} &amp; the {1}"'.format(*self.random.sample(WORDS, 2)))
+        return ' '.join(words) + '.'
+
+    def paragraph_text(self, length):
+        '''A paragraph of about length words, in sentences, with a page-number link inside it if the
+        page ends partway through.'''
+        sentences = []
+        written = 0
+        while written < length:
+            size = self.random.randint(8, 30)
+            sentences.append(self.sentence(size))
+            written += size
+            self.words += size
+            if self.words >= WORDS_PER_PAGE and written < length:
+                sentences.append(self.page_link())
+        return ' '.join(sentences)
+
+    def page_link(self):
+        self.page += 1
+        self.words = 0
+        return ('<a class="page-number" name="{0}" href="#{0}">Page {1} U. S. {0}</a>'
+                .format(self.page, self.volume))
+
+    def paragraphs(self, pages, footnotes, section=None):
+        '''Write an opinion's paragraphs, about pages long, with footnotes per page on average.
+        Returns the footnote numbers used.'''
+        numbers = []
+        target = int(pages * WORDS_PER_PAGE)
+        written = 0
+        while written < target:
+            if self.words >= WORDS_PER_PAGE:
+                # The link to a page goes right before its text, so a case never ends with one
+                self.body.append(self.page_link())
+            length = self.random.randint(40, 160)
+            text = self.paragraph_text(length)
+            written += length
+            expected = footnotes * length / WORDS_PER_PAGE
+            for i in range(int(expected) + (self.random.random() < expected % 1)):
+                number = len(numbers) + 1
+                numbers.append(number)
+                name = str(number) if section is None else '{0}/{1}'.format(section, number)
+                text += ' <a href="#F{0}" name="T{0}">Footnote {0}</a>'.format(name)
+            self.body.append('<p>' + text + '</p>')
+            if self.random.random() < 0.06:
+                self.blockquote()
+        return numbers
+
+    def blockquote(self):
+        paragraphs = ['<p>"' + self.sentence(self.random.randint(10, 40)) + '"</p>']
+        if self.random.random() < 0.5:
+            paragraphs.append('<p>* * * ' + self.sentence(self.random.randint(10, 30)) + '</p>')
+        self.body.append('<blockquote>' + ''.join(paragraphs) + '</blockquote>')
+
+    def footnotes(self, numbers, section=None):
+        for number in numbers:
+            name = str(number) if section is None else '{0}/{1}'.format(section, number)
+            self.body.append('<p><a href="#T{0}" name="F{0}">Footnote {0}</a></p>'.format(name))
+            for i in range(self.random.choice([1, 1, 1, 2])):
+                self.body.append('<p>' + ' '.join(self.sentence(self.random.randint(6, 25))
+                                                  for j in range(self.random.randint(1, 3)))
+                                 + '</p>')
+
+def make_case(index, volume, page, year, pages=5, footnotes=1, separate=0, per_curiam=False,
+              seed=0):
+    '''Make the HTML for a case about pages long, starting at the given page of the volume, with
+    footnotes per page on average and the given number of separate opinions. Returns the title, the
+    HTML, and the page the case ends on.'''
+    rand = random.Random('{0}/{1}'.format(seed, index))
+    title = '{0} v. {1}'.format(PARTIES[index % len(PARTIES)],
+                                OPPONENTS[(index // len(PARTIES)) % len(OPPONENTS)])
+    if index >= len(PARTIES) * len(OPPONENTS):
+        title = '{0} {1}'.format(title, index // (len(PARTIES) * len(OPPONENTS)) + 1)
+    writer = CaseWriter(rand, volume, page, year)
+    writer.body.extend(['<h1>{0} - {1} U.S. {2} ({3})</h1>'.format(title, volume, page, year),
+                        '<p>U.S. Supreme Court</p>',
+                        '<p>{0}, {1} U.S. {2} ({3})</p>'.format(title, volume, page, year),
+                        '<p>{0}</p>'.format(title), '<p>No. {0}</p>'.format(rand.randint(1, 999))])
+    if not per_curiam:
+        writer.body.append('<p>Argued {0} {1}, {2}</p>'.format(rand.choice(['January', 'March',
+                           'October']), rand.randint(1, 28), year))
+    writer.body.append('<p>Decided {0} {1}, {2}</p>'.format(rand.choice(['February', 'April',
+                       'May', 'December']), rand.randint(1, 28), year))
+    if not per_curiam:
+        writer.body.append('<p>Syllabus</p>')
+        writer.paragraphs(min(pages, 4) * 0.15, 0)
+    # The opinion of the Court gets most of the pages; the separate opinions share the rest
+    share = 1 if not separate else 0.6
+    if per_curiam:
+        writer.body.append('<p>PER CURIAM.</p>')
+    else:
+        writer.body.append('<p>MR. JUSTICE {0} delivered the opinion of the Court.</p>'
+                           .format(rand.choice(JUSTICES)))
+    numbers = writer.paragraphs(max(pages * share, 0.3), footnotes)
+    writer.body.append(rand.choice(['<p><em>It is so ordered.</em></p>', '<p><i>Affirmed.</i></p>',
+                                    '<p><i>Reversed.</i></p>']))
+    writer.footnotes(numbers)
+    for i in range(separate):
+        section = i + 2
+        kind = rand.choice(['concurring', 'dissenting', 'dissenting'])
+        writer.body.append('<p>MR. JUSTICE {0}, {1}.</p>'.format(rand.choice(JUSTICES), kind))
+        numbers = writer.paragraphs(max(pages * (1 - share) / separate, 0.3), footnotes, section)
+        writer.footnotes(numbers, section)
+    html = ('<html><head><title>{0}</title></head><body>\n<article id="maincontent">{1}</article>\n'
+            '</body></html>\nSource: http://supreme.justia.com/us/{2}/{3}/case.html\n'
+            .format(title, ''.join(writer.body), volume, page))
+    return title, html, writer.page
+
+def write_corpus(directory, number=20, pages=(1, 20), footnotes=1, separate=2, per_curiam=0.1,
+                 seed=0):
+    '''Write number cases to directory, each between pages[0] and pages[1] printed pages long, with
+    footnotes per page on average, up to separate concurrences and dissents, and per curiam opinions
+    for a share of them. The cases follow on from each other through the volumes. Returns the
+    paths of the files.'''
+    rand = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    volume, page, year = 100, 1, 1880
+    for index in range(number):
+        size = rand.uniform(pages[0], pages[1])
+        if page + size > 990:
+            volume, page, year = volume + 1, 1, year + 1
+        is_per_curiam = rand.random() < per_curiam
+        title, html, last = make_case(index, volume, page, year, size, footnotes,
+                                      0 if is_per_curiam else rand.randint(0, separate),
+                                      is_per_curiam, seed)
+        files.append(os.path.join(directory, 'case{0:05d}.html'.format(index)))
+        with open(files[-1], 'w', encoding='utf-8') as html_file:
+            html_file.write(html)
+        page = last + 1
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description='Write made-up cases in the form lochner saves '
+                                     'them.')
+    parser.add_argument('dir', help='Directory to write the cases to.')
+    parser.add_argument('-n', '--number', type=int, default=20, help='Number of cases.')
+    parser.add_argument('--pages', type=float, nargs=2, default=[1, 20], metavar=('MIN', 'MAX'),
+                        help='Shortest and longest case, in printed pages.')
+    parser.add_argument('--footnotes', type=float, default=1,
+                        help='Footnotes per page, on average.')
+    parser.add_argument('--separate', type=int, default=2,
+                        help='Most concurrences and dissents in one case.')
+    parser.add_argument('--per-curiam', type=float, default=0.1,
+                        help='Share of the cases with a per curiam opinion.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the random choices.')
+    args = parser.parse_args()
+
+    files = write_corpus(args.dir, args.number, args.pages, args.footnotes, args.separate,
+                         args.per_curiam, args.seed)
+    size = sum(os.path.getsize(file) for file in files)
+    print('Wrote {0} cases ({1:.1f} MB) to {2}'.format(len(files), size / 1024 ** 2, args.dir))
+
+if __name__ == '__main__':
+    main()
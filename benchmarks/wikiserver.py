@@ -0,0 +1,220 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''A local stand-in for the Wikisource API, for seeing how brandeis behaves when the API is slow or
+unreliable. It answers the action=query requests that api.py makes (page existence, revision IDs,
+and page content) from pages it holds in memory. Every response can be held back by a fixed latency plus random jitter, a share of requests can fail
+with a 503, and a share of the requests that send a maxlag parameter can be refused as lagged, the
+way Wikisource refuses them.
+
+The pages are made from a directory of lochner files: a volume page lists every case in that volume,
+so that each case is found in its list, and none of the cases exist yet.
+
+Run from the brandeis directory: python3 -m benchmarks.wikiserver -d DIR [--port PORT] [--latency
+SECONDS] [--jitter SECONDS] [--error-rate RATE] [--lag-rate RATE]'''
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+import argparse, json, os, random, re, threading, time
+
+TITLE = re.compile(r'<h1>(?P<title>[^<]*?\sv\.\s[^<]*?)\s\-\s(?P<volume>\d{1,3})\sU.S.\s'
+                   r'(?P<page>\d{1,3})\s\((?P<date>\d{4})\)</h1>')
+VOLUME = 'United States Reports/Volume '
+
+def volume_pages(files):
+    '''Make a volume page for every volume the files are in, listing the file's cases. Returns a
+    dictionary from page title to wikitext.'''
+    volumes = dict()
+    for file in files:
+        with open(file, 'r', encoding='utf-8') as html:
+            match = TITLE.search(html.read())
+        if match:
+            volumes.setdefault(match.group('volume'), []).append(match)
+    pages = dict()
+    for volume, cases in volumes.items():
+        lines = ['{{header\n | title = [[United States Reports]], Volume ' + volume + '\n}}\n']
+        for case in sorted(cases, key=lambda case: int(case.group('page'))):
+            lines.append('* [http://openjurist.org/{0}/us/{1} {0} U.S. {1}] ([[:Category:{2} works|'
+                         '{2}]]) [[{3}]]'.format(volume, case.group('page'), case.group('date'),
+                                                 case.group('title')))
+        lines.append('\n[[Category:United States Reports|' + volume + ']]')
+        pages[VOLUME + volume] = '\n'.join(lines)
+    return pages
+
+class Wiki(object):
+    '''The pages the server knows about, and how it misbehaves. Each page gets a page ID and a
+    revision ID. Latency and jitter are in seconds, and the rates are the share of requests that
+    fail or are refused as lagged. Random choices come from a seeded generator, so two runs with the
+    same settings behave the same way.'''
+
+    def __init__(self, pages, latency=0, jitter=0, error_rate=0, lag_rate=0, lag=10, seed=0):
+        self.pages = dict()
+        for i, title in enumerate(sorted(pages)):
+            self.pages[title] = (i + 1, 1000 + i, pages[title])
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lag_rate = lag_rate
+        self.lag = lag # Seconds of lag reported when a request is refused
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.lagged = 0
+
+    def draw(self, params):
+        '''Count a request and decide what happens to it. Returns the delay before answering it, and
+        'error', 'lagged', or None if it should be answered.'''
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            outcome = None
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                outcome = 'error'
+            elif 'maxlag' in params and self.random.random() < self.lag_rate:
+                self.lagged += 1
+                outcome = 'lagged'
+        return delay, outcome
+
+    @staticmethod
+    def normalize(title):
+        '''The title the way the API reports it: underscores as spaces, first letter capitalized.'''
+        title = title.replace('_', ' ').strip()
+        return title[:1].upper() + title[1:]
+
+    def query(self, params):
+        '''Answer action=query for a list of titles, with their revision IDs if prop=info, and their
+        content and revision IDs if prop=revisions.'''
+        titles = params.get('titles', '').split('|') if params.get('titles') else []
+        prop = params.get('prop', '')
+        normalized = []
+        pages = dict()
+        missing = 0
+        for title in titles:
+            name = self.normalize(title)
+            if name != title:
+                normalized.append({"from": title, "to": name})
+            if name not in self.pages:
+                missing += 1
+                pages[str(-missing)] = {"ns": 0, "title": name, "missing": ""}
+                continue
+            pageid, revid, content = self.pages[name]
+            page = {"pageid": pageid, "ns": 0, "title": name}
+            if prop == 'info':
+                page.update({"contentmodel": "wikitext", "lastrevid": revid, "length": len(content)})
+            elif prop == 'revisions':
+                page["revisions"] = [{"revid": revid, "parentid": revid - 1,
+                                      "contentformat": "text/x-wiki", "contentmodel": "wikitext",
+                                      "*": content}]
+            pages[str(pageid)] = page
+        query = {"pages": pages}
+        if normalized:
+            query["normalized"] = normalized
+        return {"batchcomplete": "", "query": query}
+
+class Handler(BaseHTTPRequestHandler):
+    '''Answers GET requests to /w/api.php from the server's wiki.'''
+    protocol_version = 'HTTP/1.1' # Keep connections open, as Wikisource does
+
+    def do_GET(self):
+        parts = parse.urlsplit(self.path)
+        params = dict(parse.parse_qsl(parts.query, keep_blank_values=True))
+        wiki = self.server.wiki
+        delay, outcome = wiki.draw(params)
+        if delay > 0:
+            time.sleep(delay)
+        if parts.path != '/w/api.php':
+            self.respond(404, {"error": {"code": "notfound", "info": "No such path."}})
+        elif outcome == 'error':
+            self.respond(503, {"error": {"code": "unavailable", "info": "Service unavailable."}},
+                         {'Retry-After': '1'})
+        elif outcome == 'lagged':
+            self.respond(200, {"error": {"code": "maxlag", "info": "Waiting for a database "
+                                         "server: {0} seconds lagged.".format(wiki.lag)}},
+                         {'Retry-After': '5', 'X-Database-Lag': str(wiki.lag)})
+        elif params.get('action') == 'query':
+            self.respond(200, wiki.query(params))
+        else:
+            self.respond(200, {"error": {"code": "unknown_action",
+                                         "info": "Unrecognized value for parameter 'action'."}})
+
+    def respond(self, status, response, headers=dict()):
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Requests aren't logged; Wiki keeps count of them
+
+class WikiServer(ThreadingHTTPServer):
+    '''Serves a wiki on localhost, from a background thread once started. Port 0 picks a free
+    port; url is where the server is, to pass to API or to brandeis.py --server.'''
+    daemon_threads = True
+
+    def __init__(self, wiki, port=0):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.wiki = wiki
+        self.url = 'http://127.0.0.1:{0}'.format(self.server_address[1])
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a stand-in for the Wikisource API.')
+    parser.add_argument('-d', '--dir', required=True,
+                        help='Directory of lochner files to make the volume pages from.')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds to wait before each response.')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Most seconds to wait at random on top of the latency.')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='Share of requests to fail with a 503.')
+    parser.add_argument('--lag-rate', type=float, default=0,
+                        help='Share of requests with a maxlag parameter to refuse as lagged.')
+    args = parser.parse_args()
+
+    files = [os.path.join(args.dir, file) for file in os.listdir(args.dir)]
+    wiki = Wiki(volume_pages(files), args.latency, args.jitter, args.error_rate, args.lag_rate)
+    server = WikiServer(wiki, args.port)
+    print('Serving {0} pages at {1}'.format(len(wiki.pages), server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    print('{0} requests, {1} failed, {2} refused as lagged'.format(wiki.requests, wiki.errors,
+                                                                   wiki.lagged))
+
+if __name__ == '__main__':
+    main()
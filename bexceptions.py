@@ -27,10 +27,12 @@ These are the exceptions used by brandeis:
      +-- NoCaseInList
      +-- PageNotFound
      +-- MultipleCases
+     +-- NoRecordedResponse
     TokenizerError
      +-- IllegalCharacter
     ParserError
      +-- EntityError
+     +-- MissingHandler
     BotError
      +-- MissingFootnote
 '''
@@ -106,6 +108,13 @@ class MultipleCases(APIError):
     def __str__(self):
         return repr(self.value)
     
+class NoRecordedResponse(APIError):
+    '''A replayed API request has no recorded response.'''
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+    
 class IllegalCharacter(TokenizerError):
     '''The tokenizer encountered an illegal character.'''
     def __init__(self, value):
@@ -120,6 +129,13 @@ class EntityError(ParserError):
     def __str__(self):
         return repr(self.value)
 
+class MissingHandler(ParserError):
+    '''The parser has no parsing function for a token type.'''
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
 class MissingFootnote(BotError):
     '''A footnote is missing.'''
     def __init__(self, value):
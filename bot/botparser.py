@@ -17,14 +17,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from bexceptions import MissingFootnote
+from bexceptions import BotError, MissingFootnote
+from bot.document import Document, Section, PageNumber, PageBreak, make_block
 import logging, re, sys
 
 class BotParser(object):
     
-    def __init__(self, inputfile, output, metadict):
+    def __init__(self, text, output, metadict):
         self.output = output
-        self.inputfile = inputfile
+        self.text = text
         self.metadict = metadict
         self.logger = logging.getLogger('brandeis')
         self.summary_logger = logging.getLogger('summary')
@@ -37,10 +38,12 @@ class BotParser(object):
                        ' | year = {year}\n | notes = \n | categories = \n | portal = Supreme Court of '
                        'the United States\n}}}}\n')
         self.months = r'(?:January|February|March|April|May|June|July|August|September|October|November|December)'
-        self.pagelist = ['']
+        self.document = Document(text)
         
     def prepare(self):
-        '''Perform the parsing functions. Note the order of some of these functions is important.'''
+        '''Perform the parsing functions. Note the order of some of these functions is important.
+        Each of them works on the document's sections, which are only written out as text once all
+        of them are done.'''
         try:
             self.sectionize()
             self.footnotes()
@@ -52,18 +55,19 @@ class BotParser(object):
             except IndexError:
                 self.logger.warning("Unable to add any headers.")
             self.ussc_case()
-            self.clean_spaces()
             self.talk_pages()
             self.redirect()
         except Exception as e:
             self.logger.error("Uncaught error. Terminating file write. {}".format(e))
         else:
             with open(self.output, 'w', encoding="utf-8") as output:
-                output.write('\n'.join(self.pagelist))
+                output.write(self.document.serialize())
         
     def add_case_caption(self):
-        '''Add {{CaseCaption}} to the syllabus page.'''
-        top = self.pagelist[0][:500] if len(self.pagelist[0]) >= 500 else self.pagelist[0]
+        '''Add {{CaseCaption}} to the syllabus page. Everything before the first paragraph of the
+        syllabus is replaced by the caption.'''
+        syllabus = self.document.sections[0]
+        top = syllabus.text(500)
         parameters = ['volume', 'page', 'petitioner', 'respondent', 'argued', 'decided',
                       'case_number']
         case_number = re.search(r'No\.\s?(?P<no>\d+\-\d+)', top)
@@ -82,115 +86,115 @@ class BotParser(object):
                 self.metadict[parameter] = ''
                 self.logger.warning('No value for ' + parameter +
                                     ' in dictionary.')
-                
-        ind = self.pagelist[0].find('{{-start-}}')
-        new = self.pagelist[0][:ind+11] + "\n'''" + self.metadict['title'] + "'''\n"
-        rest = re.search(r'\n\n([^\n]{100,})', self.pagelist[0])
-        new += '\n' + self.case_caption.format(**self.metadict)
-        new += self.pagelist[0][rest.start():]
-        self.pagelist[0] = new
         
-    def clean_spaces(self):
-        '''Clean any excessive newlines or spaces that may have been introduced. Groups of newlines
-        with more than two in a row are replaced by two newlines. Groups of two or more spaces are
-        replaced with one.'''
-        for i in range(len(self.pagelist)):
-            self.pagelist[i] = re.sub(r'[ ]{2,}', ' ', self.pagelist[i])
-            self.pagelist[i] = re.sub(r'\n{3,}', '\n\n', self.pagelist[i])
+        # The syllabus starts with the first line of 100 characters or more after a blank line.
+        for i in range(len(syllabus.blocks)):
+            text = syllabus.blocks[i].text
+            if i > 0 and re.match(r'[^\n]{100,}', text):
+                syllabus.blocks = syllabus.blocks[i:]
+                break
+            rest = re.search(r'\n\n[^\n]{100,}', text)
+            if rest:
+                syllabus.blocks = [make_block(text[rest.start()+2:])] + syllabus.blocks[i+1:]
+                break
+        else:
+            raise BotError("Unable to find the start of the syllabus.")
+        syllabus.title = self.metadict['title']
+        syllabus.caption = '\n' + self.case_caption.format(**self.metadict)
         
     def footnotes(self):
         '''Parse out footnotes into <ref></ref> tags. It does what it can, but it's highly
-        dependent on the input file. All footnotes should be manually checked.'''
+        dependent on the input file. All footnotes should be manually checked.
+        
+        Where each section's footnotes start, and which paragraphs reference each footnote, is found
+        in one pass over the document. The footnotes are then spliced into each paragraph that
+        references them in one go. The document is indexed again whenever blocks are cut out of it,
+        or a footnote with markers or tags of its own is spliced in, so that they can be found.'''
         if 'max_footnote' in self.metadict:
             max_footnote = self.metadict['max_footnote']
             self.logger.warning("Added footnotes to the text. ({0} sections: {1})."
                                 .format(len(max_footnote), str(max_footnote)))
+            markers = ['Footnote ' + ('' if sect == 1 else str(sect) + '/') + '1'
+                       for sect in range(1, len(max_footnote)+1)]
+            positions, anchors = self.document.index_footnotes(markers)
             sect = 1
             for sect in range(1,len(max_footnote)+1):
-                for i in range(len(self.pagelist)):
-                    section = '' if sect == 1 else str(sect) + '/'
-                    footnote_start = self.pagelist[i].find('Footnote ' + section + '1')
-                    if footnote_start != -1:
-                        content = [self.pagelist[i][:footnote_start], self.pagelist[i][footnote_start:]]
-                        self.pagelist[i] = content[0]
-                        end_ind = content[1].find('{{smallrefs}}')
-                        if end_ind != -1:
-                            footnotes = content[1][:end_ind]
-                            self.pagelist[i] += content[1][end_ind:]
-                        footnotes = footnotes.split('\n\n')
-                        foot_no = 1
-                        ind = 0
-                        foot_text = ''
-                        footnote_texts = []
-                        while ind < len(footnotes) and foot_no <= int(max_footnote[str(sect)]):
-                            if footnotes[ind] == 'Footnote ' + section + str(foot_no):
+                section = '' if sect == 1 else str(sect) + '/'
+                marker = markers[sect-1]
+                for page in [found[0] for found in positions[marker]]:
+                    found = page.find(marker)
+                    if found is None:
+                        continue # Cut out with an earlier section's footnotes
+                    footnotes = page.cut(*found).split('\n\n')
+                    positions, anchors = self.document.index_footnotes(markers)
+                    foot_no = 1
+                    ind = 0
+                    foot_text = ''
+                    footnote_texts = []
+                    while ind < len(footnotes) and foot_no <= int(max_footnote[str(sect)]):
+                        if footnotes[ind] == 'Footnote ' + section + str(foot_no):
+                            ind += 1
+                            # Only allow the last footnote to be one line long. This will more likely
+                            # than not clip the final footnote, but there's really no way for the
+                            # parser to know where the last footnote ends and where the main text
+                            # resumes.
+                            if foot_no == max_footnote[str(sect)]:
+                                foot_text += footnotes[ind]
                                 ind += 1
-                                # Only allow the last footnote to be one line long. This will more likely
-                                # than not clip the final footnote, but there's really no way for the
-                                # parser to know where the last footnote ends and where the main text
-                                # resumes.
-                                if foot_no == max_footnote[str(sect)]:
+                            else:
+                                while ind < len(footnotes) and footnotes[ind] != ('Footnote ' +
+                                                                                  section +
+                                                                                  str(foot_no + 1)):
+                                    if foot_text != '':
+                                        foot_text += '\n\n'
                                     foot_text += footnotes[ind]
                                     ind += 1
-                                else:
-                                    while ind < len(footnotes) and footnotes[ind] != ('Footnote ' +
-                                                                                      section +
-                                                                                      str(foot_no + 1)):
-                                        if foot_text != '':
-                                            foot_text += '\n\n'
-                                        foot_text += footnotes[ind]
-                                        ind += 1
-                                footnote_texts.append(foot_text)
-                                foot_text = ''
-                                foot_no += 1
-                            else:
-                                raise MissingFootnote( foot_no )
-                          
-                        end_footnote = '</ref>'
-                        for j in range(1,int(max_footnote[str(sect)])+1):
-                            split = []
-                            current_footnote = '<ref name="ref{}">'.format(section + str(j))
-                            x = -1
-                            page_num = 0
-                            while x == -1 and page_num < len(self.pagelist):
-                                x = self.pagelist[page_num].find(current_footnote)
-                                if x != -1:
-                                    break
-                                page_num += 1
-                            if x == -1:
-                                self.logger.warning("Unable to find an in-text tag for footnote #" +
-                                                    section + str(j) + ". It has been omitted.")
-                                continue
-                            else:
-                                split.append(self.pagelist[page_num][:x-1])
-                                split.append(self.pagelist[page_num][x:x+len(current_footnote)])
-                                split.append(self.pagelist[page_num][x+len(current_footnote):])
-                                footnote_texts[j-1] = ' ' if footnote_texts[j-1] == '' else footnote_texts[j-1]
-                                self.pagelist[page_num] = split[0] + split[1] + footnote_texts[j-1] + split[2]
+                            footnote_texts.append(foot_text)
+                            foot_text = ''
+                            foot_no += 1
+                        else:
+                            raise MissingFootnote( foot_no )
+                    
+                    splices = dict()
+                    for j in range(1,int(max_footnote[str(sect)])+1):
+                        current_footnote = '<ref name="ref{}">'.format(section + str(j))
+                        paragraphs = anchors.get(section + str(j))
+                        if not paragraphs:
+                            self.logger.warning("Unable to find an in-text tag for footnote #" +
+                                                section + str(j) + ". It has been omitted.")
+                            continue
+                        else:
+                            paragraph = paragraphs[0]
+                            x = paragraph.text.find(current_footnote)
+                            footnote_texts[j-1] = ' ' if footnote_texts[j-1] == '' else footnote_texts[j-1]
+                            splices.setdefault(paragraph, []).append(
+                                (x, current_footnote, footnote_texts[j-1]))
+                            if 'Footnote ' in footnote_texts[j-1] or '<ref' in footnote_texts[j-1]:
+                                # Later footnotes can be referenced from this one's text
+                                for block, footnote_splices in splices.items():
+                                    block.splice(footnote_splices)
+                                splices = dict()
+                                positions, anchors = self.document.index_footnotes(markers)
+                    for paragraph, footnote_splices in splices.items():
+                        paragraph.splice(footnote_splices)
                 
     def headers(self):
         '''Add the {{header}} template to the beginning of each page.'''
-        content = ''.join(self.pagelist)
-        split = re.split(r"(\{{2}\-start\-\}{2}\n(?:'''.*?'''\n|<div.*?\n))", content)
         sections = []
-        new = []
-        for i in range(len(split)):
-            if i%2 == 1:
-                match = re.search(r"'''(.*?)'''", split[i])
-                if match:
-                    name = match.group(1)
-                    if '/' in name:
-                        section = '{{subst:BASEPAGENAME}}/' + name.split('/')[1]
-                        if 'Dissent' in section:
-                            section = section + '|Dissent'
-                        elif 'Concurrence' in section:
-                            section = section + '|Concurrence'
-                        else:
-                            section = section + '|'
-                        sections.append(section)
-                    else:
-                        sections.append('Syllabus')
-        for page_num in range(len(self.pagelist)):
+        for page in self.document.sections:
+            name = page.title
+            if '/' in name:
+                section = '{{subst:BASEPAGENAME}}/' + name.split('/')[1]
+                if 'Dissent' in section:
+                    section = section + '|Dissent'
+                elif 'Concurrence' in section:
+                    section = section + '|Concurrence'
+                else:
+                    section = section + '|'
+                sections.append(section)
+            else:
+                sections.append('Syllabus')
+        for page_num in range(len(self.document.sections)):
             if page_num == 0:
                 header = self.header.format(section=sections[page_num], previous='', next='[[' +
                                             sections[page_num+1] + ']]', year=self.metadict['date'])
@@ -206,50 +210,51 @@ class BotParser(object):
                 header = self.header.format(section=sections[page_num], previous= '[[' +
                                             sections[page_num-1] + ']]', next='[[' +
                                             sections[page_num+1] + ']]', year=self.metadict['date'])
-            page_split = re.split(r"(\{{2}-start-\}{2}\n*(?:'''.*?''')?\n?)",
-                                  self.pagelist[page_num], re.DOTALL)
-            try:
-                ind = page_split[2].find('\n{{-stop-}}')
-                page_split[2] = page_split[2][:ind] + '\n</div>\n{{PD-USGov}}' + page_split[2][ind:]
-                self.pagelist[page_num] = page_split[0] + page_split[1] + '<div class="indented-page">\n' + header + page_split[2]
-            except IndexError:
-                self.logger.warning("Unable to add a header for page " + str(page_num) + ".")
-            
+            page = self.document.sections[page_num]
+            page.header = '<div class="indented-page">\n' + header
+            page.footer = '\n</div>\n{{PD-USGov}}'
             
     def move_pages(self):
-        '''Moves page numbers that occur right before a break.'''
-        for i in range(len(self.pagelist)):
-            match = re.search(r'(?P<page>\{{2}page\sbreak\|\d+\|left\}{2})(\s|\n)*\{{2}smallrefs',
-                              self.pagelist[i])
-            if match:
-                self.pagelist[i] = self.pagelist[i].replace(match.group('page'), '')
-                split = re.split(r"(\{{2}\-start\-\}{2}\n+'{3}.*?'{3}\n)",self.pagelist[i+1])
-                self.pagelist[i+1] = (split[0] + split[1] + '\n' + match.group('page') + '\n' +
-                                      split[2])
+        '''Moves page numbers that occur right before a break. A page number at the end of the last
+        section has nowhere to go, so it stays where it is.'''
+        sections = self.document.sections
+        for i in range(len(sections) - 1):
+            last = sections[i].last_block()
+            if last is not None and isinstance(sections[i].blocks[last], PageBreak):
+                page = sections[i].blocks.pop(last).text
+                sections[i+1].moved = '\n' + page + '\n' + sections[i+1].moved
                   
     def pages(self):
         '''Replace page numbers with {{page break}} template, join any hyphenated words.'''
-        for page_num in range(len(self.pagelist)):
-            split = re.split(r'(\n{2}PAGE\s\d+\n{2})', self.pagelist[page_num])
-            for i in range(len(split)):
-                try:
-                    if split[i][:6] == '\n\nPAGE':
-                        number_m = re.match(r'\n{2}PAGE\s(?P<number>\d+)\n{2}', split[i])
-                        split[i] = ('\n\n{{page break|' + number_m.group('number') + 
-                                    '|left}}\n\n')
-                    elif split[i][-1] == '-':
-                        temp = split[i+2].split(' ', 1)
-                        split[i] = split[i][:-1] + temp[0]
-                        split[i+2] = temp[1]
-                except:
-                    self.logger.warning("Error when adding {{page break}} templates.")
-            content = ''.join(split)
-            self.pagelist[page_num] = content
+        for page in self.document.sections:
+            blocks = page.blocks
+            previous = None
+            for i in range(len(blocks)):
+                block = blocks[i]
+                # A page number right after another one, or at the top of the page, stays as it is.
+                if isinstance(block, PageNumber) and i > 0 and not isinstance(previous, PageBreak):
+                    blocks[i] = PageBreak(block.number)
+                    if blocks[i-1].text.endswith('-') and i + 1 < len(blocks) and ' ' in blocks[i+1].text:
+                        temp = blocks[i+1].text.split(' ', 1)
+                        blocks[i-1] = make_block(blocks[i-1].text[:-1] + temp[0])
+                        blocks[i+1] = make_block(temp[1])
+                elif '\n\nPAGE' in block.text:
+                    # Page numbers in footnotes that were moved into the text
+                    split = re.split(r'(\n{2}PAGE\s\d+\n{2})', block.text)
+                    for k in range(1, len(split), 2):
+                        split[k] = re.sub(r'\n{2}PAGE\s(?P<number>\d+)\n{2}',
+                                          r'\n\n{{page break|\g<number>|left}}\n\n', split[k])
+                        if split[k-1].endswith('-') and ' ' in split[k+1]:
+                            temp = split[k+1].split(' ', 1)
+                            split[k-1] = split[k-1][:-1] + temp[0]
+                            split[k+1] = temp[1]
+                    blocks[i] = make_block(''.join(split))
+                previous = blocks[i]
             
     def redirect(self):
         '''Create redirect page for the case number'''
         page = "{{-start-}}\n'''" + self.metadict['number'] + "'''\n#REDIRECT [[" + self.metadict['title'] + "]]\n{{-stop-}}"
-        self.pagelist.append(page)
+        self.document.redirect = page
         self.summary_logger.info("Creating redirect from [[" + self.metadict['number'] + "]] to [[" + self.metadict['title'] + "]].")
         
     def sectionize(self):
@@ -260,70 +265,55 @@ class BotParser(object):
         self.metadict['sections']['dissent_justices'] = []
         self.metadict['sections']['concurrence'] = []
         self.metadict['sections']['dissent'] = []
-        with open(self.inputfile, 'r', encoding='utf-8') as inputfile:
-            content = inputfile.read()
-        paras = content.split('\n\n')
-        for i in range(len(paras)):
-            ind = 0 if len(self.pagelist) == 1 and self.pagelist[0] == '' else -1
-            if len(paras[i]) < 400:
-                if 'syllabus' in paras[i].lower():
+        sections = self.document.sections
+        sections.append(Section())
+        for i in range(len(self.document.blocks)):
+            block = self.document.blocks[i]
+            para = block.text
+            if len(para) < 400:
+                if 'syllabus' in para.lower():
                     if 'syllabus' not in self.metadict['sections']:
                         self.metadict['sections']['syllabus'] = i
-                elif re.search(r',\sconcurring(\sin\sthe\sresult)?(\.|\Z)', paras[i], re.IGNORECASE):
+                elif re.search(r',\sconcurring(\sin\sthe\sresult)?(\.|\Z)', para, re.IGNORECASE):
                     sentence_m = re.search(r'(\.|\A)(?P<justices>.*?),\sconcurring(\sin\sthe\sresult)?(\.|\Z)',
-                                           paras[i], re.IGNORECASE)
+                                           para, re.IGNORECASE)
                     if sentence_m:
                         sentence = sentence_m.group('justices')
                         justices = re.search(r'\{{2}sc\|(?:(?:Mr\.\s)?(?:Chief\s)?Justice\s)?(?P<justice>.*?)\}{2}', sentence)
                         try:
                             justice = justices.group('justice')
                             if not justice in self.metadict['sections']['concurrence_justices']:
-                                self.pagelist[ind] += "\n{{smallrefs}}\n{{-stop-}}"
-                                self.pagelist.append("\n{{-start-}}\n'''" + self.metadict['title'] +
-                                                     "/Concurrence " + justice + "'''\n")
+                                sections.append(Section(self.metadict['title'] + "/Concurrence " +
+                                                        justice, lead='\n'))
                                 self.metadict['sections']['concurrence_justices'].append(justice)
                                 self.metadict['sections']['concurrence'].append(i)
                         except:
                             self.logger.warning("Unable to identify concurrence justice.")
-                            self.pagelist[ind] += "\n{{smallrefs}}\n{{-stop-}}"
-                            self.pagelist.append("{{-start-}}\n'''" + self.metadict['title'] +
-                                                     "/Dissent'''\n")
-                elif re.search(r',\sdissenting(\sin\sthe\sresult)?(\.|\Z)', paras[i], re.IGNORECASE):
+                            sections.append(Section(self.metadict['title'] + "/Dissent"))
+                elif re.search(r',\sdissenting(\sin\sthe\sresult)?(\.|\Z)', para, re.IGNORECASE):
                     sentence_m = re.search(r'(\.|\A)(?P<justices>.*?),\sdissenting(\sin\sthe\sresult)?(\.|\Z)',
-                                           paras[i], re.IGNORECASE)
+                                           para, re.IGNORECASE)
                     if sentence_m:
                         sentence = sentence_m.group('justices')
                         justices = re.search(r'\{{2}sc\|(?:(?:Mr\.\s)?(?:Chief\s)?Justice\s)?(?P<justice>.*?)\}{2}', sentence)
                         try:
                             justice = justices.group('justice')
                             if not justice in self.metadict['sections']['dissent_justices']:
-                                self.pagelist[ind] += "\n{{smallrefs}}\n{{-stop-}}"
-                                self.pagelist.append("{{-start-}}\n'''" + self.metadict['title'] +
-                                                     "/Dissent " + justice + "'''\n")
+                                sections.append(Section(self.metadict['title'] + "/Dissent " + justice))
                                 self.metadict['sections']['dissent_justices'].append(justice)
                                 self.metadict['sections']['dissent'].append(i)
                         except:
                             self.logger.warning("Unable to identify dissent justice.")
-                            self.pagelist[ind] += "\n{{smallrefs}}\n{{-stop-}}"
-                            self.pagelist.append("{{-start-}}\n'''" + self.metadict['title'] +
-                                                     "/Dissent'''\n")
-                elif 'per curiam' in paras[i].lower():
+                            sections.append(Section(self.metadict['title'] + "/Dissent"))
+                elif 'per curiam' in para.lower():
                     if 'per curiam' not in self.metadict['sections']:
-                        self.pagelist[ind] += "\n{{smallrefs}}\n{{-stop-}}"
-                        self.pagelist.append("{{-start-}}\n'''" + self.metadict['title'] +
-                                             "/Opinion of the Court'''\n")
+                        sections.append(Section(self.metadict['title'] + "/Opinion of the Court"))
                         self.metadict['sections']['per curiam'] = i
-                elif 'delivered the opinion' in paras[i].lower():
+                elif 'delivered the opinion' in para.lower():
                     if 'opinion' not in self.metadict['sections']:
-                        self.pagelist[ind] += "\n{{smallrefs}}\n{{-stop-}}"
-                        self.pagelist.append("{{-start-}}\n'''" + self.metadict['title'] +
-                                             "/Opinion of the Court'''\n")
+                        sections.append(Section(self.metadict['title'] + "/Opinion of the Court"))
                         self.metadict['sections']['opinion'] = i
-                self.pagelist[ind] += (paras[i] + '\n\n')
-            else:
-                self.pagelist[ind] += (paras[i] + '\n\n')
-        self.pagelist[0] = '{{-start-}}\n'+ self.pagelist[0]
-        self.pagelist[-1] += '\n{{smallrefs}}\n{{-stop-}}'
+            sections[-1].blocks.append(block)
         
         # Create useful warning messages to help the assistant
         self.logger.warning("Sections: ")
@@ -339,17 +329,14 @@ class BotParser(object):
                 self.logger.warning("\tNo " + key + ".")
                 
     def talk_pages(self):
-        temp = self.pagelist
-        self.pagelist = []
-        for i in range(len(temp)):
-            self.pagelist.append(temp[i])
-            title_match = re.search(r"\{{2}-start-\}{2}\n+'''(?P<title>.*?)'''", temp[i])
-            if not title_match:
+        for page in self.document.sections:
+            title = page.title
+            if title is None:
                 self.logger.warning('Unable to add a talk page.')
                 continue
-            self.summary_logger.info("Adding page [[" + title_match.group('title') + "]]")
-            self.summary_logger.info("Adding page [[Talk:" + title_match.group('title') + "]]")
-            talkpage = "{{-start-}}\n'''Talk:" + title_match.group('title') + "'''\n{{textinfo\n"
+            self.summary_logger.info("Adding page [[" + title + "]]")
+            self.summary_logger.info("Adding page [[Talk:" + title + "]]")
+            talkpage = "{{-start-}}\n'''Talk:" + title + "'''\n{{textinfo\n"
             talkpage += "|edition = " + self.metadict['full_title'] + '\n'
             talkpage += ("|source = " + self.metadict['title'] + ' from [' + self.metadict['source']
                          + ' Justia]\n')
@@ -358,10 +345,10 @@ class BotParser(object):
             talkpage += ("|notes = Text gathered and wikified using an automated tool. See " +
                          "[[User:BrandeisBot/Documentation]] for more information.\n")
             talkpage += "|proofreaders = \n}}\n{{-stop-}}"
-            self.pagelist.append(talkpage)
+            page.talk = talkpage
                 
     def ussc_case(self):
-        for page in range(len(self.pagelist)):
+        for page in range(len(self.document.sections)):
             if page == 0:
                 template = '\n{{USSCcase\n|percuriam = '
             else:
@@ -387,11 +374,9 @@ class BotParser(object):
             except KeyError:
                 pass
             template += "|linked_cases =\n|wikipedia = no\n}}\n"
-            if page == 0:
-                s = re.split(r'(\{{2}CaseCaption(?:.|\n)*?\}{2})', self.pagelist[page])
+            section = self.document.sections[page]
+            # Goes after {{CaseCaption}} on the syllabus, and after {{header}} on the other pages
+            if (page == 0 and section.caption) or (page != 0 and section.header):
+                section.template = template
             else:
-                s = re.split(r'(\{{2}header(?:.|\n)*?[^A-Z]\}{2})', self.pagelist[page])
-            try:
-                self.pagelist[page] = s[0] + s[1] + template + s[2]
-            except IndexError:
-                self.logger.warning("Unable to add USSC case templates.")
\ No newline at end of file
+                self.logger.warning("Unable to add USSC case templates.")
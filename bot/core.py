@@ -21,14 +21,18 @@ from bot.botparser import BotParser
 from bot.scan import *
 
 class Bot(object):
-    def __init__(self, inputfile, output, metadict):
-        self.inputfile = inputfile
+    def __init__(self, text, output, metadict):
+        self.text = text
         self.output = output
         self.metadict = metadict
-        self.parser = BotParser(self.inputfile, self.output, self.metadict)
+        self.parser = BotParser(self.text, self.output, self.metadict)
         
     def prepare(self):
         '''Prepare file so the bot can upload it.'''
         self.parser.prepare()
+        self.fetch_scan()
+        
+    def fetch_scan(self):
+        '''Download the scan of the case, if there is one.'''
         if 'pdf' in self.metadict:
-            self.metadict['pdf_filename'] = get_scan(self.inputfile, self.metadict['pdf'])
\ No newline at end of file
+            self.metadict['pdf_filename'] = get_scan(self.output, self.metadict['pdf'])
\ No newline at end of file
@@ -0,0 +1,218 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+PAGE_NUMBER = re.compile(r'PAGE\s(?P<number>\d+)')
+FOOTNOTE_MARKER = re.compile(r'Footnote\s(?:(?P<section>\d+)\/)?(?P<number>\d+)')
+ANCHOR = re.compile(r'<ref name="ref(?P<name>[^"]+)">')
+
+#===================================================================================================
+# BLOCKS
+#===================================================================================================
+class Block(object):
+    '''One paragraph of the postprocessed text. Paragraphs are separated by a blank line.'''
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, repr(self.text))
+
+class Paragraph(Block):
+    '''A paragraph of the case. Anchors are the names of the footnotes that are referenced from it
+    (the part after "ref" in <ref name="ref1/2"></ref>).'''
+    def __init__(self, text):
+        Block.__init__(self, text)
+        self.anchors = ANCHOR.findall(text) if '<ref' in text else []
+
+    def splice(self, footnotes):
+        '''Splice footnotes into the paragraph (see splice()), along with any anchors in them.'''
+        self.text = splice(self.text, footnotes)
+        self.anchors = ANCHOR.findall(self.text) if '<ref' in self.text else []
+
+class PageNumber(Block):
+    '''A "PAGE 123" line, marking where a page of the printed reporter begins.'''
+    def __init__(self, text, number):
+        Block.__init__(self, text)
+        self.number = number
+
+class PageBreak(Block):
+    '''A page number that has been turned into a {{page break}} template.'''
+    def __init__(self, number):
+        Block.__init__(self, '{{page break|' + number + '|left}}')
+        self.number = number
+
+class FootnoteMarker(Block):
+    '''A "Footnote 3" or "Footnote 2/3" line, which comes before the text of that footnote.'''
+    def __init__(self, text, section, number):
+        Block.__init__(self, text)
+        self.section = section
+        self.number = number
+
+def make_block(text):
+    '''Return the right kind of block for a paragraph of text.'''
+    if text.startswith('PAGE'):
+        match = PAGE_NUMBER.fullmatch(text)
+        if match:
+            return PageNumber(text, match.group('number'))
+    elif text.startswith('Footnote'):
+        match = FOOTNOTE_MARKER.fullmatch(text)
+        if match:
+            return FootnoteMarker(text, match.group('section') or '1', match.group('number'))
+    return Paragraph(text)
+
+def splice(text, footnotes):
+    '''Put the text of each footnote after its <ref> tag, in one pass over the text. Footnotes is a
+    list of (position of the tag, tag, footnote text). The character before each tag (the space
+    that was before the footnote link) is dropped.'''
+    pieces = []
+    last = 0
+    for position, tag, footnote in sorted(footnotes, key=lambda footnote: footnote[0]):
+        pieces.extend([text[last:max(position-1, last)], tag, footnote])
+        last = position + len(tag)
+    pieces.append(text[last:])
+    return ''.join(pieces)
+
+def clean_spaces(text):
+    '''Groups of newlines with more than two in a row are replaced by two newlines. Groups of two or
+    more spaces are replaced with one.'''
+    text = re.sub(r'[ ]{2,}', ' ', text)
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+#===================================================================================================
+# SECTIONS
+#===================================================================================================
+class Section(object):
+    '''One page of the case on Wikisource: the syllabus, the opinion of the court, or a concurrence
+    or dissent. The pieces around the blocks are kept apart until the page is written out.'''
+    def __init__(self, title=None, lead=''):
+        self.title = title
+        self.lead = lead            # Text before {{-start-}}
+        self.header = ''            # {{header}}, with the opening of the indented-page div
+        self.caption = ''           # {{CaseCaption}}, on the syllabus page only
+        self.template = ''          # {{USSCcase}} or {{USSCcase2}}
+        self.moved = ''             # Page breaks moved here from the end of the previous section
+        self.blocks = []
+        self.end = '\n{{smallrefs}}'
+        self.footer = ''            # Closes the indented-page div
+        self.talk = None            # The talk page for this page
+
+    def start(self):
+        '''The {{-start-}} line and the title of the page.'''
+        start = self.lead + '{{-start-}}\n'
+        if self.title is not None:
+            start += "'''" + self.title + "'''\n"
+        return start
+
+    def find(self, text):
+        '''Returns the index of the first block containing text, and where it is in the block, or
+        None if there is no such block.'''
+        for i in range(len(self.blocks)):
+            position = self.blocks[i].text.find(text)
+            if position != -1:
+                return i, position
+        return None
+
+    def cut(self, index, position):
+        '''Remove everything from the given position in a block up to {{smallrefs}}, and return it
+        as text.'''
+        block = self.blocks[index]
+        end_ind = self.end.find('{{smallrefs}}')
+        cut = ''.join([block.text[position:], '\n\n'] +
+                      [b.text + '\n\n' for b in self.blocks[index+1:]] + [self.end[:end_ind]])
+        self.blocks = self.blocks[:index]
+        if position > 0:
+            self.blocks.append(make_block(block.text[:position]))
+        self.end = self.end[end_ind:]
+        return cut
+
+    def last_block(self):
+        '''Returns the index of the last block that isn't blank, or None.'''
+        for i in range(len(self.blocks) - 1, -1, -1):
+            if self.blocks[i].text.strip():
+                return i
+        return None
+
+    def text(self, limit=None):
+        '''Write the page out as text. If limit is given, only the start of the page is needed, so
+        stop once there are that many characters.'''
+        header = self.header
+        if self.template and not self.caption:
+            # {{USSCcase2}} goes right after {{header}}
+            header = header[:-1] + self.template + header[-1:]
+        pieces = [self.start(), header]
+        if self.caption:
+            pieces.extend([self.caption, self.template, '\n\n'])
+        pieces.append(self.moved)
+        length = sum(len(piece) for piece in pieces)
+        for block in self.blocks:
+            if limit is not None and length >= limit:
+                return ''.join(pieces)[:limit]
+            pieces.extend([block.text, '\n\n'])
+            length += len(block.text) + 2
+        pieces.extend([self.end, self.footer, '\n{{-stop-}}'])
+        text = ''.join(pieces)
+        return text if limit is None else text[:limit]
+
+#===================================================================================================
+# DOCUMENT
+#===================================================================================================
+class Document(object):
+    '''The text of a case between the postprocessor and the bot file. The text is split into blocks
+    once, the bot parser groups the blocks into sections and works on them, and the pages are only
+    turned back into text when the bot file is written.'''
+    def __init__(self, text):
+        self.blocks = [make_block(para) for para in text.split('\n\n')]
+        self.sections = []
+        self.redirect = None
+
+    def index_footnotes(self, markers):
+        '''Find the footnote markers and anchors in one pass over the blocks. Returns a dictionary
+        from each of the given marker texts to a (section, block index, position) for where it first
+        appears in each section, and a dictionary from each footnote name to the paragraphs that
+        reference it, both in the order they appear in.'''
+        positions = dict((marker, []) for marker in markers)
+        anchors = dict()
+        for section in self.sections:
+            for i in range(len(section.blocks)):
+                block = section.blocks[i]
+                if 'Footnote ' in block.text:
+                    for marker in markers:
+                        found = positions[marker]
+                        if not found or found[-1][0] is not section:
+                            position = block.text.find(marker)
+                            if position != -1:
+                                found.append((section, i, position))
+                if isinstance(block, Paragraph):
+                    for name in block.anchors:
+                        paragraphs = anchors.setdefault(name, [])
+                        if not paragraphs or paragraphs[-1] is not block:
+                            paragraphs.append(block)
+        return positions, anchors
+
+    def serialize(self):
+        '''Write out every page, each followed by its talk page, then the redirect.'''
+        pages = []
+        for section in self.sections:
+            pages.append(clean_spaces(section.text()))
+            if section.talk is not None:
+                pages.append(section.talk)
+        if self.redirect is not None:
+            pages.append(self.redirect)
+        return '\n'.join(pages)
@@ -21,7 +21,7 @@ import os
 from urllib.request import urlretrieve
 
 def get_scan(inputfile, url):
-    filename = 'botfiles/pdfs/' + inputfile.replace('wikitext/', '') + '.pdf'
+    filename = 'botfiles/pdfs/' + os.path.basename(inputfile) + '.pdf'
     if not os.path.isfile(filename):
         urlretrieve(url, filename)
     return filename
\ No newline at end of file
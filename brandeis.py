@@ -18,155 +18,468 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import argparse, logging, os, re, sys
+import argparse, asyncio, io, logging, multiprocessing, os, re, sys
 from time import strftime, gmtime
 from bexceptions import *
 from validator import Validator
-from caseparser import Parser, get_metadata, strip_extraneous
-from api import API
+from caseparser import Parser, find_volume, get_metadata, strip_extraneous
+from api import API, Cache, MemoryCache
+from httpclient import HTTPClient
+from transport import FixtureStore, RecordingTransport, ReplayTransport
+from asyncapi import AsyncAPI
 from tokenizer import Tokenizer
 from postprocessor import Postprocessor
+from runstats import RunStats
 from bot.core import Bot
 
-# Set up logging
-try:
-    os.mkdir('logs')
-except OSError:
-    pass
 logger = logging.getLogger('brandeis')
 summary_logger = logging.getLogger('summary')
-logger.setLevel(logging.DEBUG)
-summary_logger.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(message)s')
-console = logging.StreamHandler()
-report = logging.FileHandler("logs/report" + strftime("%H:%M:%S_%d-%m-%Y", gmtime()), encoding='utf-8')
-summary = logging.FileHandler("logs/summary" + strftime("%H:%M:%S_%d-%m-%Y", gmtime()), encoding='utf-8')
-console.setFormatter(formatter)
-report.setFormatter(formatter)
-summary.setFormatter(formatter)
-logger.addHandler(console)
-logger.addHandler(report)
-summary_logger.addHandler(summary)
-summary_logger.info('==Bot run: ' + strftime("%d-%m-%Y, %H:%M:%S (UTC)", gmtime()) + '==')
-
-# Command line parser
-parser = argparse.ArgumentParser(description='Convert the text file of a supreme court case '
-                                 'to wikitext.')
-input_files = parser.add_mutually_exclusive_group(required=True)
-input_files.add_argument('-f', '--files', nargs='*', help='List of files to be parsed.')
-input_files.add_argument('-d', '--dir', nargs=1, help='Directory of files to be parsed.')
-args = vars(parser.parse_args())
-
-# Get list of files
-if args["dir"]:
-    # Directory name was supplied
-    if os.path.isdir(args["dir"][0]):
-        files = os.listdir(args["dir"][0])
-        for i in range(len(files)):
-            files[i] = args["dir"][0] + "/" + files[i]
-    else:
-        logger.error('There is no directory at {0}\{1}. Please check the path and retry.'
-                     .format(os.path.dirname(os.path.abspath(__file__)), args["dir"][0]))
-        sys.exit(0)
-else:
-    # List of files was supplied
-    files = args["files"]
-    for file in files:
-        if not os.path.isfile(file):
-            logger.error('There is no file named {0}\{1}. Please check the path and retry.'
-                         .format(os.path.dirname(os.path.abspath(__file__)), file))
+
+def setup_logging():
+    '''Log to the console, and to the report and summary files in the logs directory.'''
+    try:
+        os.mkdir('logs')
+    except OSError:
+        pass
+    logger.setLevel(logging.DEBUG)
+    summary_logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(message)s')
+    console = logging.StreamHandler()
+    report = logging.FileHandler("logs/report" + strftime("%H:%M:%S_%d-%m-%Y", gmtime()), encoding='utf-8')
+    summary = logging.FileHandler("logs/summary" + strftime("%H:%M:%S_%d-%m-%Y", gmtime()), encoding='utf-8')
+    console.setFormatter(formatter)
+    report.setFormatter(formatter)
+    summary.setFormatter(formatter)
+    logger.addHandler(console)
+    logger.addHandler(report)
+    summary_logger.addHandler(summary)
+    summary_logger.info('==Bot run: ' + strftime("%d-%m-%Y, %H:%M:%S (UTC)", gmtime()) + '==')
+
+def get_files(args):
+    '''Get the list of files to be parsed from the command line arguments.'''
+    if args["dir"]:
+        # Directory name was supplied
+        if os.path.isdir(args["dir"][0]):
+            files = os.listdir(args["dir"][0])
+            for i in range(len(files)):
+                files[i] = args["dir"][0] + "/" + files[i]
+        else:
+            logger.error('There is no directory at {0}\{1}. Please check the path and retry.'
+                         .format(os.path.dirname(os.path.abspath(__file__)), args["dir"][0]))
             sys.exit(0)
+    else:
+        # List of files was supplied
+        files = args["files"]
+        for file in files:
+            if not os.path.isfile(file):
+                logger.error('There is no file named {0}\{1}. Please check the path and retry.'
+                             .format(os.path.dirname(os.path.abspath(__file__)), file))
+                sys.exit(0)
+    return files
+
+def make_dirs():
+    '''Create the output directories if they don't exist yet.'''
+    for directory in ['botfiles', 'botfiles/pdfs']:
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass
 
-# Validate and parse each file
-for file in files:
+def read_case(file):
+    '''Strip and validate the file, then read its metadata. Returns the metadata dictionary, or None
+    if the file should be skipped.'''
     metadict = dict()
     validator = Validator(file)
-    api = API()
-    
+
     # Remove extra HTML
     with open(file, 'r', encoding='utf-8') as html:
         raw = html.read()
         content = strip_extraneous(raw)
-        
+
     if content:
         with open(file, 'w', encoding='utf-8') as html:
             html.write(content)
-    
+
     # Validate the file. Files that do not pass validation are skipped without interrupting the rest
     # of the process.
     try:
         validator.validate()
     except GroupedCase as e:
         logger.info(e.value + " File will be skipped.")
-        continue
+        return None
     except ValidatorError as e:
         logger.error(e.value + " File will be skipped.")
-        continue
-    
+        return None
+
     # Get the title and other metadata
     get_metadata(metadict, file)
-    
-    # Skip if the file exists on Wikisource already
+    return metadict
+
+def find_case(metadict, api):
+    '''Find the case in the list of cases for its volume. Returns the metadata dictionary and the
+    case's line from the list (None if it isn't in the list), or None if the file should be
+    skipped, as it is when there is no page for its volume. This can prompt the user, so it always
+    runs in the main process.'''
+    line = None
     try:
-        line = api.get_case_line(metadict['title'], metadict['volume'], metadict['page'])
-    except NoCaseInList as e:
-        choice = input(e.value + ' Continue? (y/n)')
-        if choice == 'y' or choice == "Y":
-            logger.info(e.value + " Continuing.")
-        else:
-            logger.info(e.value + " Skipping.")
-            continue
-    except MultipleCases as e:
-        choice = input(e.value + ' Continue? (y/n)')
+        with run_stats.stage('lookup'):
+            line = api.get_case_line(metadict['title'], metadict['volume'], metadict['page'])
+    except PageNotFound as e:
+        logger.error(e.value + " File will be skipped.")
+        return None
+    except (NoCaseInList, MultipleCases) as e:
+        # The answer is kept with the outcome of the lookup, so a rerun doesn't ask again
+        key = (metadict['volume'], metadict['page'], metadict['title'])
+        choice = api.cache.get_choice(*key)
+        if choice is None:
+            choice = input(e.value + ' Continue? (y/n)')
+            api.cache.set_choice(*key, choice=choice)
         if choice == 'y' or choice == "Y":
             logger.info(e.value + " Continuing.")
         else:
             logger.info(e.value + " Skipping.")
-            continue
-    else:
-        if api.case_exists(line):
+            return None
+    return metadict, line
+
+def prepare_case(file, api):
+    '''Strip and validate the file, then find the case in the list of cases on Wikisource. Returns
+    the metadata dictionary and the case's line from the list (None if it isn't in the list), or
+    None if the file should be skipped.'''
+    run_stats.begin(file)
+    with run_stats.stage('read'):
+        metadict = read_case(file)
+    if metadict is None:
+        return None
+    run_stats.begin(file, metadict['title'])
+    return find_case(metadict, api)
+
+def get_volumes(files):
+    '''Get the volume of every file that has one, for prefetching the volume pages.'''
+    volumes = []
+    for file in files:
+        with open(file, 'r', encoding='utf-8') as html:
+            volume = find_volume(html.read())
+        if volume:
+            volumes.append(volume)
+    return volumes
+
+def skip_existing(candidates, exists):
+    '''Drop the (file, metadict, line) candidates whose cases exist on Wikisource already, given
+    whether each line's case exists. Returns a list of (file, metadict) for the rest.'''
+    cases = []
+    for file, metadict, line in candidates:
+        if line and exists[line]:
 #             choice = input(metadict['title'] + ' exists on Wikisource. Continue? (y/n)')
 #             if choice == 'n' or choice == "N":
             logger.info(metadict['title'] + " exists on Wikisource. Skipping.")
             continue
 #             else:
 #                 logger.info(metadict['title'] + " exists on Wikisource. Continuing.")
+        cases.append((file, metadict))
+    return cases
+
+def cache_size(value):
+    '''Parse the --memory-cache option: a number of volume pages, such as 64, or an amount of memory
+    in KB, MB or GB, such as 200MB or 1.5gb. Returns the most entries and the most bytes to hold,
+    one of which is None.'''
+    units = {'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+    memory = value[-2:].lower() in units
+    try:
+        size = int(float(value[:-2]) * units[value[-2:].lower()]) if memory else int(value)
+    except (ValueError, OverflowError):
+        size = 0
+    if size <= 0:
+        raise argparse.ArgumentTypeError("'{0}' is not a number of pages or a size in KB, MB or GB."
+                                         .format(value))
+    return (None, size) if memory else (size, None)
+
+def make_cache(options):
+    '''Make the volume cache, with the TTLs and maximum staleness from the command line (in days),
+    and the limit on the volumes held in memory. Any volumes to be invalidated are forgotten.'''
+    days = lambda value: None if value is None else value * 24 * 60 * 60
+    memory = MemoryCache(*(options.get('memory_cache') or (64, None)))
+    cache = Cache(ttl=days(options.get('ttl', 7)), max_staleness=days(options.get('max_staleness')),
+                  memory=memory, lookup_ttl=days(options.get('lookup_ttl', 30)))
+    cache.invalidate(options.get('invalidate') or [])
+    return cache
+
+def make_client(options):
+    '''Make the client that the API's requests go through: one that records every response to a
+    fixture file, one that answers from a fixture file without touching the network (after the
+    given latency, in seconds), or a plain HTTP client.'''
+    if options.get('record'):
+        return RecordingTransport(FixtureStore(options['record']))
+    if options.get('replay'):
+        return ReplayTransport(FixtureStore(options['replay']), latency=options.get('latency') or 0)
+    return HTTPClient()
+
+apis = dict() # The API of each kind for this process
+
+def get_api(kind, options, **kwargs):
+    '''The API of the given kind for this process. It is made the first time it is asked for, and
+    shared from then on, so every lookup goes through the same memory cache.'''
+    if kind not in apis:
+        if options.get('server'):
+            kwargs['server'] = options['server']
+        apis[kind] = kind(client=make_client(options), cache=make_cache(options), **kwargs)
+    return apis[kind]
+
+def close_apis():
+    '''Close every API made in this process, and count the requests they made.'''
+    for api in apis.values():
+        run_stats.add_api(api.calls, api.bytes_received, api.request_seconds)
+        api.close()
+    apis.clear()
+
+run_stats = RunStats() # Where the time went in this process
+
+def prepare_cases(files, options=dict()):
+    '''Prefetch the volume pages for every file, prepare every file, then check which of the cases
+    exist on Wikisource already with batched queries. Returns a list of (file, metadict) for the
+    cases that should be converted.'''
+    api = get_api(API, options)
+    # Fetch the list of cases for every volume up front, in as few requests as possible.
+    run_stats.end()
+    with run_stats.stage('prefetch'):
+        if options.get('refresh'):
+            api.refresh_volumes(get_volumes(files))
+        else:
+            api.prefetch_volumes(get_volumes(files))
+    
+    candidates = []
+    for file in files:
+        prepared = prepare_case(file, api)
+        if prepared:
+            candidates.append((file,) + prepared)
+    
+    # Skip if the file exists on Wikisource already
+    run_stats.end()
+    with run_stats.stage('exists'):
+        exists = api.cases_exist([line for file, metadict, line in candidates if line])
+    cases = skip_existing(candidates, exists)
+    logger.info(api.cache.report())
+    return cases
+
+async def convert_concurrently(files, options):
+    '''Convert the files with the Wikisource queries running alongside the rest of the work. The
+    volume pages are fetched while the files are stripped and validated. Once every case has been
+    found in its volume's list, the existence checks are all started, and each batch of cases is
+    converted as soon as its check comes back while the later checks are still waiting.'''
+    api = get_api(AsyncAPI, options, concurrency=options['concurrency'])
+    if options.get('refresh'):
+        prefetch = asyncio.ensure_future(api.refresh_volumes(get_volumes(files)))
+    else:
+        prefetch = asyncio.ensure_future(api.prefetch_volumes(get_volumes(files)))
+    read = []
+    for file in files:
+        run_stats.begin(file)
+        with run_stats.stage('read'):
+            metadict = read_case(file)
+        if metadict:
+            run_stats.begin(file, metadict['title'])
+            read.append((file, metadict))
+        await asyncio.sleep(0) # Let the queries move along between files
+    run_stats.end()
+    with run_stats.stage('prefetch'): # Only the time spent waiting for it
+        await prefetch
+    
+    # Look up every case before converting any, since this may prompt the user.
+    candidates = []
+    for file, metadict in read:
+        run_stats.begin(file)
+        found = find_case(metadict, api)
+        if found:
+            candidates.append((file,) + found)
+    run_stats.end()
+    batches = [candidates[i:i+api.batch_size] for i in range(0, len(candidates), api.batch_size)]
+    checks = [asyncio.ensure_future(api.cases_exist([line for file, metadict, line in batch
+                                                     if line])) for batch in batches]
     
-    # At this point, we have a valid text file for a case that does not exist on Wikisource
+    cases = []
+    for batch, check in zip(batches, checks):
+        with run_stats.stage('exists'): # Only the time spent waiting for it
+            exists = await check
+        for file, metadict in skip_existing(batch, exists):
+            if options["jobs"] > 1:
+                cases.append((file, metadict, options))
+            else:
+                convert_case(file, metadict, options)
+                await asyncio.sleep(0)
+    logger.info(api.cache.report())
+    if cases:
+        convert_all(cases, options["jobs"])
+
+def convert_case(file, metadict, options=dict()):
+    '''Convert a valid file for a case that does not exist on Wikisource yet, and prepare its bot
+    file. The text is passed from stage to stage in memory. Options are the command line arguments:
+    if 'trace' is set, the case's tokens are written to the tokens directory, and if 'wikitext' is
+    set, the postprocessed wikitext is written to the wikitext directory. This never prompts the
+    user, so it is safe to run in a worker process.'''
     logger.info("Parsing {0}.".format(metadict['title']))
-    tokenizer = Tokenizer(metadict)
+    run_stats.begin(file, metadict['title'])
+    make_dirs()
+    name = re.sub(r'[^a-zA-Z0-9_]', '', metadict['title'])
+    if options.get('trace'):
+        try:
+            os.mkdir('tokens')
+        except OSError:
+            pass
+        tokenizer = Tokenizer(metadict, 'tokens/' + name)
+    else:
+        tokenizer = Tokenizer(metadict)
     parser = Parser(metadict)
-    try:
-        os.mkdir('wikitext')
-    except OSError:
-        pass
-    out_filename = 'wikitext/' + re.sub(r'[^a-zA-Z0-9_]', '', metadict['title'])
-    postprocessor = Postprocessor(out_filename)
-    
+
     with open(file, 'r', encoding='utf-8') as input_file:
         raw_text = input_file.read()
+    # Tokens are streamed into the parser as they are read, rather than tokenizing the whole file
+    # up front, so the time spent reading them is taken out of the parser's.
+    output = io.StringIO()
+    try:
+        with run_stats.stage('parse', exclude='lex'):
+            parser.parse(run_stats.timed('lex', tokenizer.stream(raw_text)), output)
+    except IllegalCharacter as e:
+        logger.error("Illegal character encountered: \"{0}\" at {1}. More: {2}"
+                          .format(raw_text[e.value], e.value,
+                                 (raw_text[e.value:e.value+20] + "...").replace('\n', '\\n')))
+        logger.info('-----')
+        run_stats.end()
+        return
+    with run_stats.stage('postprocess'):
+        wikitext = Postprocessor(output.getvalue()).process()
+    if options.get('wikitext'):
         try:
-            token_stream = tokenizer.analyze(raw_text)
-        except IllegalCharacter as e:
-            logger.error("Illegal character encountered: \"{0}\" at {1}. More: {2}"
-                              .format(raw_text[e.value], e.value,
-                                     (raw_text[e.value:e.value+20] + "...").replace('\n', '\\n')))
-    with open(out_filename, 'w', encoding='utf-8') as output_file:
-        parser.parse(token_stream, output_file)
-    postprocessor.process()
-     
+            os.mkdir('wikitext')
+        except OSError:
+            pass
+        with open('wikitext/' + name, 'w', encoding='utf-8') as wikitext_file:
+            wikitext_file.write(wikitext)
+
     # Begin the bot parsing
-    try:
-        os.mkdir('botfiles')
-    except OSError:
-        pass
-    try:
-        os.mkdir('botfiles/pdfs')
-    except OSError:
-        pass
-    bot_filename = out_filename.replace('wikitext', 'botfiles')
-    bot = Bot(out_filename, bot_filename, metadict)
-    bot.prepare()
+    bot = Bot(wikitext, 'botfiles/' + name, metadict)
+    with run_stats.stage('bot'):
+        bot.parser.prepare()
+    with run_stats.stage('scan'):
+        bot.fetch_scan()
+    run_stats.end()
     logger.info('-----')
     summary_logger.info('\n')
-         
\ No newline at end of file
+
+#===================================================================================================
+# PROCESS POOL
+#===================================================================================================
+class RecordCollector(logging.Handler):
+    '''Holds the log messages from a worker process so that the main process can write them out in
+    the order the files were given. Workers never write to the log files themselves.'''
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.name, record.levelno, self.format(record)))
+
+collector = None
+
+def init_worker():
+    '''Replace any handlers inherited from the main process with a RecordCollector, and forget the
+    stages the main process had timed, so that only this worker's are sent back.'''
+    global collector
+    collector = RecordCollector()
+    for log in [logger, summary_logger]:
+        for handler in list(log.handlers):
+            log.removeHandler(handler)
+        log.setLevel(logging.DEBUG)
+        log.addHandler(collector)
+    run_stats.cases.clear()
+    run_stats.current = None
+
+def convert_worker(case):
+    '''Convert one case in a worker process. Returns the log messages it produced, and the time
+    each stage took.'''
+    file, metadict, options = case
+    collector.records = []
+    convert_case(file, metadict, options)
+    return collector.records, run_stats.cases.pop(file, dict())
+
+def convert_all(cases, jobs):
+    '''Convert a list of (file, metadict, options) cases with a pool of worker processes. The log messages
+    from each case are replayed in order as the results come back.'''
+    make_dirs()
+    # Build the lexer (or load its cached table) before the workers start, so they can share it.
+    Tokenizer(dict())
+    with multiprocessing.Pool(jobs, initializer=init_worker) as pool:
+        for (file, metadict, options), (records, stages) in zip(cases, pool.imap(convert_worker,
+                                                                                 cases)):
+            for name, level, message in records:
+                logging.getLogger(name).log(level, message)
+            run_stats.merge(file, stages)
+
+def main():
+    setup_logging()
+
+    # Command line parser
+    parser = argparse.ArgumentParser(description='Convert the text file of a supreme court case '
+                                     'to wikitext.')
+    input_files = parser.add_mutually_exclusive_group(required=True)
+    input_files.add_argument('-f', '--files', nargs='*', help='List of files to be parsed.')
+    input_files.add_argument('-d', '--dir', nargs=1, help='Directory of files to be parsed.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes to convert files with.')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='Number of Wikisource queries to have in flight at once.')
+    parser.add_argument('--ttl', type=float, default=7,
+                        help='Days before a cached volume page is checked for changes.')
+    parser.add_argument('--max-staleness', type=float,
+                        help='Days after which a cached volume page is not used until it is '
+                        'downloaded again.')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Check every cached volume page for changes, whatever its age.')
+    parser.add_argument('--lookup-ttl', type=float, default=30,
+                        help='Days to remember where each case was found in its volume, or why it '
+                        'wasn\'t.')
+    parser.add_argument('--invalidate', nargs='+', metavar='VOLUME',
+                        help='Forget the cached pages and lookups for these volumes.')
+    parser.add_argument('--memory-cache', metavar='SIZE', type=cache_size,
+                        help='Most volume pages to hold in memory (64 by default), or the most '
+                        'memory to hold them in, with a KB, MB or GB suffix, such as 200MB.')
+    parser.add_argument('--server', metavar='URL',
+                        help='Wikisource server to query (https://en.wikisource.org by default).')
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument('--record', metavar='FILE',
+                           help='Record every response from Wikisource to a fixture file.')
+    transport.add_argument('--replay', metavar='FILE',
+                           help='Answer queries from a fixture file instead of Wikisource.')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds to wait before each replayed response.')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='Write where the time went to FILE, as JSON, instead of to the stats '
+                        'file in the logs directory.')
+    parser.add_argument('-t', '--trace', action='store_true',
+                        help='Write the tokens for each case to the tokens directory.')
+    parser.add_argument('-w', '--wikitext', action='store_true',
+                        help='Write the wikitext for each case to the wikitext directory.')
+    args = vars(parser.parse_args())
+
+    # Get list of files
+    files = get_files(args)
+
+    try:
+        if args["concurrency"] > 1:
+            asyncio.run(convert_concurrently(files, args))
+            return
+
+        # Look up every case first, since this may prompt the user.
+        cases = prepare_cases(files, args)
+        if args["jobs"] > 1:
+            convert_all([(file, metadict, args) for file, metadict in cases], args["jobs"])
+        else:
+            for file, metadict in cases:
+                convert_case(file, metadict, args)
+    finally:
+        close_apis()
+        logger.info(run_stats.report())
+        run_stats.write(args["stats"] or
+                        'logs/stats' + strftime("%H:%M:%S_%d-%m-%Y", gmtime()) + '.json')
+
+if __name__ == '__main__':
+    main()
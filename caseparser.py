@@ -18,34 +18,57 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging, re
-from bexceptions import EntityError
+from bexceptions import EntityError, MissingHandler
+from tokenizer import Tokenizer
 
 class Parser(object):
     '''The parser converts the raw case text from lochner to a dictionary object. This is later
     converted to wikitext to be uploaded.'''
     
+    handlers = None # Maps each token type to its parsing function. Built by the first Parser.
+    
     def __init__(self, metadict):
         self.logger = logging.getLogger('brandeis')
         self.output = None
         self.metadict = metadict
+        if Parser.handlers is None:
+            Parser.handlers = Parser.build_handlers(Tokenizer.tokens)
+            
+    @classmethod
+    def build_handlers(cls, tokens):
+        '''Look up the parsing function for each token type, which has the same name as the type
+        in lowercase. Raises MissingHandler if any token type doesn't have one.'''
+        handlers = dict()
+        missing = []
+        for token_type in tokens:
+            handler = getattr(cls, token_type.lower(), None)
+            if callable(handler):
+                handlers[token_type] = handler
+            else:
+                missing.append(token_type)
+        if missing:
+            raise MissingHandler("No parsing function for token types: " + ', '.join(missing))
+        return handlers
 
     def parse(self, tokens, output_file):
-        '''Run the parser functions on the file.'''
+        '''Run the parser functions on the file. The tokens can be a list, or a generator such as
+        Tokenizer.stream() that produces them as the parser goes.'''
         if output_file:
             self.output = output_file
         self.tokens = tokens
         self.dispatch()
         
     def dispatch(self):
+        handlers = self.handlers
         for token in self.tokens:
             self.value = token[1]
             if self.value:
-                command = 'self.{0}()'.format(token[0].lower())
-                try:
-                    exec(command)
-                except AttributeError as e:
-                    self.logger.error("No command for " + command + ". " + repr(e));
+                handler = handlers.get(token[0])
+                if not handler:
+                    self.logger.error("No command for token type " + token[0] + ".");
                     break;
+                try:
+                    handler(self)
                 except Exception as e:
                     self.logger.error("Exception while parsing: " + repr(e));
                     break;
@@ -278,6 +301,11 @@ def strip_extraneous(content):
     else:
         return None
     
+def find_volume(content):
+    '''Returns the volume number from the case's <h1> title, or None if there isn't one.'''
+    match = re.search(r'<h1>[^<]*?\s\-\s(?P<volume>\d{1,3})\sU.S.\s\d{1,3}\s\(\d{4}\)</h1>', content)
+    return match.group('volume') if match else None
+
 def get_metadata(metadict, filename):
     '''Pull the title and other information from the file.'''
     with open(filename, 'r', encoding='utf-8') as file:
@@ -0,0 +1,111 @@
+# -*- coding: utf-8  -*-
+#! python3
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque, namedtuple
+from urllib import parse
+import gzip, http.client, threading, time
+
+# One finished request: the URL, the HTTP status, the time it took in seconds (including any
+# redirects and retries), and the size of the body once decompressed.
+Timing = namedtuple('Timing', ['url', 'status', 'seconds', 'size'])
+
+class HTTPClient(object):
+    '''A small HTTP client that keeps connections open between requests. Idle connections are kept
+    in a pool for each server, up to pool_size of them, and reused by the next request to that
+    server. Responses are requested gzipped. The last few requests are kept in timings.'''
+    
+    def __init__(self, pool_size=4, timeout=30, history=1000):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.headers = {'Accept-Encoding': 'gzip',
+                        'User-Agent': 'Brandeis (https://github.com/molly/brandeis)'}
+        self.pools = dict()
+        self.lock = threading.Lock()
+        self.timings = deque(maxlen=history)
+        self.connections_opened = 0
+        
+    def get(self, url, redirects=5):
+        '''Make a GET request, following redirects. Returns the status and the (decompressed) body
+        of the response.'''
+        start = time.perf_counter()
+        for i in range(redirects + 1):
+            status, headers, body = self.fetch(url)
+            location = headers.get('Location')
+            if status not in (301, 302, 303, 307, 308) or not location:
+                break
+            url = parse.urljoin(url, location)
+        if headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        self.timings.append(Timing(url, status, time.perf_counter() - start, len(body)))
+        return status, body
+    
+    def fetch(self, url):
+        '''Make one request over a pooled connection. A connection that has been idle may have been
+        closed by the server, so if a reused connection fails, try once more on a new one.'''
+        parts = parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        while True:
+            connection, reused = self.acquire(key)
+            try:
+                connection.request('GET', path, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(key, connection)
+            return response.status, response.headers, body
+        
+    def acquire(self, key):
+        '''Returns an idle connection to the server if there is one, or a new one, and whether it was
+        reused.'''
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool:
+                return pool.pop(), True
+            self.connections_opened += 1
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+    
+    def release(self, key, connection):
+        '''Put a connection back in the pool, or close it if the pool is full.'''
+        with self.lock:
+            pool = self.pools.setdefault(key, [])
+            if len(pool) < self.pool_size:
+                pool.append(connection)
+                return
+        connection.close()
+        
+    def close(self):
+        '''Close every pooled connection.'''
+        with self.lock:
+            pools = list(self.pools.values())
+            self.pools = dict()
+        for pool in pools:
+            for connection in pool:
+                connection.close()
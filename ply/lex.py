@@ -151,7 +151,7 @@ class Lexer:
                              newfindex.append(f)
                              continue
                          newfindex.append((getattr(object,f[0].__name__),f[1]))
-                newre.append((cre,newfindex))
+                     newre.append((cre,newfindex))
                 newtab[key] = newre
             c.lexstatere = newtab
             c.lexstateerrorf = { }
@@ -18,68 +18,166 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import re
+import functools, re
+
+# The rest of a run of whitespace, pipes and colons
+RUN_END = re.compile(r'[\s|:]*')
+# Things balance_quotes() has to look at: nowiki spans (which it skips), runs of apostrophes and
+# line breaks
+QUOTES = re.compile(r"<nowiki>.*?</nowiki>|'{2,}|\n", re.DOTALL)
+# What each run of apostrophes toggles: B is bold, I is italics. Other runs are left alone.
+TOGGLES = {2: 'I', 3: 'B', 5: 'BI', 6: 'BB'}
+MARKUP = {'B': "'''", 'I': "''"}
+# Lines that later stages look for by their exact text, which must not be wrapped in quotes
+MARKER_LINE = re.compile(r'PAGE\s\d+|Footnote\s\d+(?:\/\d+)?')
+# A blank line, which ends a paragraph (before the line breaks are cleaned up)
+PARAGRAPH_BREAK = re.compile(r'\n\s*(?:\|\s*)?\n')
 
 class Postprocessor(object):
-    def __init__(self, file):
-        self.filename = file
+    def __init__(self, text):
+        self.text = text
         
     def process(self):
-        '''Dispatcher method.'''
+        '''Dispatcher method. Returns the processed text.
+        
+        This gives the same result as process_in_stages(), with one pass over the text for each
+        step instead of two: quotes are balanced, then each run of line breaks is replaced by the
+        result of cleaning it twice, then the apostrophes are fixed.'''
+        content = balance_quotes(self.text).strip(' \t\n\r\f\v')
+        self.text = clean_runs(content).replace('¤', "'")
+        return self.text
+    
+    def process_in_stages(self):
+        '''Run each postprocessing step over the whole text in turn. Returns the processed text.
+        Quotes are balanced first, while the blank lines between paragraphs can still be told apart
+        from the line breaks inside them.'''
+        self.multiline_quotes()
         self.clean_spaces()
-        self.multiline_bold()
-#         self.multiline_italic()
         self.fix_apostrophes()
         self.clean_spaces() #Once more for good measure.
+        return self.text
     
     def clean_spaces(self):
         '''Make sure any line break consists of two spaces, avoid lines with just spaces on them.'''
-        with open(self.filename, 'r', encoding='utf-8') as output:
-            content = output.read()
+        content = self.text
         content = content.strip(' \t\n\r\f\v')
-        content = re.sub(r'\n\s*\|\s*\n', '\n\n', content)
-        content = content.replace('\n:\n', '\n')
-        content = re.sub('\n(\s)*\n', '\n\n', content)
-        content = content.replace('\n ', '\n')
-        content = re.sub('(?<!\n)\n(?!\n)', '\n\n', content)
-        with open(self.filename, 'w', encoding='utf-8') as output:
-            output.write(content)
+        self.text = clean_breaks(content)
             
     def fix_apostrophes(self):
         '''Change any literal apostrophes (that were temporarily converted to '¤' characters) back
         to apostrophes.'''
-        with open(self.filename, 'r', encoding='utf-8') as output:
-            content = output.read()
-        content = content.replace('¤', "'")
-        with open(self.filename, 'w', encoding='utf-8') as output:
-            output.write(content)
+        self.text = self.text.replace('¤', "'")
             
-    def multiline_bold(self):
-        '''Deal with line breaks within bold text.'''
-        with open(self.filename, 'r', encoding='utf-8') as output:
-            content = output.read()
-        content = re.split(r"(?<!<nowiki>)'''((?:.|\n)*?)'''(?!<\/nowiki>)", content)
-        new = ''
-        for i in range(len(content)):
-            if content[i]:
-                if ( i%2 ):
-                    new += "'''" + content[i] + "'''"
-                else:
-                    new += content[i]
-        with open(self.filename, 'w', encoding='utf-8') as output:
-            output.write(new)
-            
-    def multiline_italic(self):
-        '''Deal with line breaks within italic text.'''
-        with open(self.filename, 'r', encoding='utf-8') as output:
-            content = output.read()
-        content = re.split(r"((?<!('|>))''[^'](?:.|\n)*?[^']''(?!('|<)))", content)
-        new = ''
-        for i in range(len(content)):
-            if content[i]:
-                if ( i%2 ):
-                    new += "''" + content[i] + "''"
-                else:
-                    new += content[i]
-        with open(self.filename, 'w', encoding='utf-8') as output:
-            output.write(new)
\ No newline at end of file
+    def multiline_quotes(self):
+        '''Deal with line breaks within bold and italic text.'''
+        self.text = balance_quotes(self.text)
+
+def clean_breaks(content):
+    '''The line break cleanup done by clean_spaces(), not including stripping the ends.'''
+    content = re.sub(r'\n\s*\|\s*\n', '\n\n', content)
+    content = content.replace('\n:\n', '\n')
+    content = re.sub('\n(\s)*\n', '\n\n', content)
+    content = content.replace('\n ', '\n')
+    content = re.sub('(?<!\n)\n(?!\n)', '\n\n', content)
+    return content
+
+def clean_runs(content):
+    '''Do the same as clean_breaks(clean_breaks(content)), one run of line breaks at a time. A run
+    is the whitespace, pipes and colons around a newline. Everything clean_breaks() changes falls
+    inside one of these runs, and doesn't depend on anything outside it.'''
+    pieces = []
+    pos = 0
+    newline = content.find('\n')
+    while newline != -1:
+        start = newline
+        while start > pos and (content[start-1].isspace() or content[start-1] in '|:'):
+            start -= 1
+        end = RUN_END.match(content, newline).end()
+        pieces.append(content[pos:start])
+        pieces.append(clean_run(content[start:end]))
+        pos = end
+        newline = content.find('\n', end)
+    pieces.append(content[pos:])
+    return ''.join(pieces)
+
+@functools.lru_cache(maxsize=1024)
+def clean_run(run):
+    '''Clean a run of line breaks the way two passes of clean_spaces() would. The same few runs
+    come up over and over, so the results are cached.'''
+    return clean_breaks(clean_breaks(run))
+
+def balance_quotes(content):
+    '''MediaWiki closes any bold or italics at the end of a line, so text that is bold or italic
+    across a line break has to be closed before the break and opened again after it. Lines that
+    only hold a page or footnote marker are skipped over. Empty bold pairs are dropped, and
+    anything inside <nowiki></nowiki> is left alone.
+    
+    The quotes are paired up in one pass over the text, then the line breaks are fixed in a
+    second pass. Spans are only paired within a paragraph, so a span that isn't closed before the
+    next blank line is left as it is, as MediaWiki would close it, rather than pairing up with the
+    next run and flipping every span after it. Returns the new text.'''
+    matches = list(QUOTES.finditer(content))
+    
+    # Work out which runs open a span that is closed again later on in the same paragraph.
+    opener = {'B': None, 'I': None}
+    paired = set()
+    for i in range(len(matches)):
+        if matches[i].group() == '\n':
+            if PARAGRAPH_BREAK.match(content, matches[i].start()):
+                opener = {'B': None, 'I': None}
+            continue
+        toggles = TOGGLES.get(len(matches[i].group()), '') if matches[i].group()[0] == "'" else ''
+        if toggles == 'BB' and opener['B'] is None:
+            continue # Empty bold pair
+        for kind in toggles:
+            if opener[kind] is None:
+                opener[kind] = i
+            else:
+                paired.add((opener[kind], kind))
+                opener[kind] = None
+    
+    pieces = []
+    pos = 0
+    stack = [] # Spans that are open, in the order they were opened
+    visible = False # Whether the spans on the stack are open on the current line
+    for i in range(len(matches)):
+        match = matches[i]
+        text = match.group()
+        if text == '\n':
+            if match.start() < pos:
+                continue # Part of a run that has already been dealt with
+            start = match.start()
+            while start > pos and (content[start-1].isspace() or content[start-1] in '|:'):
+                start -= 1
+            end = RUN_END.match(content, match.start()).end()
+            pieces.append(content[pos:start])
+            if stack and visible:
+                pieces.extend(MARKUP[kind] for kind in reversed(stack))
+            pieces.append(content[start:end])
+            pos = end
+            visible = False
+            if stack:
+                line_end = content.find('\n', end)
+                line = content[end:] if line_end == -1 else content[end:line_end]
+                if not MARKER_LINE.fullmatch(line.rstrip()):
+                    pieces.extend(MARKUP[kind] for kind in stack)
+                    visible = True
+        elif text[0] == "'":
+            toggles = TOGGLES.get(len(text), '')
+            if stack and not visible:
+                pieces.append(content[pos:match.start()])
+                pieces.extend(MARKUP[kind] for kind in stack)
+                pos = match.start()
+                visible = True
+            if toggles == 'BB' and 'B' not in stack:
+                pieces.append(content[pos:match.start()])
+                pos = match.end()
+                continue
+            for kind in toggles:
+                if kind in stack:
+                    stack.remove(kind)
+                elif (i, kind) in paired:
+                    stack.append(kind)
+                    visible = True
+    pieces.append(content[pos:])
+    return ''.join(pieces)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8  -*-
+#! python3
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+import json, math, os, time
+
+def percentile(values, share):
+    '''The value at the given share (0 to 1) of a sorted list, by the nearest rank.'''
+    if not values:
+        return None
+    rank = math.ceil(share * len(values) - 1e-9) # Allow for floating-point error in the product
+    return values[min(len(values) - 1, max(0, rank - 1))]
+
+class RunStats(object):
+    '''Wall-clock and CPU time for each stage of each case, for each stage of the run that isn't
+    part of one case (such as prefetching volumes), and the requests made to the API. Stages are
+    timed with a clock read at each end, so timing them costs next to nothing. CPU time is the
+    time of the thread doing the work, so requests running alongside it in other threads aren't
+    counted against it.
+
+    Each case is kept under its file, in a dictionary from stage name to [wall, CPU] seconds. The
+    stages of the case that begin() was last called for are added to it; other stages are added
+    to the run.'''
+
+    def __init__(self):
+        self.cases = OrderedDict()
+        self.titles = dict()
+        self.run = OrderedDict()
+        self.current = None
+        self.api = OrderedDict([('calls', 0), ('bytes', 0), ('seconds', 0)])
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def begin(self, file, title=None):
+        '''Add the stages that follow to the case in this file.'''
+        self.current = self.cases.setdefault(file, OrderedDict())
+        if title:
+            self.titles[file] = title
+
+    def end(self):
+        '''Add the stages that follow to the run.'''
+        self.current = None
+
+    def add(self, name, wall, cpu):
+        stages = self.run if self.current is None else self.current
+        times = stages.setdefault(name, [0, 0])
+        times[0] += wall
+        times[1] += cpu
+
+    @contextmanager
+    def stage(self, name, exclude=None):
+        '''Time the block as a stage. Any time recorded under the exclude stage while the block
+        runs is taken out of it, for a stage that another is timed inside of.'''
+        stages = self.run if self.current is None else self.current
+        excluded = list(stages.get(exclude, [0, 0]))
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            inner = stages.get(exclude, [0, 0])
+            self.add(name, wall - (inner[0] - excluded[0]), cpu - (inner[1] - excluded[1]))
+
+    def timed(self, name, items, size=64):
+        '''Pass the items of an iterator through, timing how long it takes to produce them as a
+        stage. This is for a generator that does its work as it is read, like
+        Tokenizer.stream(). The items are read in chunks of size, so the clock is only read twice
+        for each chunk.'''
+        items = iter(items)
+        while True:
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            chunk = list(islice(items, size))
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+            if not chunk:
+                return
+            yield from chunk
+
+    def add_api(self, calls, size, seconds):
+        '''Add requests made to the API, with the bytes received and the seconds they took.'''
+        self.api['calls'] += calls
+        self.api['bytes'] += size
+        self.api['seconds'] += seconds
+
+    def merge(self, file, stages):
+        '''Add the stages of a case that was converted in another process.'''
+        case = self.cases.setdefault(file, OrderedDict())
+        for name, (wall, cpu) in stages.items():
+            times = case.setdefault(name, [0, 0])
+            times[0] += wall
+            times[1] += cpu
+
+    def summary(self, slowest=10):
+        '''Returns a dictionary of the totals for the run: the time of the whole run, the total
+        time and the median, 90th, 99th percentile and longest time of each stage across the cases,
+        the requests made to the API, and the slowest cases with the time of each of their stages.
+        The CPU time of the whole run is this process's; cases converted by worker processes only
+        count towards their stages.'''
+        stages = []
+        for case in list(self.cases.values()) + [self.run]:
+            stages.extend(name for name in case if name not in stages)
+        summary = OrderedDict()
+        summary['cases'] = len(self.cases)
+        summary['wall_seconds'] = time.perf_counter() - self.start
+        summary['cpu_seconds'] = time.process_time() - self.start_cpu
+        summary['stages'] = OrderedDict()
+        for name in stages:
+            walls = sorted(case[name][0] for case in self.cases.values() if name in case)
+            total = [sum(case[name][i] for case in self.cases.values() if name in case) +
+                     self.run.get(name, [0, 0])[i] for i in range(2)]
+            stage = OrderedDict([('wall', total[0]), ('cpu', total[1]), ('cases', len(walls))])
+            if walls:
+                stage.update([('p50', percentile(walls, 0.5)), ('p90', percentile(walls, 0.9)),
+                              ('p99', percentile(walls, 0.99)), ('max', walls[-1])])
+            summary['stages'][name] = stage
+        summary['api'] = self.api
+        cases = sorted(self.cases.items(), key=lambda case: -sum(t[0] for t in case[1].values()))
+        summary['slowest'] = [OrderedDict([('file', file), ('title', self.titles.get(file)),
+                                           ('wall', sum(t[0] for t in case.values())),
+                                           ('cpu', sum(t[1] for t in case.values())),
+                                           ('stages', OrderedDict((name, times[0]) for name, times
+                                                                  in case.items()))])
+                              for file, case in cases[:slowest]]
+        return summary
+
+    def report(self):
+        '''A line for the report on where the time went.'''
+        summary = self.summary(0)
+        stages = ', '.join('{0} {1:.2f}s'.format(name, stage['wall'])
+                           for name, stage in summary['stages'].items())
+        return ('{0} cases in {1:.2f}s ({2}); {3} API requests, {4:.1f} kB in {5:.2f}s.'
+                .format(summary['cases'], summary['wall_seconds'], stages, self.api['calls'],
+                        self.api['bytes'] / 1024, self.api['seconds']))
+
+    def write(self, path):
+        '''Write the summary out as JSON.'''
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as stats:
+            json.dump(self.summary(), stats, indent=1)
+            stats.write('\n')
@@ -17,18 +17,30 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from api import API
+from api import API, Cache, MemoryCache, VolumeIndex
+from transport import FixtureStore, RecordingTransport, ReplayTransport
+from urllib import parse
 from bexceptions import *
-import unittest
+import os, random, shutil, sqlite3, sys, tempfile, threading, time, unittest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'wikisource.json')
 
 class TestAPIFunctions(unittest.TestCase):
-    '''Test functions that communicate with the Wikisource API.'''
+    '''Test functions that communicate with the Wikisource API. The responses are replayed from the
+    fixtures, or recorded from Wikisource again if BRANDEIS_RECORD is set.'''
     
     def setUp(self):
-        self.api = API()
+        self.directory = tempfile.mkdtemp()
+        if os.environ.get('BRANDEIS_RECORD'):
+            client = RecordingTransport(FixtureStore(FIXTURES))
+        else:
+            client = ReplayTransport(FixtureStore(FIXTURES))
+        self.api = API(client=client, cache=Cache(os.path.join(self.directory, 'api.db')))
     
     def tearDown(self):
-        pass
+        self.api.close()
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
     
 # get_case_line()
 
@@ -48,6 +60,12 @@ class TestAPIFunctions(unittest.TestCase):
         with self.assertRaises(NoCaseInList, msg='Returned an entry for a non-existent case.'):
             self.api.get_case_line('CaseName', '39', '800')
     
+    def testCountedRequests(self):
+        self.api.get_case_line('Charles River Bridge v. Warren Bridge', '36', '420')
+        self.api.get_case_line('Charles River Bridge v. Warren Bridge', '36', '420')
+        self.assertEqual(self.api.calls, 1, 'Did not count the one request that was made.')
+        self.assertGreater(self.api.bytes_received, 500, 'Did not count the bytes received.')
+    
 # case_exists()
             
     def testExistingCase(self):
@@ -79,6 +97,427 @@ class TestAPIFunctions(unittest.TestCase):
                                                        '* 1 U.S. 11 (Pa. 1764) [[Davey v. Turner]]']),
                               "Did not return None for an ambiguous case number AND name.")
                                                       
+class TestBatchedExistence(unittest.TestCase):
+    '''Test the batched existence checks, with canned responses instead of the Wikisource API.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = API(cache=Cache(os.path.join(self.directory, 'api.db')))
+        self.urls = []
+        self.api.request = self.request
+        
+    def tearDown(self):
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
+        
+    def request(self, url):
+        self.urls.append(url)
+        titles = parse.unquote(url.split('titles=')[1]).split('|')
+        pages = dict()
+        normalized = []
+        for i in range(len(titles)):
+            title = titles[i].replace('_', ' ')
+            if title != titles[i]:
+                normalized.append({"from": titles[i], "to": title})
+            if title.startswith('Missing'):
+                pages[str(-i-1)] = {"ns": 0, "title": title, "missing": ""}
+            else:
+                pages[str(i+1)] = {"pageid": i+1, "ns": 0, "title": title}
+        return {"batchcomplete": "", "query": {"normalized": normalized, "pages": pages}}
+        
+    def testBatches(self):
+        titles = ['Case {0} v. State'.format(i) for i in range(120)]
+        exists = self.api.titles_exist(titles + titles[:10])
+        self.assertEqual(len(self.urls), 3, "Did not send the titles in batches of 50.")
+        self.assertEqual(exists, dict((title, True) for title in titles))
+        
+    def testMissingAndNormalized(self):
+        exists = self.api.titles_exist(['Missing v. Nobody', 'Dred_Scott v. Sandford'])
+        self.assertEqual(exists, {'Missing v. Nobody': False, 'Dred_Scott v. Sandford': True})
+        
+    def testCasesExist(self):
+        lines = ["* [http://openjurist.org/60/us/393 60 U.S. 393] ([[:Category:1857 works|1857]]) "
+                 "[[Dred Scott v. Sandford]]",
+                 "* 67 U.S. 17 ([[:Category:1862 works|1862]]) [[Missing v. Nobody|Missing]]",
+                 "* 67 U.S. 18 (1862)"]
+        self.assertEqual(self.api.cases_exist(lines), dict(zip(lines, [True, False, None])))
+        self.assertEqual(len(self.urls), 1)
+        self.assertTrue(self.api.case_exists(lines[0]))
+        
+    def testNothingToCheck(self):
+        self.assertEqual(self.api.cases_exist([]), dict())
+        self.assertEqual(self.urls, [], "Made a request with no titles to check.")
+        
+    def testCachedExistence(self):
+        self.api.titles_exist(['Dred Scott v. Sandford', 'Missing v. Nobody'])
+        exists = self.api.titles_exist(['Dred Scott v. Sandford', 'Missing v. Nobody'])
+        self.assertEqual(exists, {'Dred Scott v. Sandford': True, 'Missing v. Nobody': False})
+        self.assertEqual(len(self.urls), 1, "Asked again about pages that were just checked for.")
+        self.api.cache.missing_ttl = -1
+        self.api.titles_exist(['Dred Scott v. Sandford', 'Missing v. Nobody'])
+        self.assertEqual(len(self.urls), 2)
+        self.assertNotIn('Dred', self.urls[1], "Asked again about a page known to exist.")
+        self.api.cache.ttl = -1
+        self.api.titles_exist(['Dred Scott v. Sandford'])
+        self.assertEqual(len(self.urls), 3, "Trusted that a page exists after the TTL.")
+
+
+class TestVolumePrefetch(unittest.TestCase):
+    '''Test prefetching volume pages, with canned responses instead of the Wikisource API.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = API(cache=Cache(os.path.join(self.directory, 'api.db')))
+        self.urls = []
+        self.api.request = self.request
+        self.volumes = ['990', '991', '992', '993']
+        
+    def tearDown(self):
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
+        
+    def request(self, url):
+        self.urls.append(url)
+        titles = parse.unquote(url.split('titles=')[1].split('&')[0]).split('|')
+        pages = dict()
+        for i in range(len(titles)):
+            if titles[i].endswith('993'):
+                pages[str(-i-1)] = {"ns": 0, "title": titles[i], "missing": ""}
+            elif titles[i].endswith('992') and 'rvcontinue' not in url:
+                pages[str(i+1)] = {"pageid": i+1, "ns": 0, "title": titles[i]}
+            else:
+                pages[str(i+1)] = {"pageid": i+1, "ns": 0, "title": titles[i], "revisions":
+                                   [{"*": "* {0} U.S. 1 [[Case v. Volume {0}]]".format(titles[i][-3:])}]}
+        response = {"query": {"pages": pages}}
+        if 'rvcontinue' not in url and any(title.endswith('992') for title in titles):
+            response["continue"] = {"rvcontinue": "3|4", "continue": "||"}
+        return response
+        
+    def testPrefetch(self):
+        self.api.cache.add_to_volume_cache('990', 'Cached')
+        self.api.prefetch_volumes(self.volumes + ['991'])
+        self.assertEqual(len(self.urls), 2, "Did not follow the continuation, or made extra requests.")
+        self.assertNotIn('990', self.urls[0], "Requested a volume that was already cached.")
+        self.assertEqual(self.api.cache.get_cached_volume('990'), 'Cached')
+        self.assertEqual(self.api.cache.get_cached_volume('991'), '* 991 U.S. 1 [[Case v. Volume 991]]')
+        self.assertEqual(self.api.cache.get_cached_volume('992'), '* 992 U.S. 1 [[Case v. Volume 992]]')
+        self.assertFalse(self.api.cache.is_cached('993'))
+        
+    def testNoRequestsAfterPrefetch(self):
+        self.api.prefetch_volumes(self.volumes)
+        count = len(self.urls)
+        self.assertEqual(self.api.get_case_line('Case v. Volume 991', '991', '1'),
+                         '* 991 U.S. 1 [[Case v. Volume 991]]')
+        with self.assertRaises(PageNotFound):
+            self.api.get_case_line('Case v. Volume 993', '993', '1')
+        self.assertEqual(len(self.urls), count, "Made a request for a prefetched volume.")
+
+class TestRevisionCache(unittest.TestCase):
+    '''Test checking cached volumes for changes, with canned responses instead of the Wikisource
+    API.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = API(cache=Cache(os.path.join(self.directory, 'api.db'), ttl=60, max_staleness=600))
+        self.urls = []
+        self.api.request = self.request
+        self.revisions = {'990': 5, '991': 7}
+        for volume, revision in self.revisions.items():
+            self.api.cache.add_to_volume_cache(volume, 'Revision {0}'.format(revision), revision)
+        
+    def tearDown(self):
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
+        
+    def request(self, url):
+        self.urls.append(url)
+        titles = parse.unquote(url.split('titles=')[1].split('&')[0]).split('|')
+        pages = dict()
+        for i in range(len(titles)):
+            revision = self.revisions[titles[i][-3:]]
+            pages[str(i+1)] = {"pageid": i+1, "ns": 0, "title": titles[i]}
+            if 'prop=info' in url:
+                pages[str(i+1)]["lastrevid"] = revision
+            else:
+                pages[str(i+1)]["revisions"] = [{"revid": revision, "parentid": revision - 1,
+                                                 "*": "Revision {0}".format(revision)}]
+        return {"query": {"pages": pages}}
+    
+    def age(self, volume, seconds):
+        info = self.api.cache.get_info(volume)
+        info["checked"] -= seconds
+        self.api.cache.write_info(volume, info)
+        
+    def testFresh(self):
+        self.api.prefetch_volumes(['990', '991'])
+        self.assertEqual(self.urls, [], "Checked volumes that were checked within the TTL.")
+        
+    def testChanged(self):
+        self.age('990', 120)
+        self.age('991', 120)
+        self.revisions['991'] = 8
+        self.api.prefetch_volumes(['990', '991'])
+        self.assertEqual(len(self.urls), 2)
+        self.assertIn('prop=info', self.urls[0], "Did not check the revisions in one query.")
+        self.assertNotIn('990', self.urls[1], "Downloaded a volume that hadn't changed.")
+        self.assertEqual(self.api.cache.get_cached_volume('991'), 'Revision 8')
+        self.assertEqual(self.api.cache.get_revision('991'), 8)
+        self.assertLess(self.api.cache.age('990'), 60, "Did not note that the volume was checked.")
+        self.api.prefetch_volumes(['990', '991'])
+        self.assertEqual(len(self.urls), 2)
+        
+    def testRefresh(self):
+        self.revisions['990'] = 6
+        self.revisions['992'] = 1
+        self.api.refresh_volumes(['990', '991', '992'])
+        self.assertEqual(self.api.cache.get_cached_volume('990'), 'Revision 6')
+        self.assertEqual(self.api.cache.get_cached_volume('991'), 'Revision 7')
+        self.assertTrue(self.api.cache.is_cached('992'))
+        
+    def testUnknownRevision(self):
+        self.api.cache.write_info('990', {"revision": None, "fetched": time.time() - 120,
+                                          "checked": time.time() - 120})
+        self.api.prefetch_volumes(['990'])
+        self.assertEqual(len(self.urls), 2, "Did not download a volume with no known revision.")
+        self.assertEqual(self.api.cache.get_revision('990'), 5)
+        
+    def testMaxStaleness(self):
+        self.age('990', 1200)
+        self.assertFalse(self.api.cache.is_cached('990'))
+        self.assertIsNone(self.api.cache.get_cached_volume('990'))
+        self.assertEqual(self.api.get_case_line('Revision', '990', '1'), 'Revision')
+        self.assertEqual(len(self.urls), 1)
+        self.assertLess(self.api.cache.age('990'), 60)
+
+class TestCache(unittest.TestCase):
+    '''Test the SQLite cache.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'api.db')
+        self.cache = Cache(self.path)
+        
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+        
+    def testVolumes(self):
+        content = '* 990 U.S. 1 [[Case v. Volume 990]]\n' * 1000
+        self.cache.add_to_volume_cache('990', content, 12)
+        self.assertEqual(self.cache.get_cached_volume('990'), content)
+        self.assertIsNone(self.cache.get_cached_volume('991'))
+        self.assertEqual(self.cache.get_revision('990'), 12)
+        stored = self.cache.db.execute('SELECT LENGTH(content) FROM volumes').fetchone()[0]
+        self.assertLess(stored, len(content) / 10, "Did not compress the volume.")
+        self.cache.remove('990')
+        self.assertFalse(self.cache.is_cached('990'))
+        
+    def testLookups(self):
+        self.cache.add_to_volume_cache('990', 'Old')
+        self.cache.add_lookup('990', '1', 'Case v. Volume', '* 990 U.S. 1 [[Case v. Volume]]')
+        self.assertEqual(self.cache.get_lookup('990', '1', 'Case v. Volume'),
+                         ('* 990 U.S. 1 [[Case v. Volume]]', None, None))
+        self.cache.add_to_volume_cache('990', 'New')
+        self.assertIsNone(self.cache.get_lookup('990', '1', 'Case v. Volume'),
+                          "Kept a lookup from an old revision of the volume.")
+        api = API(cache=self.cache)
+        api.request = None
+        self.cache.add_to_volume_cache('990', '* 990 U.S. 1 [[Case v. Volume]]')
+        api.get_case_line('Case v. Volume', '990', '1')
+        self.cache.db.execute('UPDATE volumes SET content = ?', (b'',))
+        self.assertEqual(api.get_case_line('Case v. Volume', '990', '1'),
+                         '* 990 U.S. 1 [[Case v. Volume]]', "Searched the volume again.")
+        
+    def testLookupOutcomes(self):
+        self.cache.add_to_volume_cache('990', '* 990 U.S. 1 [[Case v. Volume]]')
+        api = API(cache=self.cache)
+        api.request = None
+        with self.assertRaises(NoCaseInList) as first:
+            api.get_case_line('Other v. Volume', '990', '2')
+        self.cache.close()
+        self.cache = Cache(self.path)
+        api = API(cache=self.cache)
+        api.request = None
+        self.cache.db.execute('UPDATE volumes SET content = ?', (b'',))
+        self.cache.db.execute('DELETE FROM indexes')
+        with self.assertRaises(NoCaseInList, msg="Searched the volume again.") as second:
+            api.get_case_line('Other v. Volume', '990', '2')
+        self.assertEqual(second.exception.value, first.exception.value)
+        self.assertIsNone(self.cache.get_choice('990', '2', 'Other v. Volume'))
+        self.cache.set_choice('990', '2', 'Other v. Volume', 'n')
+        self.assertEqual(self.cache.get_choice('990', '2', 'Other v. Volume'), 'n')
+        self.cache.lookup_ttl = -1
+        self.assertIsNone(self.cache.get_lookup('990', '2', 'Other v. Volume'),
+                          "Kept a lookup past the lookup TTL.")
+        
+    def testMissingVolume(self):
+        api = API(cache=self.cache)
+        urls = []
+        api.request = lambda url: urls.append(url) or {"query": {"pages": {"-1": {"missing": ""}}}}
+        with self.assertRaises(PageNotFound):
+            api.get_case_line('Case v. Volume', '990', '1')
+        api = API(cache=self.cache)
+        api.request = None
+        with self.assertRaises(PageNotFound, msg="Asked again for a volume with no page."):
+            api.get_case_line('Case v. Volume', '990', '1')
+        self.assertEqual(len(urls), 1)
+        
+    def testOldDatabase(self):
+        self.cache.close()
+        os.remove(self.path)
+        old = sqlite3.connect(self.path)
+        old.execute('CREATE TABLE titles (title TEXT PRIMARY KEY, checked REAL)')
+        old.execute('CREATE TABLE lookups (volume TEXT, page TEXT, title TEXT, line TEXT, '
+                    'PRIMARY KEY (volume, page, title))')
+        old.execute('INSERT INTO titles VALUES (?, ?)', ('Dred Scott v. Sandford', time.time()))
+        old.commit()
+        old.close()
+        self.cache = Cache(self.path)
+        self.assertEqual(self.cache.known_titles(['Dred Scott v. Sandford']),
+                         {'Dred Scott v. Sandford': True})
+        self.cache.add_lookup('990', '1', 'Case v. Volume', error='NoCaseInList', message='Not there.')
+        self.assertEqual(self.cache.get_lookup('990', '1', 'Case v. Volume'),
+                         (None, 'NoCaseInList', 'Not there.'))
+        
+    def testInvalidate(self):
+        self.cache.add_to_volume_cache('990', 'Volume 990')
+        self.cache.add_to_volume_cache('991', 'Volume 991')
+        self.cache.add_lookup('990', '1', 'Case v. Volume', error='NoCaseInList', message='Not there.')
+        self.cache.invalidate(['990'])
+        self.assertFalse(self.cache.is_cached('990'))
+        self.assertIsNone(self.cache.get_lookup('990', '1', 'Case v. Volume'))
+        self.assertTrue(self.cache.is_cached('991'))
+        
+    def testMigration(self):
+        self.cache.close()
+        with open(os.path.join(self.directory, '990'), 'w', encoding='utf-8') as old:
+            old.write('Volume 990')
+        with open(os.path.join(self.directory, '991'), 'w', encoding='utf-8') as old:
+            old.write('Volume 991')
+        with open(os.path.join(self.directory, '991.json'), 'w', encoding='utf-8') as old:
+            old.write('{"revision": 4, "fetched": 10, "checked": 20}')
+        os.mkdir(os.path.join(self.directory, 'lextab'))
+        self.cache = Cache(self.path)
+        self.assertEqual(self.cache.get_cached_volume('990'), 'Volume 990')
+        self.assertIsNone(self.cache.get_revision('990'))
+        self.assertEqual(self.cache.get_cached_volume('991'), 'Volume 991')
+        self.assertEqual(self.cache.get_info('991'), {"revision": 4, "fetched": 10, "checked": 20})
+        self.assertEqual([name for name in os.listdir(self.directory)
+                          if not name.startswith('api.db')], ['lextab'], "Did not remove the files.")
+        
+    def testConcurrentReads(self):
+        contents = ['{0}\n'.format(i) * 5000 for i in range(20)]
+        def write():
+            writer = Cache(self.path)
+            for content in contents:
+                writer.add_to_volume_cache('990', content)
+            writer.close()
+        self.cache.memory.max_entries = 0 # Read from the database every time
+        self.cache.add_to_volume_cache('990', contents[0])
+        thread = threading.Thread(target=write)
+        thread.start()
+        while thread.is_alive():
+            self.assertIn(self.cache.get_cached_volume('990'), contents)
+        thread.join()
+        self.assertEqual(self.cache.get_cached_volume('990'), contents[-1])
+        
+    def testOneReadPerVolume(self):
+        content = ''.join('* 990 U.S. {0} [[Case {0} v. Volume]]\n'.format(page) for page in range(50))
+        self.cache.add_to_volume_cache('990', content)
+        self.cache.close()
+        self.cache = Cache(self.path)
+        reads = []
+        self.cache.db.set_trace_callback(reads.append)
+        api = API(cache=self.cache)
+        for page in range(50):
+            self.assertEqual(api.get_case_line('Case {0} v. Volume'.format(page), '990', str(page)),
+                             '* 990 U.S. {0} [[Case {0} v. Volume]]'.format(page))
+        self.assertEqual(len([read for read in reads
+                              if 'SELECT content' in read or 'FROM indexes' in read]), 1)
+        self.assertEqual((self.cache.memory.hits, self.cache.memory.misses), (49, 1))
+        
+    def testReport(self):
+        self.cache.add_to_volume_cache('990', 'Volume 990')
+        self.cache.get_cached_volume('990')
+        self.cache.get_cached_volume('991')
+        self.cache.add_titles({'Case v. Volume': True, 'Missing v. Nobody': False})
+        report = self.cache.report()
+        self.assertTrue(report.startswith('Cache: 1 volumes'), report)
+        self.assertIn('2 pages checked for', report)
+        self.assertIn('volumes 50% (1 of 2)', report)
+
+class TestVolumeIndex(unittest.TestCase):
+    '''Test that looking cases up in the volume index finds what searching the list does.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = API(cache=Cache(os.path.join(self.directory, 'api.db')))
+
+    def tearDown(self):
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
+
+    def find(self, find, *args):
+        try:
+            return find(*args)
+        except (MultipleCases, NoCaseInList) as e:
+            return type(e), e.value
+        
+    def testIndex(self):
+        index = VolumeIndex.build('* [http://openjurist.org/990/us/1 990 U.S. 1] [[A v. B]]\n'
+                                  '* 990 U.S. 1 and 990 U.S. 12 [[C v. D]]\n'
+                                  '* 1990 U.S. 1 [[E v. F]]\n* 989 U.S. 990 U.S. 3 [[G v. H]]\n')
+        self.assertEqual(index.lines('990', '1'), ['* [http://openjurist.org/990/us/1 990 U.S. 1] '
+                                                   '[[A v. B]]', '* 990 U.S. 1 and 990 U.S. 12 [[C v. D]]'])
+        self.assertEqual(index.lines('990', '3'), ['* 989 U.S. 990 U.S. 3 [[G v. H]]'])
+        self.assertEqual(index.lines('990', '2'), [])
+        self.assertFalse(index.irregular)
+        self.assertTrue(VolumeIndex.build('* 990 U.S. 1\n[[A v. B]]').irregular)
+        loaded = VolumeIndex.load(index.dump())
+        self.assertEqual((loaded.pages, loaded.irregular), (index.pages, index.irregular))
+        
+    def testSameAsSearch(self):
+        pieces = ['990', '99', '1', '12', ' ', '\t', '\n', '\n', '\n\n', 'U.S.', ' U.S. ', '* ',
+                  '[[', ']]', 'A v. B', 'a V. b', 'C v. A', '(1862)', '/', ' 990 U.S. 1 ',
+                  ' 990 U.S. 12 ', ' 990 U.S. 99', '* 990 U.S. 1]']
+        rand = random.Random(0)
+        contents = ['* [[A v. B]]\n990 U.S. 1 see above', '* [[A v. B]]\n\n990 U.S. 12 (1862)']
+        contents.extend(''.join(rand.choice(pieces) for j in range(rand.randint(0, 40)))
+                        for i in range(3000))
+        for content in contents:
+            index = VolumeIndex.build(content)
+            for title, page in [('A v. B', '1'), ('A v. B', '12'), ('C v. A', '99')]:
+                expected = self.find(self.api.find_line, content, title, '990', page, 'URL')
+                if not index.irregular:
+                    self.assertEqual(self.find(self.api.find_indexed_line, index, content, title,
+                                               '990', page, 'URL'), expected,
+                                     "Index gave the wrong line for {0}.".format(repr(content)))
+
+class TestMemoryCache(unittest.TestCase):
+    '''Test the least-recently-used memory cache.'''
+    
+    def testEntries(self):
+        memory = MemoryCache(max_entries=2)
+        memory.put('a', 1)
+        memory.put('b', 2)
+        self.assertEqual(memory.get('a'), 1)
+        memory.put('c', 3)
+        self.assertIsNone(memory.get('b'), "Evicted the wrong entry.")
+        self.assertEqual((memory.get('a'), memory.get('c')), (1, 3))
+        self.assertEqual((memory.hits, memory.misses, memory.evictions), (3, 1, 1))
+        
+    def testBytes(self):
+        size = sys.getsizeof('x' * 100)
+        memory = MemoryCache(max_entries=None, max_bytes=size * 2)
+        for key in 'abc':
+            memory.put(key, key * 100)
+        self.assertEqual(list(memory.entries), ['b', 'c'])
+        self.assertEqual(memory.size, size * 2)
+        memory.put('d', 'd' * 1000)
+        self.assertIsNone(memory.peek('d'), "Held a value bigger than the limit.")
+        self.assertEqual(memory.evictions, 1)
+        memory.discard('b')
+        self.assertEqual(memory.size, size)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,147 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from api import API, Cache
+from asyncapi import AsyncAPI
+from urllib import parse
+import asyncio, json, os, shutil, tempfile, threading, time, unittest
+
+class StandInClient(object):
+    '''Answers queries the way the Wikisource API would, after a short delay, and keeps track of how
+    many are in flight at once. Titles starting with "Missing" don't exist, and the first few
+    requests can be refused for lag.'''
+    
+    def __init__(self, delay=0.02, lagged=0):
+        self.pool_size = 4
+        self.delay = delay
+        self.lagged = lagged
+        self.lock = threading.Lock()
+        self.urls = []
+        self.starts = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        
+    def get(self, url):
+        with self.lock:
+            self.urls.append(url)
+            self.starts.append(time.monotonic())
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+            lagged = self.lagged > 0
+            self.lagged -= 1
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        if lagged:
+            response = {"error": {"code": "maxlag", "info": "Waiting for a database server: 6 "
+                                  "seconds lagged.", "lag": 6}}
+        else:
+            response = self.respond(url)
+        return 200, json.dumps(response).encode('utf-8')
+    
+    def respond(self, url):
+        titles = parse.unquote(url.split('titles=')[1].split('&')[0]).split('|')
+        pages = dict()
+        normalized = []
+        for i in range(len(titles)):
+            title = titles[i].replace('_', ' ')
+            if title != titles[i]:
+                normalized.append({"from": titles[i], "to": title})
+            if title.startswith('Missing') or title.endswith('Volume 993'):
+                pages[str(-i-1)] = {"ns": 0, "title": title, "missing": ""}
+            elif 'prop=revisions' in url:
+                pages[str(i+1)] = {"pageid": i+1, "ns": 0, "title": title, "revisions":
+                                   [{"*": "* {0} U.S. 1 [[Case v. Volume {0}]]".format(title[-3:])}]}
+            else:
+                pages[str(i+1)] = {"pageid": i+1, "ns": 0, "title": title}
+        return {"batchcomplete": "", "query": {"normalized": normalized, "pages": pages}}
+    
+    def close(self):
+        pass
+
+class TestAsyncAPI(unittest.TestCase):
+    '''Test the concurrent client against a stand-in for the Wikisource API.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = StandInClient()
+        self.api = AsyncAPI(client=self.client, cache=Cache(os.path.join(self.directory, 'async.db')),
+                            concurrency=3, rate=None)
+        self.volumes = ['990', '991', '992', '993']
+        
+    def tearDown(self):
+        self.api.close()
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
+        
+    def testSameAsSync(self):
+        titles = ['Case {0} v. State'.format(i) for i in range(120)]
+        titles += ['Missing v. Nobody', 'Dred_Scott v. Sandford'] + titles[:10]
+        lines = ["* [http://openjurist.org/60/us/393 60 U.S. 393] ([[:Category:1857 works|1857]]) "
+                 "[[Dred Scott v. Sandford]]",
+                 "* 67 U.S. 17 ([[:Category:1862 works|1862]]) [[Missing v. Nobody|Missing]]",
+                 "* 67 U.S. 18 (1862)"]
+        sync = API(client=StandInClient(delay=0),
+                   cache=Cache(os.path.join(self.directory, 'sync.db')))
+        self.assertEqual(asyncio.run(self.api.titles_exist(titles)), sync.titles_exist(titles))
+        self.assertEqual(asyncio.run(self.api.cases_exist(lines)), sync.cases_exist(lines))
+        self.assertTrue(asyncio.run(self.api.case_exists(lines[0])))
+        self.assertEqual(asyncio.run(self.api.cases_exist([])), dict())
+        
+    def testPrefetch(self):
+        self.api.batch_size = 1
+        asyncio.run(self.api.prefetch_volumes(self.volumes))
+        self.assertEqual(self.api.get_case_line('Case v. Volume 991', '991', '1'),
+                         '* 991 U.S. 1 [[Case v. Volume 991]]')
+        self.assertEqual(self.api.cache.get_cached_volume('992'), '* 992 U.S. 1 [[Case v. Volume 992]]')
+        self.assertEqual(self.api.missing_volumes, {'993'})
+        self.assertEqual(len(self.client.urls), 4, "Made a request for a prefetched volume.")
+        
+    def testConcurrency(self):
+        self.api.batch_size = 1
+        asyncio.run(self.api.titles_exist(['Case {0} v. State'.format(i) for i in range(12)]))
+        self.assertEqual(len(self.client.urls), 12)
+        self.assertEqual(self.client.most_in_flight, 3,
+                         "Did not keep the number of requests in flight at the limit.")
+        
+    def testRate(self):
+        self.api.batch_size = 1
+        self.api.rate = 50
+        asyncio.run(self.api.titles_exist(['Case {0} v. State'.format(i) for i in range(6)]))
+        starts = sorted(self.client.starts)
+        self.assertGreaterEqual(starts[-1] - starts[0], 5 / 50 - 0.01,
+                                "Started more requests a second than the rate allows.")
+        
+    def testMaxlag(self):
+        self.client.lagged = 2
+        self.api.maxlag_wait = 0.01
+        self.assertEqual(asyncio.run(self.api.titles_exist(['Missing v. Nobody'])),
+                         {'Missing v. Nobody': False})
+        self.assertEqual(len(self.client.urls), 3, "Did not retry a request refused for lag.")
+        self.assertTrue(all('&maxlag=5' in url for url in self.client.urls))
+        
+    def testTooLagged(self):
+        self.client.lagged = 10
+        self.api.maxlag_wait = 0
+        with self.assertRaises(SystemExit):
+            asyncio.run(self.api.titles_exist(['Missing v. Nobody']))
+        self.assertEqual(len(self.client.urls), self.api.maxlag_retries + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from api import API, Cache
+from transport import FixtureStore, ReplayTransport
+import brandeis
+import argparse, os, shutil, tempfile, unittest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'wikisource.json')
+
+class TestFindCase(unittest.TestCase):
+    '''Test looking cases up before they are converted.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.api = API(client=ReplayTransport(FixtureStore(FIXTURES)),
+                       cache=Cache(os.path.join(self.directory, 'api.db')))
+    
+    def tearDown(self):
+        self.api.close()
+        self.api.cache.close()
+        shutil.rmtree(self.directory)
+        
+    def testFound(self):
+        metadict = {'title': 'Charles River Bridge v. Warren Bridge', 'volume': '36', 'page': '420'}
+        found = brandeis.find_case(metadict, self.api)
+        self.assertEqual(found[0], metadict, 'Did not return the metadata.')
+        self.assertIn('[[Charles River Bridge v. Warren Bridge]]', found[1],
+                      'Did not return the line from the list.')
+        
+    def testNoVolumePage(self):
+        metadict = {'title': 'title', 'volume': '800', 'page': '25'}
+        with self.assertLogs('brandeis', 'ERROR') as logs:
+            self.assertIsNone(brandeis.find_case(metadict, self.api),
+                              'Did not skip a case with no page for its volume.')
+        self.assertIn('File will be skipped.', logs.output[0], 'Did not log the skipped case.')
+
+class TestCacheSize(unittest.TestCase):
+    '''Test parsing the size of the memory cache from the command line.'''
+    
+    def testSizes(self):
+        self.assertEqual(brandeis.cache_size('64'), (64, None), 'Did not read a number of pages.')
+        self.assertEqual(brandeis.cache_size('200MB'), (None, 200 * 1024 ** 2),
+                         'Did not read a size in MB.')
+        self.assertEqual(brandeis.cache_size('1.5gb'), (None, int(1.5 * 1024 ** 3)),
+                         'Did not read a size in GB.')
+        
+    def testBadSizes(self):
+        for value in ['200M', '200B', 'MB', 'x', '0', '-1KB']:
+            with self.assertRaises(argparse.ArgumentTypeError, msg='Accepted ' + value):
+                brandeis.cache_size(value)
+
+if __name__ == "__main__":
+    unittest.main()
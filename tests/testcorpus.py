@@ -0,0 +1,71 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from benchmarks.corpus import make_case, write_corpus
+from caseparser import get_metadata, strip_extraneous
+from validator import Validator
+import os, re, shutil, tempfile, unittest
+
+class TestCorpus(unittest.TestCase):
+    '''Test the made-up cases for benchmarking.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testSameSeed(self):
+        self.assertEqual(make_case(3, 100, 1, 1900, 10, 2, 1, seed=5),
+                         make_case(3, 100, 1, 1900, 10, 2, 1, seed=5),
+                         'The same seed made a different case.')
+        self.assertNotEqual(make_case(3, 100, 1, 1900, 10, 2, 1, seed=5),
+                            make_case(3, 100, 1, 1900, 10, 2, 1, seed=6),
+                            'A different seed made the same case.')
+
+    def testValidCases(self):
+        files = write_corpus(self.directory, 6, pages=(1, 10), separate=2, per_curiam=0.5)
+        pages = []
+        for file in files:
+            with open(file, 'r', encoding='utf-8') as html:
+                content = strip_extraneous(html.read())
+            self.assertIsNotNone(content, 'There is no <article id="maincontent"> in the case.')
+            with open(file, 'w', encoding='utf-8') as html:
+                html.write(content)
+            Validator(file).validate()
+            metadict = dict()
+            get_metadata(metadict, file)
+            pages.append((int(metadict['volume']), int(metadict['page'])))
+        self.assertEqual(pages, sorted(set(pages)), 'The cases do not follow on from each other.')
+
+    def testSize(self):
+        title, html, last = make_case(0, 100, 1, 1900, pages=50, footnotes=2, separate=2)
+        links = re.findall(r'name="(\d+)" href', html)
+        self.assertEqual(links, [str(page) for page in range(2, last + 1)],
+                         'The page-number links are not in order.')
+        self.assertGreaterEqual(last, 45, 'The case is much shorter than asked for.')
+        self.assertGreater(len(re.findall(r'href="#F\d+"', html)), 60,
+                           'There are far fewer footnotes than asked for.')
+        self.assertGreater(len(re.findall(r'href="#F\d+/\d+"', html)), 0,
+                           'There are no footnotes in the separate opinions.')
+        self.assertEqual(len(re.findall(r'JUSTICE [A-Za-z]+, (?:concurring|dissenting)', html)), 2,
+                         'Did not write the separate opinions.')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from bot.botparser import BotParser
+from bot.document import *
+import unittest
+
+class TestDocument(unittest.TestCase):
+    '''Test the document model used by the bot parser.'''
+    
+    def setUp(self):
+        self.text = ("U.S. Supreme Court\n\nSome text. <ref name=\"ref1\"></ref>\n\nPAGE 12\n\n"
+                     "Footnote 1\n\nThe footnote.\n\nFootnote 2/1")
+        
+    def testBlocks(self):
+        document = Document(self.text)
+        self.assertEqual([type(block) for block in document.blocks],
+                         [Paragraph, Paragraph, PageNumber, FootnoteMarker, Paragraph,
+                          FootnoteMarker])
+        self.assertEqual(document.blocks[1].anchors, ['1'])
+        self.assertEqual(document.blocks[2].number, '12')
+        self.assertEqual((document.blocks[5].section, document.blocks[5].number), ('2', '1'))
+        self.assertEqual(type(make_block('PAGE twelve')), Paragraph)
+        
+    def testSectionText(self):
+        document = Document(self.text)
+        section = Section('Title/Opinion of the Court')
+        section.blocks = document.blocks
+        document.sections.append(section)
+        self.assertEqual(section.text(), "{{-start-}}\n'''Title/Opinion of the Court'''\n" +
+                         self.text + "\n\n\n{{smallrefs}}\n{{-stop-}}")
+        self.assertEqual(section.text(20), section.text()[:20])
+        self.assertEqual(document.serialize(), clean_spaces(section.text()))
+        
+    def testCut(self):
+        section = Section('Title')
+        section.blocks = Document(self.text).blocks
+        self.assertEqual(section.find('Footnote 1'), (3, 0))
+        self.assertEqual(section.find('Footnote 3'), None)
+        cut = section.cut(3, 0)
+        self.assertEqual(cut, "Footnote 1\n\nThe footnote.\n\nFootnote 2/1\n\n\n")
+        self.assertEqual(len(section.blocks), 3)
+        self.assertEqual(section.text(), "{{-start-}}\n'''Title'''\nU.S. Supreme Court\n\n"
+                         "Some text. <ref name=\"ref1\"></ref>\n\nPAGE 12\n\n{{smallrefs}}\n{{-stop-}}")
+        
+    def testIndexFootnotes(self):
+        document = Document(self.text)
+        section = Section()
+        section.blocks = document.blocks
+        document.sections.append(section)
+        positions, anchors = document.index_footnotes(['Footnote 1', 'Footnote 2/1', 'Footnote 3/1'])
+        self.assertEqual(positions, {'Footnote 1': [(section, 3, 0)],
+                                     'Footnote 2/1': [(section, 5, 0)], 'Footnote 3/1': []})
+        self.assertEqual(anchors, {'1': [document.blocks[1]]})
+        
+    def testSplice(self):
+        text = 'One <ref name="ref1"></ref> two <ref name="ref2"></ref>.'
+        self.assertEqual(splice(text, [(32, '<ref name="ref2">', 'B'), (4, '<ref name="ref1">', 'A')]),
+                         'One<ref name="ref1">A</ref> two<ref name="ref2">B</ref>.')
+
+class TestBotParser(unittest.TestCase):
+    '''Test the bot parser's passes over the sections of a document.'''
+    
+    def parser(self, text):
+        parser = BotParser(text, None, dict())
+        section = Section('Title')
+        section.blocks = parser.document.blocks
+        parser.document.sections.append(section)
+        return parser, section
+        
+    def testFootnotes(self):
+        parser, section = self.parser('Text <ref name="ref1"></ref>.\n\nFootnote 1\n\nSee note '
+                                      '<ref name="ref2"></ref>.\n\nFootnote 2\n\nThe second.')
+        parser.metadict['max_footnote'] = {'1': 2}
+        parser.footnotes()
+        self.assertEqual([block.text for block in section.blocks],
+                         ['Text<ref name="ref1">See note<ref name="ref2">The second.</ref>.</ref>.'])
+
+    def testMovePages(self):
+        parser, section = self.parser('Text.\n\nPAGE 12')
+        parser.document.sections.append(Section('Title/Dissent'))
+        parser.document.sections[1].blocks = [make_block('More.'), make_block('PAGE 13')]
+        parser.pages()
+        parser.move_pages()
+        self.assertEqual([block.text for block in section.blocks], ['Text.'])
+        self.assertEqual(parser.document.sections[1].moved, '\n{{page break|12|left}}\n')
+        self.assertEqual([block.text for block in parser.document.sections[1].blocks],
+                         ['More.', '{{page break|13|left}}'], 'Moved the last page break.')
+
+    def testPages(self):
+        parser, section = self.parser("Some hyphen-\n\nPAGE 12\n\nated words.")
+        parser.pages()
+        self.assertEqual([block.text for block in section.blocks],
+                         ["Some hyphenated", "{{page break|12|left}}", "words."])
+        
+    def testPagesInFootnote(self):
+        # The footnote was spliced into the paragraph, page number and all
+        parser, section = self.parser('Text.')
+        section.blocks = [make_block('Text.<ref name="ref1">A foot-\n\nPAGE 12\n\nnote that '
+                                     'goes on.</ref>')]
+        parser.pages()
+        self.assertEqual(section.blocks[0].text, 'Text.<ref name="ref1">A footnote\n\n'
+                         '{{page break|12|left}}\n\nthat goes on.</ref>')
+
+if __name__ == "__main__":
+    unittest.main()
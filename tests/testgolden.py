@@ -0,0 +1,62 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from benchmarks.benchstages import CORPUS, GOLDEN, STAGES, compare, read_corpus, regressions, run
+from benchmarks.corpus import write_corpus
+from tokenizer import Tokenizer
+import logging, os, shutil, tempfile, unittest
+
+class TestGolden(unittest.TestCase):
+    '''Test that the benchmark corpus still converts to the golden bot files.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.directory, 'corpus')
+        self.output = os.path.join(self.directory, 'botfiles')
+        os.mkdir(self.output)
+        write_corpus(self.corpus, **CORPUS)
+        self.lextab_dir = Tokenizer.lextab_dir
+        Tokenizer.lextab_dir = os.path.join(self.directory, 'lextab')
+        logger = logging.getLogger('brandeis')
+        self.level = logger.level
+        logger.setLevel(logging.CRITICAL) # The corpus has cases the bot parser warns about
+
+    def tearDown(self):
+        logging.getLogger('brandeis').setLevel(self.level)
+        Tokenizer.lextab_dir = self.lextab_dir
+        shutil.rmtree(self.directory)
+
+    def testGoldenBotFiles(self):
+        totals = run(read_corpus(self.corpus), self.output)
+        self.assertEqual(sorted(totals), sorted(STAGES), 'Did not time every stage.')
+        self.assertEqual(compare(self.output, GOLDEN), [],
+                         'The bot files differ from the golden ones. If the change is intended, '
+                         'run python3 -m benchmarks.benchstages --update-golden.')
+
+    def testRegressions(self):
+        baseline = dict((stage, 100) for stage in STAGES)
+        throughput = dict((stage, 95) for stage in STAGES)
+        throughput['parse'] = 80
+        self.assertEqual(regressions(throughput, baseline, 0.1), ['parse'],
+                         'Did not find the stage that is slower than the threshold allows.')
+        self.assertEqual(regressions(throughput, dict(), 0.1), [],
+                         'Found a regression without a baseline.')
+
+if __name__ == "__main__":
+    unittest.main()
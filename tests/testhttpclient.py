@@ -0,0 +1,125 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from api import API, Cache
+from httpclient import HTTPClient
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse
+import gzip, json, os, shutil, tempfile, threading, unittest
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''Answers every query as if each of the titles exists. Paths starting with /redirect redirect
+    to the API, and requests with "drop" in them close the connection without saying so.'''
+    protocol_version = 'HTTP/1.1'
+    
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+    
+    def do_GET(self):
+        self.server.requests += 1
+        if self.path.startswith('/redirect'):
+            self.send_response(301)
+            self.send_header('Location', '/w/api.php' + self.path[len('/redirect'):])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        query = parse.parse_qs(parse.urlsplit(self.path).query)
+        pages = dict((str(i+1), {"title": title}) for i, title in
+                     enumerate(query.get('titles', [''])[0].split('|')))
+        body = json.dumps({"query": {"pages": pages}}).encode('utf-8')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if 'drop' in self.path:
+            self.close_connection = True
+        
+    def log_message(self, format, *args):
+        pass
+
+class TestHTTPClient(unittest.TestCase):
+    '''Test the pooled HTTP client against a local stand-in for the Wikisource API.'''
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.connections = 0
+        self.server.requests = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.start()
+        self.address = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+        self.client = HTTPClient()
+        
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        
+    def testKeepAlive(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        api = API(self.address, self.client, Cache(os.path.join(directory, 'api.db')))
+        for i in range(5):
+            self.assertEqual(api.titles_exist(['Case {0} v. State'.format(i)]),
+                             {'Case {0} v. State'.format(i): True})
+        self.assertEqual(self.server.requests, 5)
+        self.assertEqual(self.server.connections, 1, "Did not reuse the connection.")
+        self.assertEqual(self.client.connections_opened, 1)
+        api.cache.close()
+        
+    def testTimings(self):
+        status, body = self.client.get(self.address + '/w/api.php?titles=A')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode('utf-8')), {"query": {"pages": {"1": {"title": "A"}}}})
+        self.assertEqual(len(self.client.timings), 1)
+        timing = self.client.timings[0]
+        self.assertEqual((timing.url, timing.status, timing.size),
+                         (self.address + '/w/api.php?titles=A', 200, len(body)))
+        self.assertGreater(timing.seconds, 0)
+        
+    def testRedirect(self):
+        status, body = self.client.get(self.address + '/redirect?titles=B')
+        self.assertEqual(status, 200)
+        self.assertEqual(self.client.timings[-1].url, self.address + '/w/api.php?titles=B')
+        self.assertEqual(self.server.connections, 1)
+        
+    def testClosedConnection(self):
+        self.client.get(self.address + '/w/api.php?titles=drop')
+        status, body = self.client.get(self.address + '/w/api.php?titles=C')
+        self.assertEqual(status, 200, "Did not retry when the pooled connection had been closed.")
+        self.assertEqual(self.server.connections, 2)
+        
+    def testPoolSize(self):
+        client = HTTPClient(pool_size=1)
+        key = ('http', '127.0.0.1', self.server.server_port)
+        connections = [client.acquire(key)[0] for i in range(3)]
+        for connection in connections:
+            client.release(key, connection)
+        self.assertEqual(len(client.pools[key]), 1)
+        client.close()
+
+if __name__ == "__main__":
+    unittest.main()
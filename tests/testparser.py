@@ -58,5 +58,12 @@ class TestParser(unittest.TestCase):
         content = "FOO"
         self.assertEqual(self.parser.smallcaps(content), "{{sc|Foo}}",
                          "Incorrect value returned from small caps parser.")
+        
+    def testHandlerTable(self):
+        self.assertEqual(self.parser.handlers['WORD'], Parser.word,
+                         "Handler table has the wrong function for a token type.")
+        
+    def testMissingHandler(self):
+        self.assertRaises(MissingHandler, Parser.build_handlers, ('WORD', 'NOT_A_TOKEN'))
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,61 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from postprocessor import Postprocessor
+import random, unittest
+
+class TestPostprocessor(unittest.TestCase):
+    '''Test postprocessor module.'''
+    
+    def setUp(self):
+        # Input text and the output of the postprocessing stages run one after another
+        self.golden = [("\n\n  Some text\nmore  \n \n\n\nend\n", "Some text\n\nmore  \n\nend"),
+                       ("a\n | \nb\n:\nc", "a\n\nb\n\nc"),
+                       ("The ''statute\nin'' question¤s effect, '''Rule'''.",
+                        "The ''statute''\n\n''in'' question's effect, '''Rule'''."),
+                       ("a\n''''''\nb", "a\n\nb"),
+                       ("<nowiki>''''''</nowiki>\nx", "<nowiki>''''''</nowiki>\n\nx"),
+                       ("'''Bold\n:quote\nPAGE 12\nmore''' done",
+                        "'''Bold'''\n\n:'''quote'''\n\nPAGE 12\n\n'''more''' done"),
+                       ("'''''Both\nlines'''''", "'''''Both'''''\n\n'''''lines'''''"),
+                       ("''Never closed\nnext", "''Never closed\n\nnext"),
+                       ("''a\n\nb ''c'' d\n\ne ''f'' g", "''a\n\nb ''c'' d\n\ne ''f'' g"),
+                       ("''Unclosed\n | \n''Next\npart''", "''Unclosed\n\n''Next''\n\n''part''")]
+        
+    def testGoldenStages(self):
+        for text, expected in self.golden:
+            self.assertEqual(Postprocessor(text).process_in_stages(), expected,
+                             "Postprocessing stages gave the wrong output for {}.".format(repr(text)))
+    
+    def testGoldenProcess(self):
+        for text, expected in self.golden:
+            self.assertEqual(Postprocessor(text).process(), expected,
+                             "Postprocessor gave the wrong output for {}.".format(repr(text)))
+            
+    def testProcessMatchesStages(self):
+        pieces = ['\n', '\n', ' ', '\t', '\xa0', '|', ':', "'", "''", "'''", "'''''", '¤', 'word',
+                  '<nowiki>', '</nowiki>', 'PAGE 3', 'Footnote 1']
+        rand = random.Random(0)
+        for i in range(5000):
+            text = ''.join(rand.choice(pieces) for j in range(rand.randint(0, 30)))
+            self.assertEqual(Postprocessor(text).process(), Postprocessor(text).process_in_stages(),
+                             "Postprocessor output differs from the stages for {}.".format(repr(text)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from runstats import RunStats, percentile
+import brandeis
+import json, multiprocessing, os, shutil, tempfile, time, unittest
+
+class TestRunStats(unittest.TestCase):
+    '''Test the timing of each stage of a run.'''
+
+    def setUp(self):
+        self.stats = RunStats()
+
+    def slow(self, items, seconds):
+        for item in items:
+            time.sleep(seconds)
+            yield item
+
+    def testStages(self):
+        self.stats.begin('a.html', 'A v. B')
+        with self.stats.stage('read'):
+            time.sleep(0.01)
+        self.stats.end()
+        with self.stats.stage('prefetch'):
+            pass
+        self.assertEqual(list(self.stats.cases['a.html']), ['read'], 'Did not time the case.')
+        self.assertGreaterEqual(self.stats.cases['a.html']['read'][0], 0.01,
+                                'Did not time the whole stage.')
+        self.assertLess(self.stats.cases['a.html']['read'][1], 0.01,
+                        'Counted time spent sleeping as CPU time.')
+        self.assertEqual(list(self.stats.run), ['prefetch'], 'Added a stage to the wrong place.')
+
+    def testTimedItems(self):
+        self.stats.begin('a.html')
+        items = list(range(200))
+        with self.stats.stage('parse', exclude='lex'):
+            read = []
+            for item in self.stats.timed('lex', self.slow(items, 0.0001), size=64):
+                time.sleep(0.0001)
+                read.append(item)
+        self.assertEqual(read, items, 'Did not pass every item through, in order.')
+        lex, parse = self.stats.cases['a.html']['lex'][0], self.stats.cases['a.html']['parse'][0]
+        self.assertGreaterEqual(lex, 0.02, 'Did not time the items being produced.')
+        self.assertGreaterEqual(parse, 0.02, 'Did not time the items being used.')
+        self.assertLess(parse, 0.02 + lex, 'Did not take the time producing the items out.')
+
+    def testPercentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, share) for share in (0.5, 0.9, 0.99, 1)],
+                         [50, 90, 99, 100], 'Returned the wrong percentiles.')
+        self.assertEqual(percentile([3], 0.5), 3, 'Returned the wrong value for one case.')
+        self.assertIsNone(percentile([], 0.5), 'Returned a value without any cases.')
+
+    def testSummary(self):
+        for i in range(5):
+            self.stats.merge('case{0}.html'.format(i), {'lex': [i, i / 2], 'bot': [1, 1]})
+        self.stats.add('prefetch', 2, 0.5)
+        self.stats.add_api(3, 4096, 1.5)
+        summary = self.stats.summary(slowest=2)
+        self.assertEqual(summary['cases'], 5, 'Counted the wrong number of cases.')
+        self.assertEqual(summary['stages']['lex']['wall'], 10, 'Added up a stage wrong.')
+        self.assertEqual(summary['stages']['lex']['cpu'], 5, 'Added up the CPU time wrong.')
+        self.assertEqual(summary['stages']['lex']['p50'], 2, 'Found the wrong median.')
+        self.assertEqual(summary['stages']['lex']['max'], 4, 'Found the wrong longest time.')
+        self.assertEqual(summary['stages']['prefetch']['cases'], 0,
+                         'Counted a stage of the run as part of the cases.')
+        self.assertEqual([case['file'] for case in summary['slowest']],
+                         ['case4.html', 'case3.html'], 'Did not list the slowest cases.')
+        self.assertEqual(summary['api'], {'calls': 3, 'bytes': 4096, 'seconds': 1.5},
+                         'Did not count the requests.')
+        self.assertIn('3 API requests, 4.0 kB', self.stats.report(), 'Did not report the requests.')
+
+    def testWrite(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'logs', 'stats.json')
+            self.stats.merge('a.html', {'lex': [1, 1]})
+            self.stats.write(path)
+            with open(path, 'r', encoding='utf-8') as stats:
+                self.assertEqual(json.load(stats)['stages']['lex']['wall'], 1,
+                                 'Did not write the summary.')
+        finally:
+            shutil.rmtree(directory)
+
+class TestWorkerStats(unittest.TestCase):
+    '''Test that the stages timed in worker processes are added to the main process's once.'''
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.run_stats, self.convert_case = brandeis.run_stats, brandeis.convert_case
+        brandeis.run_stats = RunStats()
+        brandeis.convert_case = self.convert_case_stub
+
+    def tearDown(self):
+        brandeis.run_stats, brandeis.convert_case = self.run_stats, self.convert_case
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    @staticmethod
+    def convert_case_stub(file, metadict, options=dict()):
+        brandeis.run_stats.begin(file, metadict['title'])
+        brandeis.run_stats.add('bot', 0.5, 0.25)
+        brandeis.run_stats.end()
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                         'Workers only inherit the stages of the main process when forked.')
+    def testConvertAll(self):
+        brandeis.run_stats.begin('a.html', 'A v. B')
+        brandeis.run_stats.add('read', 1, 0.5)
+        brandeis.run_stats.end()
+        brandeis.convert_all([('a.html', {'title': 'A v. B'}, dict())], 2)
+        self.assertEqual(dict(brandeis.run_stats.cases['a.html']),
+                         {'read': [1, 0.5], 'bot': [0.5, 0.25]},
+                         'Added the stages timed before the workers started twice.')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from tokenizer import Tokenizer
+from bexceptions import *
+import os, shutil, tempfile, unittest
+
+class TestTokenizer(unittest.TestCase):
+    '''Test tokenizer module.'''
+    
+    def setUp(self):
+        self.text = ('<h1>Foo v. Bar - 100 U.S. 200 (1900)</h1><p>The <i>judgment</i> is '
+                     'AFFIRMED.</p><blockquote><p>Quoted<br/>text.</p></blockquote>')
+        self.lextab_dir = Tokenizer.lextab_dir
+        Tokenizer.lextab_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        shutil.rmtree(Tokenizer.lextab_dir)
+        Tokenizer.lextab_dir = self.lextab_dir
+        
+    def testSharedLexer(self):
+        first = Tokenizer(dict())
+        second = Tokenizer(dict())
+        self.assertIsNot(first.lexer, second.lexer, 'Tokenizers share a lexer object.')
+        self.assertEqual(first.analyze(self.text), second.analyze(self.text),
+                         'Cloned lexers produced different tokens.')
+        
+    def testStream(self):
+        tokenizer = Tokenizer(dict())
+        stream = tokenizer.stream(self.text)
+        self.assertFalse(isinstance(stream, list), 'Tokenizer.stream() returned a list.')
+        self.assertEqual(list(stream), tokenizer.analyze(self.text),
+                         'Streamed tokens differ from the token list.')
+        
+    def testTrace(self):
+        trace = os.path.join(tempfile.mkdtemp(), 'tokens')
+        try:
+            tokens = Tokenizer(dict(), trace).analyze(self.text)
+            with open(trace, 'r', encoding='utf-8') as tracefile:
+                lines = tracefile.read().splitlines()
+            self.assertEqual(len(lines), len(tokens), 'Trace file does not list every token.')
+            self.assertTrue(lines[0].startswith('LexToken(HEADER,'), 'Badly formatted trace file.')
+        finally:
+            shutil.rmtree(os.path.dirname(trace))
+        
+    def testRulesBoundToTokenizer(self):
+        tokenizer = Tokenizer(dict())
+        for lexre, findex in tokenizer.lexer.lexstatere['INITIAL']:
+            for f in findex:
+                if f and f[0]:
+                    self.assertIs(f[0].__self__, tokenizer,
+                                  'Lexer rule is bound to a different Tokenizer.')
+        
+    def testStateReset(self):
+        # The first case ends inside a blockquote; the next one should start in the initial state.
+        Tokenizer(dict()).analyze('<blockquote><p>Unterminated')
+        tokens = Tokenizer(dict()).analyze('<p>Text</p>')
+        self.assertEqual(tokens[0][0], 'PARAGRAPH',
+                         'Blockquote state carried over to the next Tokenizer.')
+        
+    def testCachedLexerTable(self):
+        try:
+            Tokenizer.master_lexer = None
+            built = Tokenizer(dict()).analyze(self.text)
+            self.assertTrue(os.path.isfile(os.path.join(Tokenizer.lextab_dir, 'lextab_' +
+                                                        Tokenizer.rules_hash() + '.py')),
+                            'Lexer table was not cached.')
+            Tokenizer.master_lexer = None
+            loaded = Tokenizer(dict()).analyze(self.text)
+            self.assertTrue(Tokenizer.master_lexer.lexoptimize, 'Lexer was not loaded from table.')
+            self.assertEqual(built, loaded, 'Cached lexer table produced different tokens.')
+        finally:
+            Tokenizer.master_lexer = None
+            
+    def testStaleLexerTables(self):
+        stale = ['lextab_' + '0' * 32 + '.py', 'lextab_' + '1' * 32 + '_123.py', 'other.py']
+        for name in stale:
+            open(os.path.join(Tokenizer.lextab_dir, name), 'w').close()
+        try:
+            Tokenizer.master_lexer = None
+            Tokenizer(dict())
+        finally:
+            Tokenizer.master_lexer = None
+        self.assertEqual(sorted(os.listdir(Tokenizer.lextab_dir)),
+                         sorted(['lextab_' + Tokenizer.rules_hash() + '.py'] + stale[1:]),
+                         'Did not remove only the tables for earlier rules.')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from api import API, Cache
+from collections import deque
+from transport import FixtureStore, RecordingTransport, ReplayTransport
+from bexceptions import *
+import json, os, shutil, tempfile, time, unittest
+
+URL = 'https://en.wikisource.org/w/api.php?format=json&action=query&titles=Volume%201'
+
+class StandInClient(object):
+    '''Answers every request with the same response, and counts the requests.'''
+    
+    def __init__(self, status=200, body=b'{"query": {"pages": {}}}'):
+        self.status = status
+        self.body = body
+        self.pool_size = 4
+        self.timings = deque()
+        self.requests = 0
+        self.closed = False
+        
+    def get(self, url):
+        self.requests += 1
+        return self.status, self.body
+    
+    def close(self):
+        self.closed = True
+
+class TestTransport(unittest.TestCase):
+    '''Test recording responses to a fixture store and replaying them.'''
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'fixtures.json')
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def record(self, url=URL, **kwargs):
+        client = StandInClient(**kwargs)
+        transport = RecordingTransport(FixtureStore(self.path), client)
+        response = transport.get(url)
+        transport.close()
+        self.assertTrue(client.closed, 'The recording transport did not close its client.')
+        return response
+    
+    def testRoundTrip(self):
+        recorded = self.record()
+        replay = ReplayTransport(FixtureStore(self.path))
+        self.assertEqual(replay.get(URL), recorded, 'Replayed a different response.')
+        self.assertEqual(len(replay.timings), 1, 'Did not keep the timing of a replayed request.')
+        
+    def testReadableFixtures(self):
+        self.record()
+        with open(self.path, 'r', encoding='utf-8') as fixtures:
+            responses = json.load(fixtures)
+        self.assertEqual(responses, {'/w/api.php?format=json&action=query&titles=Volume%201':
+                                     {'status': 200, 'json': {'query': {'pages': {}}}}},
+                         'Did not keep the response as JSON under its path and query.')
+        
+    def testTextAndStatus(self):
+        self.record(status=503, body=b'Service unavailable')
+        self.assertEqual(ReplayTransport(FixtureStore(self.path)).get(URL),
+                         (503, b'Service unavailable'), 'Did not replay a response that is not JSON.')
+        
+    def testMaxlagIgnored(self):
+        recorded = self.record(URL + '&maxlag=5')
+        replay = ReplayTransport(FixtureStore(self.path))
+        self.assertEqual(replay.get(URL), recorded, 'The maxlag parameter was part of the key.')
+        self.assertEqual(replay.get('http://localhost:8080/w/api.php?format=json&action=query'
+                                    '&titles=Volume%201&maxlag=3'), recorded,
+                         'The server or the maxlag parameter was part of the key.')
+        
+    def testNotRecorded(self):
+        self.record()
+        with self.assertRaises(NoRecordedResponse, msg='Replayed a request that was not recorded.'):
+            ReplayTransport(FixtureStore(self.path)).get(URL + '2')
+            
+    def testLatency(self):
+        self.record()
+        replay = ReplayTransport(FixtureStore(self.path), latency=0.02, jitter=0.01)
+        start = time.perf_counter()
+        replay.get(URL)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.02, 'Did not wait before replaying.')
+        
+    def testSeededJitter(self):
+        self.record()
+        delays = []
+        for i in range(2):
+            replay = ReplayTransport(FixtureStore(self.path), jitter=0.005, seed=7)
+            replay.get(URL)
+            replay.get(URL)
+            delays.append(replay.random.getstate())
+        self.assertEqual(delays[0], delays[1], 'The jitter was not the same from one replay to the '
+                         'next.')
+        
+    def testReplayThroughAPI(self):
+        client = StandInClient(body=json.dumps({"query": {"pages": {"-1": {
+            "ns": 0, "title": "United States Reports/Volume 800", "missing": ""}}}}).encode('utf-8'))
+        api = API(client=RecordingTransport(FixtureStore(self.path), client),
+                  cache=Cache(os.path.join(self.directory, 'recording.db')))
+        with self.assertRaises(PageNotFound):
+            api.get_case_line('title', '800', '25')
+        api.close()
+        api.cache.close()
+        api = API(client=ReplayTransport(FixtureStore(self.path)),
+                  cache=Cache(os.path.join(self.directory, 'replay.db')))
+        with self.assertRaises(PageNotFound, msg='Did not replay the recorded volume page.'):
+            api.get_case_line('title', '800', '25')
+        api.cache.close()
+        
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8  -*-
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+#
+# Copyright (C) 2013 Molly White
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from api import API, Cache
+from asyncapi import AsyncAPI
+from benchmarks.wikiserver import Wiki, WikiServer, volume_pages
+from bexceptions import *
+import asyncio, json, os, shutil, tempfile, time, unittest
+
+CASE = ('<html><head><title>x</title></head><body>\n<article id="maincontent">'
+        '<h1>{0} - {1} U.S. {2} (1900)</h1><p>U.S. Supreme Court</p></article>\n</body></html>\n')
+
+class TestWikiServer(unittest.TestCase):
+    '''Test the API against the stand-in Wikisource server over HTTP.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        files = []
+        for i, (title, volume, page) in enumerate([('Foo v. Bar', '100', '200'),
+                                                   ('Baz v. Qux', '100', '150'),
+                                                   ('Quux v. Corge', '101', '7')]):
+            files.append(os.path.join(self.directory, 'case{0}.html'.format(i)))
+            with open(files[-1], 'w', encoding='utf-8') as html:
+                html.write(CASE.format(title, volume, page))
+        self.wiki = Wiki(volume_pages(files))
+        self.server = WikiServer(self.wiki).start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def make_api(self, kind=API, **kwargs):
+        api = kind(self.server.url, cache=Cache(os.path.join(self.directory, 'api.db')), **kwargs)
+        self.addCleanup(api.cache.close)
+        self.addCleanup(api.close)
+        return api
+
+    def testVolumePages(self):
+        self.assertEqual(sorted(self.wiki.pages), ['United States Reports/Volume 100',
+                                                   'United States Reports/Volume 101'],
+                         'Did not make one page for each volume.')
+        content = self.wiki.pages['United States Reports/Volume 100'][2]
+        self.assertLess(content.find('100 U.S. 150'), content.find('100 U.S. 200'),
+                        'Did not list the cases in order.')
+
+    def testCaseLine(self):
+        api = self.make_api()
+        self.assertEqual(api.get_case_line('Foo v. Bar', '100', '200'),
+                         '* [http://openjurist.org/100/us/200 100 U.S. 200] '
+                         '([[:Category:1900 works|1900]]) [[Foo v. Bar]]',
+                         'Did not find the case in its volume page.')
+        with self.assertRaises(PageNotFound):
+            api.get_case_line('Foo v. Bar', '102', '200')
+        self.assertFalse(api.case_exists(api.get_case_line('Quux v. Corge', '101', '7')),
+                         'Reported that a case exists when there is no page for it.')
+
+    def testNormalized(self):
+        response = self.make_api().request(self.server.url + '/w/api.php?format=json&action=query'
+                                           '&titles=united_States_Reports/Volume_101&prop=info')
+        self.assertEqual(response['query']['normalized'],
+                         [{"from": "united_States_Reports/Volume_101",
+                           "to": "United States Reports/Volume 101"}], 'Did not normalize a title.')
+        self.assertEqual(list(response['query']['pages'].values())[0]['lastrevid'], 1001,
+                         'Did not report the revision ID.')
+
+    def testLatency(self):
+        self.wiki.latency = 0.05
+        api = self.make_api()
+        start = time.perf_counter()
+        api.prefetch_volumes(['100', '101'])
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05, 'Did not hold back the response.')
+        self.assertTrue(api.cache.is_cached('101'), 'Did not prefetch the volume pages.')
+
+    def testMaxlag(self):
+        self.wiki.lag_rate = 1
+        api = self.make_api(AsyncAPI, maxlag_retries=1)
+        api.maxlag_wait = 0
+        with self.assertRaises(SystemExit, msg='Did not give up on a lagged server.'):
+            asyncio.run(api.prefetch_volumes(['100']))
+        self.assertEqual(self.wiki.lagged, 2, 'Did not refuse every request as lagged.')
+        api.request(self.server.url + '/w/api.php?format=json&action=query&titles=Foo')
+        self.assertEqual(self.wiki.lagged, 2, 'Refused a request without a maxlag parameter.')
+
+    def testErrors(self):
+        self.wiki.error_rate = 1
+        api = self.make_api()
+        api.retry_wait = 0
+        with self.assertRaises(SystemExit, msg='Did not stop on a failed request.'):
+            api.prefetch_volumes(['100'])
+        self.assertEqual(self.wiki.errors, 4, 'Did not retry the failed request three times.')
+
+    def testRetries(self):
+        self.wiki.error_rate = 0.5
+        for kind in [API, AsyncAPI]:
+            api = self.make_api(kind)
+            api.retries = 10
+            api.retry_wait = 0
+            if kind is API:
+                api.prefetch_volumes(['100', '101'])
+            else:
+                asyncio.run(api.prefetch_volumes(['100', '101']))
+            self.assertTrue(api.cache.is_cached('101'), 'Did not retry the failed requests.')
+            api.cache.invalidate(['100', '101'])
+        self.assertGreater(self.wiki.errors, 0, 'Did not fail any requests.')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,9 +17,12 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import logging, re, sys
+import hashlib, importlib.util, logging, os, re, sys
 import ply.lex as lex
 from bexceptions import IllegalCharacter
+# A cached lexer table, or bytecode compiled from one, named for the hash of its rules
+# A cached lexer table, or bytecode compiled from one, named for the hash of the rules it was built from
+LEXTAB = re.compile(r'lextab_[0-9a-f]{32}\.')
 
 class Tokenizer(object):
 #===================================================================================================
@@ -63,11 +66,83 @@ class Tokenizer(object):
               ('blockquote', 'inclusive'),
              )
     
-    def __init__(self, mdict):
-        '''Initiate logging, open a file to store tokens, build the lexer.'''
+    master_lexer = None # Built by the first Tokenizer in each process, then cloned
+    lextab_dir = 'cache/lextab'
+    
+    def __init__(self, mdict, trace=None):
+        '''Initiate logging, build the lexer. If trace is the name of a file, every token will be
+        written to it as the text is tokenized.'''
         self.logger = logging.getLogger('brandeis')
         self.metadict = mdict
-        self.lexer = lex.lex(module=self)
+        self.trace = trace
+        self.lexer = self.build_lexer()
+        
+    def build_lexer(self):
+        '''Building a lexer means validating every rule and compiling the master regex, so this is
+        only done once per process. Every Tokenizer gets a clone of that lexer, with its rules bound
+        to this Tokenizer and its state reset.'''
+        if Tokenizer.master_lexer is None:
+            Tokenizer.master_lexer = self.load_lexer()
+        lexer = Tokenizer.master_lexer.clone(self)
+        lexer.lexstatestack = []
+        lexer.lineno = 1
+        lexer.begin('INITIAL') # Rebinds the current state's rules to the clone
+        return lexer
+    
+    def load_lexer(self):
+        '''Load the lexer from the table cached in lextab_dir. If there is no table for the current
+        set of rules, build the lexer from scratch and cache its table for the next process.'''
+        name = 'lextab_' + self.rules_hash()
+        path = os.path.join(self.lextab_dir, name + '.py')
+        if os.path.isfile(path):
+            try:
+                spec = importlib.util.spec_from_file_location(name, path)
+                lextab = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(lextab)
+                return lex.lex(module=self, optimize=1, lextab=lextab)
+            except Exception as e:
+                self.logger.debug("Unable to load cached lexer table {0}: {1}".format(path, repr(e)))
+        lexer = lex.lex(module=self)
+        try:
+            os.makedirs(self.lextab_dir, exist_ok=True)
+            # Write to a temporary file first, so a concurrent process never reads half a table.
+            temp_name = '{0}_{1}'.format(name, os.getpid())
+            lexer.writetab(temp_name, self.lextab_dir)
+            os.replace(os.path.join(self.lextab_dir, temp_name + '.py'), path)
+        except (OSError, UnicodeError) as e:
+            self.logger.debug("Unable to cache lexer table {0}: {1}".format(path, repr(e)))
+        else:
+            self.remove_stale_tables(name)
+        return lexer
+    
+    def remove_stale_tables(self, name):
+        '''Remove the tables cached for earlier sets of rules (and any bytecode compiled from them),
+        so they don't pile up as the rules change. Half-written tables of other processes are left
+        alone.'''
+        for directory in [self.lextab_dir, os.path.join(self.lextab_dir, '__pycache__')]:
+            try:
+                files = os.listdir(directory)
+            except OSError:
+                continue
+            for file in files:
+                if LEXTAB.match(file) and not file.startswith(name + '.'):
+                    try:
+                        os.remove(os.path.join(directory, file))
+                    except OSError as e:
+                        self.logger.debug("Unable to remove stale lexer table {0}: {1}"
+                                          .format(file, repr(e)))
+    
+    @classmethod
+    def rules_hash(cls):
+        '''Hash of everything the lexer table is built from: the PLY version, the token list, the
+        states, and each rule's name and regex in the order the rules are defined.'''
+        rules = [getattr(cls, name) for name in dir(cls) if name.startswith('t_')]
+        rules.sort(key=lambda rule: rule.__code__.co_firstlineno)
+        md5 = hashlib.md5()
+        md5.update(repr((lex.__version__, cls.tokens, cls.states)).encode('utf-8'))
+        for rule in rules:
+            md5.update(repr((rule.__name__, rule.__doc__)).encode('utf-8'))
+        return md5.hexdigest()
         
 #===============================================================================
 # TOKEN DEFINITIONS
@@ -204,16 +279,34 @@ class Tokenizer(object):
         raise IllegalCharacter(token.lexpos)
         
     def analyze(self, data):
-        '''Read through the text file and tokenize.'''
+        '''Read through the text file and tokenize. Returns a list of all the tokens.'''
+        self.token_list = list(self.stream(data))
+        return self.token_list
+    
+    def stream(self, data):
+        '''Read through the text file and tokenize, yielding each token as soon as it is read so
+        that the whole document never has to be held as a token list.'''
+        self.lexer.begin('INITIAL')
         self.lexer.input(data)
-        self.token_list = list()
-        with open('tokenout.txt', 'w+', encoding='utf-8') as tokenfile:
-            while True:
-                token = self.lexer.token()
-                #print(token)
-                if not token:
-                    break # No more input
-                l_token = [token.type, token.value]
-                self.token_list.append(l_token)
-                tokenfile.write(str(token) + '\n')
-        return self.token_list
\ No newline at end of file
+        if self.trace:
+            for token in self.traced(self.lexer):
+                yield [token.type, token.value]
+        else:
+            for token in self.lexer:
+                yield [token.type, token.value]
+    
+    def traced(self, tokens):
+        '''Write each token to the trace file on its way through. Tokens are written in batches
+        rather than one write per token, and whatever has been read is written out even if
+        tokenizing stops early.'''
+        batch = []
+        with open(self.trace, 'w', encoding='utf-8') as tokenfile:
+            try:
+                for token in tokens:
+                    batch.append(str(token) + '\n')
+                    if len(batch) == 1000:
+                        tokenfile.writelines(batch)
+                        batch = []
+                    yield token
+            finally:
+                tokenfile.writelines(batch)
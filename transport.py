@@ -0,0 +1,134 @@
+# -*- coding: utf-8  -*-
+#! python3
+# Brandeis - A tool to convert plaintext court cases (from the lochner
+# tool: http://gitorious.org/lochner/) to wikitext.
+# 
+# Copyright (C) 2013 Molly White
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque
+from urllib import parse
+from bexceptions import NoRecordedResponse
+from httpclient import HTTPClient, Timing
+import json, os, random, threading, time
+
+class FixtureStore(object):
+    '''Responses from the Wikisource API, kept in a JSON file by the request they answered. Requests
+    are keyed by their path and query, without the server or the maxlag parameter, so one set of
+    responses serves API and AsyncAPI against any server. JSON bodies are kept as JSON, so the file
+    can be read and edited by hand.'''
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as fixtures:
+                self.responses = json.load(fixtures)
+        except (OSError, IOError):
+            self.responses = dict()
+            
+    @staticmethod
+    def key(url):
+        '''The path and query of a URL, without the maxlag parameter.'''
+        parts = parse.urlsplit(url)
+        query = '&'.join(param for param in parts.query.split('&')
+                         if not param.startswith('maxlag='))
+        return parts.path + '?' + query
+    
+    def get(self, url):
+        '''Returns the status and body recorded for a request, or None if there isn't one.'''
+        response = self.responses.get(self.key(url))
+        if response is None:
+            return None
+        if "json" in response:
+            return response["status"], json.dumps(response["json"]).encode('utf-8')
+        return response["status"], response["text"].encode('utf-8')
+    
+    def add(self, url, status, body):
+        '''Record the response to a request.'''
+        text = body.decode('utf-8')
+        try:
+            response = {"status": status, "json": json.loads(text)}
+        except ValueError:
+            response = {"status": status, "text": text}
+        with self.lock:
+            self.responses[self.key(url)] = response
+            
+    def save(self):
+        '''Write the responses out. The file is replaced all at once, so it is never half written.'''
+        with self.lock:
+            temp = '{0}.{1}'.format(self.path, os.getpid())
+            with open(temp, 'w', encoding='utf-8') as fixtures:
+                json.dump(self.responses, fixtures, indent=1, sort_keys=True, ensure_ascii=False)
+                fixtures.write('\n')
+            os.replace(temp, self.path)
+
+class RecordingTransport(object):
+    '''Makes requests through a real client and records every response in a fixture store. The store
+    is saved when the transport is closed.'''
+    
+    def __init__(self, store, client=None):
+        self.store = store
+        self.client = client if client else HTTPClient()
+        self.timings = self.client.timings
+        
+    @property
+    def pool_size(self):
+        return self.client.pool_size
+    
+    @pool_size.setter
+    def pool_size(self, size):
+        self.client.pool_size = size
+        
+    def get(self, url):
+        status, body = self.client.get(url)
+        self.store.add(url, status, body)
+        return status, body
+    
+    def close(self):
+        self.client.close()
+        self.store.save()
+
+class ReplayTransport(object):
+    '''Answers requests with the responses in a fixture store, without touching the network, and
+    raises NoRecordedResponse for a request that wasn't recorded. Each response can be held back by
+    latency seconds, plus a random amount up to jitter seconds (from a seeded generator, so a replay
+    waits the same way every time), to stand in for a real server. The requests are kept in timings
+    like HTTPClient's.'''
+    
+    def __init__(self, store, latency=0, jitter=0, seed=0, history=1000):
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.pool_size = 4
+        self.timings = deque(maxlen=history)
+        
+    def get(self, url):
+        start = time.perf_counter()
+        response = self.store.get(url)
+        if response is None:
+            raise NoRecordedResponse("No response was recorded for {0}.".format(url))
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        status, body = response
+        self.timings.append(Timing(url, status, time.perf_counter() - start, len(body)))
+        return status, body
+    
+    def close(self):
+        pass